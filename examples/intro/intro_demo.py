@@ -137,16 +137,15 @@ def run(connected):
         # ports of the other LPU:
         N_conn_spk_0_1 = min(len(out_ports_spk_0), len(in_ports_spk_1))
         N_conn_gpot_0_1 = min(len(out_ports_gpot_0), len(in_ports_gpot_1))
-        for src, dest in zip(random.sample(out_ports_spk_0, N_conn_spk_0_1), 
-                             random.sample(in_ports_spk_1, N_conn_spk_0_1)):
-            pat[src, dest] = 1
-            pat.interface[src, 'type'] = 'spike'
-            pat.interface[dest, 'type'] = 'spike'
-        for src, dest in zip(random.sample(out_ports_gpot_0, N_conn_gpot_0_1),
-                             random.sample(in_ports_gpot_1, N_conn_gpot_0_1)):
-            pat[src, dest] = 1
-            pat.interface[src, 'type'] = 'gpot'
-            pat.interface[dest, 'type'] = 'gpot'
+        src_spk = random.sample(out_ports_spk_0, N_conn_spk_0_1)
+        dest_spk = random.sample(in_ports_spk_1, N_conn_spk_0_1)
+        src_gpot = random.sample(out_ports_gpot_0, N_conn_gpot_0_1)
+        dest_gpot = random.sample(in_ports_gpot_1, N_conn_gpot_0_1)
+        pat.connect_many(src_spk+src_gpot, dest_spk+dest_gpot, 1)
+        if src_spk:
+            pat.interface[','.join(src_spk+dest_spk), 'type'] = 'spike'
+        if src_gpot:
+            pat.interface[','.join(src_gpot+dest_gpot), 'type'] = 'gpot'
 
         man.connect(lpu_0, lpu_1, pat, 0, 1)
 
@@ -6,11 +6,13 @@ Base Neurokernel classes.
 
 from contextlib import contextmanager
 import copy
+import json
 import multiprocessing as mp
 import os
 import re
 import string
 import sys
+import tempfile
 import time
 import collections
 
@@ -31,8 +33,8 @@ from tools.logging import setup_logger
 from routing_table import RoutingTable
 from uid import uid
 from tools.misc import catch_exception
-from pattern import Interface, Pattern
-from plsel import SelectorMethods, PortMapper
+from pattern import Interface, Pattern, content_hash
+from plsel import SelectorMethods, BasePortMapper, PortMapper, port_ids
 
 PORT_DATA = 5000
 PORT_CTRL = 5001
@@ -40,6 +42,22 @@ PORT_TIME = 5002
 
 POLL_TIMEOUT = 100
 
+class LinkPlan(collections.namedtuple('LinkPlan',
+                                      'src_id dest_id port_type src_idx dest_idx')):
+    """
+    Compiled transmission plan for data sent between two modules.
+
+    The data sent from module `src_id` to module `dest_id` (which is also the
+    identifier used by the broker to route the data) consists of the entries
+    of the source module's data associated with the ports at indices
+    `src_idx`; the destination module stores the received data in the
+    entries associated with the ports at indices `dest_idx`. Either index
+    array may be None if it is not known to the module holding the plan.
+    `port_type` is None if the modules do not distinguish port types.
+    """
+
+    __slots__ = ()
+
 class BaseModule(ControlledProcess):
     """
     Processing module.
@@ -98,6 +116,10 @@ class BaseModule(ControlledProcess):
     instance ignores the network entirely.
     """
 
+    # Types of ports for which separate link plans are compiled; None
+    # denotes ports of all types:
+    _port_types = [None]
+
     # Define properties to perform validation when connectivity status
     # is set:
     _net = 'none'
@@ -192,6 +214,17 @@ class BaseModule(ControlledProcess):
         # Keyed on the IDs of those modules:
         self.pat_ints = {}
 
+        # Interned IDs of the input ports of this module connected by each
+        # pattern and of the input ports connected by all patterns; used to
+        # detect fan-in from different source modules. Keyed on the IDs of the
+        # modules to which the patterns connect:
+        self._in_port_ids = {}
+        self._claimed_in_ports = set()
+
+        # List of LinkPlan instances describing the data transmitted to and
+        # from the module; set by the manager before the emulation starts:
+        self._link_plans = None
+
         # Dict for storing incoming data; each entry (corresponding to each
         # module that sends input to the current module) is a deque containing
         # incoming data, which in turn contains transmitted data arrays. Deques
@@ -231,6 +264,8 @@ class BaseModule(ControlledProcess):
         IDs of modules to which the current module is connected.
         """
 
+        if self._link_plans is not None:
+            return list(set(self._plan_ids(True)+self._plan_ids(False)))
         return self.patterns.keys()
 
     @property
@@ -239,6 +274,8 @@ class BaseModule(ControlledProcess):
         IDs of modules that send data to this module.
         """
 
+        if self._link_plans is not None:
+            return self._plan_ids(False)
         return [m for m in self.patterns.keys() \
                 if self.patterns[m].is_connected(self.pat_ints[m][1],
                                                  self.pat_ints[m][0])]
@@ -249,10 +286,35 @@ class BaseModule(ControlledProcess):
         IDs of modules that receive data from this module.
         """
 
+        if self._link_plans is not None:
+            return self._plan_ids(True)
         return [m for m in self.patterns.keys() \
                 if self.patterns[m].is_connected(self.pat_ints[m][0],
                                                  self.pat_ints[m][1])]
 
+    def _plan_ids(self, out):
+        """
+        IDs of modules that exchange data with this module according to its link plans.
+
+        Parameters
+        ----------
+        out : bool
+            If True, return the IDs of modules that receive data from this
+            module; otherwise, return those of modules that send data to it.
+        """
+
+        ids = []
+        for plan in self._link_plans:
+            if out and plan.src_id == self.id:
+                m_id = plan.dest_id
+            elif not out and plan.dest_id == self.id:
+                m_id = plan.src_id
+            else:
+                continue
+            if m_id not in ids:
+                ids.append(m_id)
+        return ids
+
     def connect(self, m, pat, int_0, int_1, compat_check=True):
         """
         Connect the current module instance to another module with a pattern instance.
@@ -286,15 +348,9 @@ class BaseModule(ControlledProcess):
             assert m.interface.is_compatible(0, pat.interface, int_1, True)
 
         # Check that no fan-in from different source modules occurs as a result
-        # of the new connection by getting the union of all connected input
-        # ports for the interfaces of all existing patterns connected to the
-        # current module and ensuring that the input ports from the new pattern
-        # don't overlap:
-        if self.patterns:
-            curr_in_ports = reduce(set.union,
-                [set(self.patterns[i].connected_ports(self.pat_ints[i][0]).in_ports(tuples=True)) \
-                     for i in self.patterns.keys()])
-            assert not curr_in_ports.intersection(pat.connected_ports(int_0).in_ports(tuples=True))
+        # of the new connection:
+        self._claimed_in_ports, self._in_port_ids = \
+            self._claim_in_ports(m.id, pat, int_0)
 
         # The pattern instances associated with the current
         # module are keyed on the IDs of the modules to which they connect:
@@ -321,6 +377,51 @@ class BaseModule(ControlledProcess):
                 self.net = 'full'
             self.log_info('net status changed: %s -> %s' % (old_net, self.net))
 
+    def _claim_in_ports(self, m_id, pat, int_0, claims=None):
+        """
+        Claim the input ports connected by a pattern to another module.
+
+        Parameters
+        ----------
+        m_id : str
+            ID of the module to which the pattern connects the current module.
+        pat : Pattern
+            Pattern instance.
+        int_0 : int
+            Which of the pattern's interfaces to connect to the current module.
+        claims : tuple
+            Interned IDs of the input ports claimed by all patterns and dict
+            of those claimed by each pattern keyed on the IDs of the modules
+            to which they connect. If None, the claims of the patterns
+            currently connected to the module are used.
+
+        Returns
+        -------
+        claims : tuple
+            Updated claims; the specified claims are not modified.
+
+        Notes
+        -----
+        The input ports connected by the pattern must not overlap with those
+        claimed by patterns connecting other modules, i.e., no fan-in from
+        different source modules may occur. Since the ports in the pattern's
+        interfaces are the inverses of the corresponding module ports, the
+        module's input ports are the pattern's output ports. If the other
+        module is already connected, the ports claimed by the pattern being
+        replaced may be reused.
+        """
+
+        if claims is None:
+            claims = (self._claimed_in_ports, self._in_port_ids)
+        claimed_in_ports, in_port_ids = claims
+        new_in_ports = set(port_ids.intern_many(
+            pat.connected_ports(int_0).out_ports(tuples=True)).tolist())
+        old_in_ports = in_port_ids.get(m_id, set())
+        assert (claimed_in_ports & new_in_ports) <= old_in_ports
+        in_port_ids = dict(in_port_ids)
+        in_port_ids[m_id] = new_in_ports
+        return (claimed_in_ports-old_in_ports)|new_in_ports, in_port_ids
+
     def _ctrl_stream_shutdown(self):
         """
         Shut down control port handler's stream and ioloop.
@@ -583,50 +684,132 @@ class BaseModule(ControlledProcess):
 
         pass
 
+    def _port_mapper(self, port_type):
+        """
+        Port mapper of the module's ports of the specified type.
+        """
+
+        return self.pm
+
+    def _inds_to_ports(self, port_type, inds):
+        """
+        Identifiers of the module's ports at the specified indices.
+
+        Unlike `PortMapper.inds_to_ports()`, this preserves the order of
+        `inds`.
+        """
+
+        portmap = self._port_mapper(port_type).portmap
+        sorter = np.argsort(portmap.values, kind='mergesort')
+        pos = sorter[np.searchsorted(portmap.values, inds, sorter=sorter)]
+        return portmap.index[pos].tolist()
+
+    def _link_inds(self, m_id, port_type, out):
+        """
+        Indices of the module's ports connected to another module.
+
+        Parameters
+        ----------
+        m_id : str
+            ID of the other module.
+        port_type : str
+            Type of ports; if None, ports of all types are returned.
+        out : bool
+            If True, return the indices of the module's ports that transmit
+            data to the other module; otherwise, return the indices of the
+            module's ports that receive data from the other module.
+
+        Returns
+        -------
+        inds : numpy.ndarray of int
+            Indices of the ports in the module's port mapper.
+        """
+
+        # `int_0` is the pattern interface connected to the current module,
+        # `int_1` is connected to the other module:
+        int_0, int_1 = self.pat_ints[m_id]
+        types = () if port_type is None else (port_type, port_type)
+        if out:
+            ports = self.patterns[m_id].src_idx(int_0, int_1, *types)
+        else:
+            ports = self.patterns[m_id].dest_idx(int_1, int_0, *types)
+        return self._port_mapper(port_type).ports_to_inds(ports)
+
+    def set_link_plans(self, plans):
+        """
+        Set the plans describing the data transmitted to and from the module.
+
+        Parameters
+        ----------
+        plans : list of LinkPlan
+            Plans of all links whose source or destination is the current
+            module.
+
+        Notes
+        -----
+        The patterns connecting the module to other modules are discarded
+        because the plans contain all of the connectivity information needed
+        to run the module.
+        """
+
+        self._link_plans = list(plans)
+        self.patterns = {}
+        self.pat_ints = {}
+        self._in_port_ids = {}
+        self._claimed_in_ports = set()
+
+    def _local_link_plans(self):
+        """
+        Compile link plans from the patterns connected to the module.
+
+        Returns
+        -------
+        plans : list of LinkPlan
+            Plans that only contain the indices of the current module's ports.
+        """
+
+        plans = []
+        for out_id in self.out_ids:
+            for t in self._port_types:
+                plans.append(LinkPlan(self.id, out_id, t,
+                                      self._link_inds(out_id, t, True), None))
+        for in_id in self.in_ids:
+            for t in self._port_types:
+                plans.append(LinkPlan(in_id, self.id, t,
+                                      None, self._link_inds(in_id, t, False)))
+        return plans
+
     def _init_port_dicts(self):
         """
         Initial dictionaries of source/destination ports in current module.
         """
 
+        # Use the patterns connected to the module if the manager did not
+        # provide link plans:
+        if self._link_plans is None:
+            self._link_plans = self._local_link_plans()
+
         # Extract identifiers of source ports in the current module's interface
-        # for all modules receiving output from the current module:
+        # for all modules receiving output from the current module and of
+        # destination ports in the current module's interface for all modules
+        # sending input to the current module:
         self._out_port_dict = {}
         self._out_port_dict_ids = {}
-        self._out_ids = self.out_ids
-        for out_id in self._out_ids:
-            self.log_info('extracting output ports for %s' % out_id)
-
-            # Get interfaces of pattern connecting the current module to
-            # destination module `out_id`; `from_int` is connected to the
-            # current module, `to_int` is connected to the other module:
-            from_int, to_int = self.pat_ints[out_id]
-
-            # Get ports in interface (`from_int`) connected to the current
-            # module that are connected to the other module via the pattern:
-            self._out_port_dict[out_id] = \
-                self.patterns[out_id].src_idx(from_int, to_int)
-            self._out_port_dict_ids[out_id] = \
-                self.pm.ports_to_inds(self._out_port_dict[out_id])
-
-        # Extract identifiers of destination ports in the current module's
-        # interface for all modules sending input to the current module:
         self._in_port_dict = {}
         self._in_port_dict_ids = {}
+        self._out_ids = self.out_ids
         self._in_ids = self.in_ids
-        for in_id in self._in_ids:
-            self.log_info('extracting input ports for %s' % in_id)
-
-            # Get interfaces of pattern connecting the current module to
-            # source module `out_id`; `to_int` is connected to the current
-            # module, `from_int` is connected to the other module:
-            to_int, from_int = self.pat_ints[in_id]
-
-            # Get ports in interface (`to_int`) connected to the current
-            # module that are connected to the other module via the pattern:
-            self._in_port_dict[in_id] = \
-                self.patterns[in_id].dest_idx(from_int, to_int)
-            self._in_port_dict_ids[in_id] = \
-                self.pm.ports_to_inds(self._in_port_dict[in_id])
+        for plan in self._link_plans:
+            if plan.src_id == self.id:
+                self.log_info('extracting output ports for %s' % plan.dest_id)
+                self._out_port_dict_ids[plan.dest_id] = plan.src_idx
+                self._out_port_dict[plan.dest_id] = \
+                    self._inds_to_ports(plan.port_type, plan.src_idx)
+            if plan.dest_id == self.id:
+                self.log_info('extracting input ports for %s' % plan.src_id)
+                self._in_port_dict_ids[plan.src_id] = plan.dest_idx
+                self._in_port_dict[plan.src_id] = \
+                    self._inds_to_ports(plan.port_type, plan.dest_idx)
 
     def run(self):
         """
@@ -1008,6 +1191,66 @@ class TimeListener(ControlledProcess):
 
         return self.queue.get()
 
+def _check_connection(args):
+    """
+    Check the compatibility of two modules' interfaces with a pattern.
+
+    Parameters
+    ----------
+    args : tuple
+        Interfaces of the two modules, the pattern's interface, the
+        identifiers of the pattern's interfaces to connect to the respective
+        modules, and a flag that indicates whether to check compatibility.
+
+    Returns
+    -------
+    result : dict
+        Compatibility of each module's interface with the pattern ('compat_0',
+        'compat_1'); set to True if compatibility was not checked.
+
+    Notes
+    -----
+    This function only accesses the interfaces passed to it so that it can be
+    run in a separate process.
+    """
+
+    int_m_0, int_m_1, int_pat, int_0, int_1, compat_check = args
+    if compat_check:
+        return {'compat_0': int_m_0.is_compatible(0, int_pat, int_0, True),
+                'compat_1': int_m_1.is_compatible(0, int_pat, int_1, True)}
+    else:
+        return {'compat_0': True, 'compat_1': True}
+
+def _read_link_inds(f):
+    """
+    Read the port indices of a link plan saved in .npz format.
+    """
+
+    arrays = np.load(f)
+    return arrays['src_idx'], arrays['dest_idx']
+
+def _read_check_result(f):
+    """
+    Read the result of validating a connection saved in JSON format.
+
+    Lists of port identifiers are converted back to lists of tuples.
+    """
+
+    result = {}
+    for k, v in json.load(f).iteritems():
+        if isinstance(v, list):
+            v = [tuple(str(t) if isinstance(t, unicode) else t for t in port) \
+                 for port in v]
+        result[str(k)] = v
+    return result
+
+def _write_check_result(result, f):
+    """
+    Save the result of validating a connection in JSON format.
+    """
+
+    json.dump(result, f, default=lambda obj: obj.item())
+
 class BaseManager(LoggerMixin):
     """
     Module manager.
@@ -1023,6 +1266,9 @@ class BaseManager(LoggerMixin):
         Port used to control modules.
     port_time : int
         Port used to obtain timing information from modules.
+    cache_dir : str
+        Directory in which to cache the results of validating connections
+        and the compiled link plans. If None, nothing is cached.
 
     Attributes
     ----------
@@ -1042,10 +1288,20 @@ class BaseManager(LoggerMixin):
     Manager -[ctrl]-> BaseModule, Broker, TimeListener
     BaseModule -[time]-> TimeListener
     BaseModule -[data]-> Broker -[data]-> BaseModule
+
+    Cached results are stored under digests of the contents of the
+    interfaces, patterns, and port mappers from which they are computed (see
+    `neurokernel.pattern.content_hash`), so emulations that connect modules
+    with identical interfaces using identical patterns reuse the results
+    regardless of the IDs of the modules.
     """ 
 
+    # Function used to validate connections; must be defined at module level
+    # so that it can be run by a process pool:
+    _check_func = staticmethod(_check_connection)
+
     def __init__(self, port_data=PORT_DATA, port_ctrl=PORT_CTRL,
-                 port_time=PORT_TIME):
+                 port_time=PORT_TIME, cache_dir=None):
 
         # Unique object ID:
         self.id = uid()
@@ -1057,6 +1313,10 @@ class BaseManager(LoggerMixin):
         self.port_ctrl = port_ctrl
         self.port_time = port_time
 
+        self.cache_dir = cache_dir
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
         # Set up a router socket to communicate with other topology
         # components; linger period is set to 0 to prevent hanging on
         # unsent messages when shutting down:
@@ -1080,7 +1340,13 @@ class BaseManager(LoggerMixin):
         # Set up process to handle time data:
         self.time_listener = TimeListener(self.port_ctrl, self.port_time)
 
-    def connect(self, m_0, m_1, pat, int_0=0, int_1=1, compat_check=True):
+        # Connections whose validation has been deferred until the emulation
+        # starts; each entry is a tuple containing the arguments passed to
+        # connect():
+        self._deferred = []
+
+    def connect(self, m_0, m_1, pat, int_0=0, int_1=1, compat_check=True,
+                deferred=False):
         """
         Connect two module instances with a Pattern instance.
 
@@ -1097,22 +1363,253 @@ class BaseManager(LoggerMixin):
             Check whether the interfaces of the specified modules
             are compatible with the specified pattern. This option is provided
             because compatibility checking can be expensive.
+        deferred : bool
+            If True, only register the connection; it is validated and
+            established together with all other deferred connections by
+            `finalize_connections()`, which is invoked by `start()`.
         """
 
         assert isinstance(m_0, BaseModule) and isinstance(m_1, BaseModule)
         assert isinstance(pat, Pattern)
         assert int_0 in pat.interface_ids and int_1 in pat.interface_ids
 
+        if deferred:
+            self.log_info('deferring connection of modules {0} and {1}'
+                          .format(m_0.id, m_1.id))
+            self._deferred.append((m_0, m_1, pat, int_0, int_1, compat_check))
+            return
+
         self.log_info('connecting modules {0} and {1}'
                          .format(m_0.id, m_1.id))
+        result, = self._check([(m_0.interface, m_1.interface, pat.interface,
+                                int_0, int_1, compat_check)])
+        self._validate(m_0, m_1, pat, int_0, int_1, result, {})
+        self._link(m_0, m_1, pat, int_0, int_1, result)
+
+    def finalize_connections(self, processes=None):
+        """
+        Validate and establish all deferred connections.
+
+        Parameters
+        ----------
+        processes : int
+            Number of worker processes to use to validate the connections. If
+            None, the connections are validated in the current process.
+
+        Notes
+        -----
+        Connections are established in the order in which they were
+        registered. If any of them is invalid, none of them is established
+        and all of them remain deferred.
+        """
+
+        if not self._deferred:
+            return
+        deferred = self._deferred
+        self.log_info('validating %i deferred connections' % len(deferred))
+        args = [(m_0.interface, m_1.interface, pat.interface,
+                 int_0, int_1, compat_check) \
+                for m_0, m_1, pat, int_0, int_1, compat_check in deferred]
+        results = self._check(args, processes)
+        claims = {}
+        for (m_0, m_1, pat, int_0, int_1, compat_check), result in \
+                zip(deferred, results):
+            self._validate(m_0, m_1, pat, int_0, int_1, result, claims)
+        self._deferred = []
+        for (m_0, m_1, pat, int_0, int_1, compat_check), result in \
+                zip(deferred, results):
+            self.log_info('connecting modules {0} and {1}'
+                          .format(m_0.id, m_1.id))
+            self._link(m_0, m_1, pat, int_0, int_1, result)
+
+    def _check(self, args, processes=None):
+        """
+        Validate connections, reusing cached results if possible.
+
+        Parameters
+        ----------
+        args : list of tuple
+            Arguments to pass to `_check_func` for each connection.
+        processes : int
+            Number of worker processes to use to validate the connections. If
+            None, the connections are validated in the current process.
+
+        Returns
+        -------
+        results : list of dict
+            Output of `_check_func` for each connection.
+        """
+
+        memo = {}
+        keys = [self._cache_key('check', '.json',
+                                (self._check_func.__module__,)+a, memo) \
+                for a in args]
+        results = [self._cache_read(k, _read_check_result) for k in keys]
+        todo = [j for j, r in enumerate(results) if r is None]
+        if len(todo) < len(args):
+            self.log_info('using %i cached validation results' % \
+                          (len(args)-len(todo)))
+        if processes and todo:
+            pool = mp.Pool(processes)
+            try:
+                new = pool.map(self._check_func, [args[j] for j in todo])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            new = map(self._check_func, [args[j] for j in todo])
+        for j, r in zip(todo, new):
+            results[j] = r
+            self._cache_write(keys[j], lambda f: _write_check_result(r, f))
+        return results
+
+    def _cache_key(self, kind, ext, objs, memo):
+        """
+        Name of the cache file containing data computed from the specified objects.
+
+        Parameters
+        ----------
+        kind : str
+            Kind of data; used as the prefix of the file name.
+        ext : str
+            File name extension.
+        objs : sequence
+            Objects from which the data is computed.
+        memo : dict
+            Digests of interfaces, patterns, and port mappers that have
+            already been computed, keyed on object ID.
+
+        Returns
+        -------
+        key : str
+            File name; None if caching is disabled.
+        """
+
+        if self.cache_dir is None:
+            return None
+        digests = []
+        for obj in objs:
+            if isinstance(obj, (Interface, Pattern, BasePortMapper)):
+                if id(obj) not in memo:
+
+                    # Keep a reference to the object so that its ID is not
+                    # reused while the memo is in use:
+                    memo[id(obj)] = (obj, content_hash(obj))
+                digests.append(memo[id(obj)][1])
+            else:
+                digests.append(obj)
+        return '%s-%s%s' % (kind, content_hash(*digests), ext)
+
+    def _cache_read(self, key, read):
+        """
+        Read data from a cache file.
+
+        Parameters
+        ----------
+        key : str
+            Cache file name returned by `_cache_key`.
+        read : callable
+            Function that reads the data from an open file.
+
+        Returns
+        -------
+        result : object
+            Data read from the file; None if the file does not exist or
+            cannot be read.
+        """
+
+        if key is None:
+            return None
+        file_name = os.path.join(self.cache_dir, key)
+        if not os.path.exists(file_name):
+            return None
+        try:
+            with open(file_name, 'rb') as f:
+                return read(f)
+        except Exception:
+            self.log_info('ignoring unreadable cache file %s' % file_name)
+            return None
+
+    def _cache_write(self, key, write):
+        """
+        Write data to a cache file.
+
+        Parameters
+        ----------
+        key : str
+            Cache file name returned by `_cache_key`.
+        write : callable
+            Function that writes the data to an open file.
+
+        Notes
+        -----
+        The data is written to a temporary file that is then renamed so that
+        emulations sharing the cache directory never read partially written
+        files.
+        """
+
+        if key is None:
+            return
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.rename(tmp_name, os.path.join(self.cache_dir, key))
+        except:
+            os.remove(tmp_name)
+            raise
+
+    def _validate(self, m_0, m_1, pat, int_0, int_1, result, claims):
+        """
+        Check that two modules can be connected with a pattern.
+
+        Parameters
+        ----------
+        m_0, m_1 : BaseModule
+            Module instances to connect.
+        pat : Pattern
+            Pattern instance.
+        int_0, int_1 : int
+            Which of the pattern's interfaces to connect to `m_0` and `m_1`,
+            respectively.
+        result : dict
+            Output of `_check_func` for the connection.
+        claims : dict
+            Input ports claimed by the modules once the connections validated
+            so far are established (see `BaseModule._claim_in_ports`), keyed
+            on module ID; updated with the claims of the new connection.
+            Modules without an entry only have their current claims.
+        """
 
         # Check whether the interfaces exposed by the modules and the
         # pattern share compatible subsets of ports:
-        if compat_check:
-            self.log_info('checking compatibility of modules {0} and {1} and'
-                             ' assigned pattern'.format(m_0.id, m_1.id))
-            assert m_0.interface.is_compatible(0, pat.interface, int_0, True)
-            assert m_1.interface.is_compatible(0, pat.interface, int_1, True)
+        assert result['compat_0']
+        assert result['compat_1']
+
+        # Check that the connection doesn't cause fan-in to either module;
+        # the claims are only updated if neither check fails:
+        claims_0 = m_0._claim_in_ports(m_1.id, pat, int_0, claims.get(m_0.id))
+        claims_1 = m_1._claim_in_ports(m_0.id, pat, int_1, claims.get(m_1.id))
+        claims[m_0.id] = claims_0
+        claims[m_1.id] = claims_1
+
+    def _link(self, m_0, m_1, pat, int_0, int_1, result):
+        """
+        Connect two modules with a pattern that has been validated.
+
+        Parameters
+        ----------
+        m_0, m_1 : BaseModule
+            Module instances to connect.
+        pat : Pattern
+            Pattern instance.
+        int_0, int_1 : int
+            Which of the pattern's interfaces to connect to `m_0` and `m_1`,
+            respectively.
+        result : dict
+            Output of `_check_func` for the connection; must have been
+            accepted by `_validate`.
+        """
 
         # Add the module and pattern instances to the internal dictionaries of
         # the manager instance if they are not already there:
@@ -1125,11 +1622,12 @@ class BaseManager(LoggerMixin):
         self.time_listener.add(m_0.id)
         self.time_listener.add(m_1.id)
 
-        # Pass the pattern to the modules being connected:
+        # Pass the pattern to the modules being connected; compatibility has
+        # already been checked:
         self.log_info('passing connection pattern to modules {0} and {1}'
             .format(m_0.id, m_1.id))
-        m_0.connect(m_1, pat, int_0, int_1)
-        m_1.connect(m_0, pat, int_1, int_0)
+        m_0.connect(m_1, pat, int_0, int_1, False)
+        m_1.connect(m_0, pat, int_1, int_0, False)
 
         # Update the routing table:
         self.log_info('updating routing table')
@@ -1140,6 +1638,45 @@ class BaseManager(LoggerMixin):
 
         self.log_info('connected modules {0} and {1}'.format(m_0.id, m_1.id))
 
+    def compile_plans(self):
+        """
+        Compile the connections between modules into link plans.
+
+        For each pair of connected modules and each port type, the indices of
+        the source module's ports that transmit data to the destination
+        module and of the destination module's ports that receive it are
+        computed once and passed to both modules as a `LinkPlan`. The modules
+        discard their patterns so that they are not copied to the processes
+        in which the modules run.
+        """
+
+        memo = {}
+        plans = dict((m_id, []) for m_id in self.modules)
+        for m in self.modules.itervalues():
+            if m._link_plans is not None:
+                continue
+            for out_id in m.out_ids:
+                dest = self.modules[out_id]
+                int_0, int_1 = m.pat_ints[out_id]
+                for t in m._port_types:
+                    key = self._cache_key('link', '.npz',
+                                          (t, m.patterns[out_id], int_0, int_1,
+                                           m._port_mapper(t),
+                                           dest._port_mapper(t)), memo)
+                    inds = self._cache_read(key, _read_link_inds)
+                    if inds is None:
+                        inds = (m._link_inds(out_id, t, True),
+                                dest._link_inds(m.id, t, False))
+                        self._cache_write(key, lambda f: \
+                            np.savez(f, src_idx=inds[0], dest_idx=inds[1]))
+                    plan = LinkPlan(m.id, out_id, t, *inds)
+                    plans[m.id].append(plan)
+                    plans[out_id].append(plan)
+        for m_id, m_plans in plans.iteritems():
+            if self.modules[m_id]._link_plans is None:
+                self.modules[m_id].set_link_plans(m_plans)
+        self.log_info('compiled link plans')
+
     @property
     def N_brok(self):
         """
@@ -1200,6 +1737,8 @@ class BaseManager(LoggerMixin):
         """
 
         self.max_steps = steps
+        self.finalize_connections()
+        self.compile_plans()
         with IgnoreKeyboardInterrupt():
             self.log_info('time listener about to start')
             self.time_listener.start()
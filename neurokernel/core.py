@@ -15,7 +15,7 @@ import twiggy
 
 from mixins import LoggerMixin
 from base import BaseModule, BaseManager, Broker, \
-    PORT_DATA, PORT_CTRL, PORT_TIME
+    PORT_DATA, PORT_CTRL, PORT_TIME, _check_connection as _check_compat
 
 from ctx_managers import (IgnoreKeyboardInterrupt, OnKeyboardInterrupt,
                           ExceptionOnSignal, TryExceptionOnSignal)
@@ -24,7 +24,115 @@ from tools.comm import get_random_port
 from tools.misc import catch_exception
 from uid import uid
 from pattern import Interface, Pattern
-from plsel import SelectorMethods, BasePortMapper, PortMapper
+from plsel import SelectorMethods, BasePortMapper, PortMapper, IndexPlan
+
+def _arena_layout(sizes, dtypes):
+    """
+    Compute the layout of typed arrays stored contiguously in one buffer.
+
+    Parameters
+    ----------
+    sizes : sequence of int
+        Number of elements in each array.
+    dtypes : sequence of numpy.dtype
+        Type of each array.
+
+    Returns
+    -------
+    offsets : list of int
+        Byte offset of each array in the buffer. Each offset is aligned to
+        the size of the corresponding array's elements.
+    nbytes : int
+        Total size of the buffer in bytes.
+    """
+
+    offsets = []
+    nbytes = 0
+    for n, dtype in zip(sizes, dtypes):
+        itemsize = np.dtype(dtype).itemsize
+        nbytes += -nbytes % itemsize
+        offsets.append(nbytes)
+        nbytes += n*itemsize
+    return offsets, nbytes
+
+def _arena_views(buf, sizes, dtypes):
+    """
+    Create typed views of the arrays stored contiguously in a byte buffer.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray of uint8
+        Buffer laid out as described by `_arena_layout()`.
+    sizes : sequence of int
+        Number of elements in each array.
+    dtypes : sequence of numpy.dtype
+        Type of each array.
+
+    Returns
+    -------
+    views : tuple of numpy.ndarray
+        Views of the arrays in the buffer.
+    """
+
+    offsets, nbytes = _arena_layout(sizes, dtypes)
+    assert len(buf) == nbytes
+    return tuple(np.frombuffer(buf, dtype, n, offset) \
+                 for offset, n, dtype in zip(offsets, sizes, dtypes))
+
+# Header that precedes the arrays in a transmitted buffer; it contains the
+# number of elements and the type of the graded potential and spiking port
+# arrays so that the receiver can decode buffers sent by modules whose port
+# data types differ from its own. Its size is a multiple of the element size
+# of all numeric types so that the arrays remain aligned:
+_ARENA_HEADER = np.dtype([('sizes', '<i8', 2), ('dtypes', 'S8', 2)])
+
+def _arena_alloc(sizes, dtypes):
+    """
+    Allocate a buffer to transmit graded potential and spiking port data.
+
+    Parameters
+    ----------
+    sizes : sequence of int
+        Number of elements in each array.
+    dtypes : sequence of numpy.dtype
+        Type of each array.
+
+    Returns
+    -------
+    buf : numpy.ndarray of uint8
+        Buffer containing a header that describes the arrays followed by the
+        arrays laid out as described by `_arena_layout()`.
+    views : tuple of numpy.ndarray
+        Views of the arrays in the buffer.
+    """
+
+    header_size = _ARENA_HEADER.itemsize
+    buf = np.zeros(header_size+_arena_layout(sizes, dtypes)[1], np.uint8)
+    header = buf[:header_size].view(_ARENA_HEADER)[0]
+    header['sizes'] = sizes
+    header['dtypes'] = [np.dtype(dtype).str for dtype in dtypes]
+    return buf, _arena_views(buf[header_size:], sizes, dtypes)
+
+def _arena_unpack(buf):
+    """
+    Create views of the arrays in a buffer allocated by `_arena_alloc()`.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray of uint8
+        Received buffer.
+
+    Returns
+    -------
+    views : tuple of numpy.ndarray
+        Views of the arrays in the buffer; their types are those with which
+        the sender allocated the buffer.
+    """
+
+    header_size = _ARENA_HEADER.itemsize
+    header = np.frombuffer(buf, _ARENA_HEADER, 1)[0]
+    return _arena_views(buf[header_size:], header['sizes'].tolist(),
+                        [np.dtype(d) for d in header['dtypes']])
 
 class Module(BaseModule):
     """
@@ -71,6 +179,10 @@ class Module(BaseModule):
         Time synchronization flag. When True, debug messages are not emitted during
         module synchronization and the time taken to receive all incoming data is 
         computed.
+    arena : bool
+        If True, the graded potential and spiking port data transmitted to
+        each destination module are laid out contiguously in a single buffer
+        rather than sent as a tuple of two arrays.
         
     Notes
     -----
@@ -78,18 +190,25 @@ class Module(BaseModule):
     connectivity objects that describe incoming connects and a list of
     masks that select for the neurons whose data must be transmitted to
     destination modules.
+
+    Modules accept data transmitted in either layout regardless of the value
+    of `arena`.
     """
 
+    _port_types = ['gpot', 'spike']
+
     def __init__(self, sel, sel_in, sel_out, 
                  sel_gpot, sel_spike,
                  data_gpot, data_spike,
                  columns=['interface', 'io', 'type'],
                  port_data=PORT_DATA, port_ctrl=PORT_CTRL, port_time=PORT_TIME,
-                 id=None, device=None, debug=False, time_sync=False):
+                 id=None, device=None, debug=False, time_sync=False,
+                 arena=False):
 
         self.debug = debug
         self.time_sync = time_sync
         self.device = device
+        self.arena = arena
 
         # Require several necessary attribute columns:
         assert 'interface' in columns
@@ -157,6 +276,17 @@ class Module(BaseModule):
         # Keyed on the IDs of those modules:
         self.pat_ints = {}
 
+        # Interned IDs of the input ports of this module connected by each
+        # pattern and of the input ports connected by all patterns; used to
+        # detect fan-in from different source modules. Keyed on the IDs of the
+        # modules to which the patterns connect:
+        self._in_port_ids = {}
+        self._claimed_in_ports = set()
+
+        # List of LinkPlan instances describing the data transmitted to and
+        # from the module; set by the manager before the emulation starts:
+        self._link_plans = None
+
         # Dict for storing incoming data; each entry (corresponding to each
         # module that sends input to the current module) is a deque containing
         # incoming data, which in turn contains transmitted data arrays. Deques
@@ -177,6 +307,10 @@ class Module(BaseModule):
         self._in_port_dict['gpot'] = {}
         self._in_port_dict['spike'] = {}
 
+        # Precompiled plans for scattering received data into the port data
+        # arrays; keyed on source module ID:
+        self._in_port_plans = {'gpot': {}, 'spike': {}}
+
         # Dictionaries containing ports of destination modules that
         # receive input from this module. Must be initialized immediately before
         # an emulation begins running. Keyed on destination module ID:
@@ -185,9 +319,18 @@ class Module(BaseModule):
         self._out_port_dict['gpot'] = {}
         self._out_port_dict['spike'] = {}
 
+        # Precompiled plans for gathering data to transmit from the port data
+        # arrays; keyed on destination module ID:
+        self._out_port_plans = {'gpot': {}, 'spike': {}}
+
         self._out_ids = []
         self._in_ids = []
 
+        # Persistent send buffers; allocated with the port dictionaries:
+        self._out_bufs = []
+        self._out_views = []
+        self._out_bufs_dtypes = None
+
     def _init_gpu(self):
         """
         Initialize GPU device.
@@ -261,11 +404,19 @@ class Module(BaseModule):
                 else:
                     self.log_info('input data from [%s] retrieved' % in_id)
 
+                    # Data laid out contiguously in a single buffer must be
+                    # split into graded potential and spiking port values
+                    # using the types with which the sender wrote them; the
+                    # values are cast to the types of the module's port data
+                    # when they are assigned:
+                    if isinstance(data, np.ndarray):
+                        data = _arena_unpack(data)
+
                     # Assign transmitted values directly to port data array:
                     if len(self._in_port_dict_ids['gpot'][in_id]):
-                        self.pm['gpot'].set_by_inds(self._in_port_dict_ids['gpot'][in_id], data[0])
+                        self.pm['gpot'].set_by_plan(self._in_port_plans['gpot'][in_id], data[0])
                     if len(self._in_port_dict_ids['spike'][in_id]):
-                        self.pm['spike'].set_by_inds(self._in_port_dict_ids['spike'][in_id], data[1])
+                        self.pm['spike'].set_by_plan(self._in_port_plans['spike'][in_id], data[1])
                     
 
     def _put_out_data(self):
@@ -285,32 +436,54 @@ class Module(BaseModule):
         else:
             self.log_info('populating output buffer')
 
-            # Clear output buffer before populating it:
-            self._out_data = []
-
-            # Select data that should be sent to each destination module and append
-            # it to the outgoing queue:
-            for out_id in self._out_ids:
-                # Select port data using list of graded potential ports that can
-                # transmit output:
-                if len(self._out_port_dict_ids['gpot'][out_id]):
-                    gpot_data = \
-                        self.pm['gpot'].get_by_inds(self._out_port_dict_ids['gpot'][out_id])
-                else:
-                    gpot_data = np.array([], self.pm['gpot'].dtype)
-                if len(self._out_port_dict_ids['spike'][out_id]):
-                    spike_data = \
-                        self.pm['spike'].get_by_inds(self._out_port_dict_ids['spike'][out_id])
-                else:
-                    spike_data = np.array([], self.pm['spike'].dtype)
+            # Reallocate the send buffers if the type of the port data arrays
+            # was changed after the buffers were allocated:
+            if self._out_bufs_dtypes != (self.pm['gpot'].dtype,
+                                         self.pm['spike'].dtype):
+                self._alloc_out_bufs()
+
+            # The send buffers for all destination modules are allocated once
+            # and refilled in place; this is safe because the transport
+            # serializes the buffers before the next step overwrites them:
+            self._out_data = self._out_bufs
+
+            # Select data that should be sent to each destination module and
+            # copy it into the module's send buffers (or their views):
+            for out_id, (gpot_data, spike_data) in self._out_views:
+                if len(gpot_data):
+                    self.pm['gpot'].get_by_plan(self._out_port_plans['gpot'][out_id],
+                                                gpot_data)
+                if len(spike_data):
+                    self.pm['spike'].get_by_plan(self._out_port_plans['spike'][out_id],
+                                                 spike_data)
+                self.log_info('output data to [%s] sent' % out_id)
+
+    def _alloc_out_bufs(self):
+        """
+        Allocate send buffers for all destination modules.
+
+        Each entry of the `_out_bufs` list is a tuple whose first entry is the
+        destination module ID and whose second entry contains the data to
+        transmit: either a tuple of arrays for the graded potential and spiking
+        port data or, if `arena` is True, a single byte buffer containing
+        both. The corresponding entries of `_out_views` contain the arrays
+        (or views of the byte buffer) into which the data is gathered.
+        """
 
-                # Attempt to stage the emitted port data for transmission:            
-                try:
-                    self._out_data.append((out_id, (gpot_data, spike_data)))
-                except:
-                    self.log_info('no output data to [%s] sent' % out_id)
-                else:
-                    self.log_info('output data to [%s] sent' % out_id)
+        dtypes = [self.pm[t].dtype for t in ['gpot', 'spike']]
+        self._out_bufs_dtypes = tuple(dtypes)
+        self._out_bufs = []
+        self._out_views = []
+        for out_id in self._out_ids:
+            sizes = [len(self._out_port_plans[t][out_id]) \
+                     for t in ['gpot', 'spike']]
+            if self.arena:
+                buf, views = _arena_alloc(sizes, dtypes)
+            else:
+                buf = views = tuple(np.empty(n, dtype) \
+                                    for n, dtype in zip(sizes, dtypes))
+            self._out_bufs.append((out_id, buf))
+            self._out_views.append((out_id, views))
                 
     def run_step(self):
         """
@@ -324,68 +497,57 @@ class Module(BaseModule):
 
         self.log_info('running execution step')
 
+    def _port_mapper(self, port_type):
+        """
+        Port mapper of the module's ports of the specified type.
+        """
+
+        return self.pm[port_type]
+
     def _init_port_dicts(self):
         """
         Initial dictionaries of source/destination ports in current module.
         """
 
-        # Extract identifiers of source ports in the current module's interface
-        # for all modules receiving output from the current module:
-        self._out_port_dict['gpot'] = {}
-        self._out_port_dict['spike'] = {}
-        self._out_port_dict_ids['gpot'] = {}
-        self._out_port_dict_ids['spike'] = {}
-
+        # Use the patterns connected to the module if the manager did not
+        # provide link plans:
+        if self._link_plans is None:
+            self._link_plans = self._local_link_plans()
+
+        for t in self._port_types:
+            self._out_port_dict[t] = {}
+            self._out_port_dict_ids[t] = {}
+            self._out_port_plans[t] = {}
+            self._in_port_dict[t] = {}
+            self._in_port_dict_ids[t] = {}
+            self._in_port_plans[t] = {}
         self._out_ids = self.out_ids
-        for out_id in self._out_ids:
-            self.log_info('extracting output ports for %s' % out_id)
-
-            # Get interfaces of pattern connecting the current module to
-            # destination module `out_id`; `from_int` is connected to the
-            # current module, `to_int` is connected to the other module:
-            from_int, to_int = self.pat_ints[out_id]
-
-            # Get ports in interface (`from_int`) connected to the current
-            # module that are connected to the other module via the pattern:
-            self._out_port_dict['gpot'][out_id] = \
-                self.patterns[out_id].src_idx(from_int, to_int,
-                                              'gpot', 'gpot')
-            self._out_port_dict_ids['gpot'][out_id] = \
-                self.pm['gpot'].ports_to_inds(self._out_port_dict['gpot'][out_id])
-            self._out_port_dict['spike'][out_id] = \
-                self.patterns[out_id].src_idx(from_int, to_int,
-                                              'spike', 'spike')
-            self._out_port_dict_ids['spike'][out_id] = \
-                self.pm['spike'].ports_to_inds(self._out_port_dict['spike'][out_id])
-                                                              
-        # Extract identifiers of destination ports in the current module's
-        # interface for all modules sending input to the current module:
-        self._in_port_dict['gpot'] = {}
-        self._in_port_dict['spike'] = {}
-        self._in_port_dict_ids['gpot'] = {}
-        self._in_port_dict_ids['spike'] = {}
-
         self._in_ids = self.in_ids
-        for in_id in self._in_ids:
-            self.log_info('extracting input ports for %s' % in_id)
-
-            # Get interfaces of pattern connecting the current module to
-            # source module `out_id`; `to_int` is connected to the current
-            # module, `from_int` is connected to the other module:
-            to_int, from_int = self.pat_ints[in_id]
-
-            # Get ports in interface (`to_int`) connected to the current
-            # module that are connected to the other module via the pattern:
-            self._in_port_dict['gpot'][in_id] = \
-                self.patterns[in_id].dest_idx(from_int, to_int,
-                                              'gpot', 'gpot')
-            self._in_port_dict_ids['gpot'][in_id] = \
-                self.pm['gpot'].ports_to_inds(self._in_port_dict['gpot'][in_id])
-            self._in_port_dict['spike'][in_id] = \
-                self.patterns[in_id].dest_idx(from_int, to_int,
-                                              'spike', 'spike')
-            self._in_port_dict_ids['spike'][in_id] = \
-                self.pm['spike'].ports_to_inds(self._in_port_dict['spike'][in_id])
+
+        # Extract identifiers of source ports in the current module's interface
+        # for all modules receiving output from the current module and of
+        # destination ports in the current module's interface for all modules
+        # sending input to the current module; compile plans for gathering
+        # the data to transmit and for scattering the received data:
+        for plan in self._link_plans:
+            t = plan.port_type
+            if plan.src_id == self.id:
+                self.log_info('extracting %s output ports for %s' % \
+                              (t, plan.dest_id))
+                self._out_port_dict_ids[t][plan.dest_id] = plan.src_idx
+                self._out_port_dict[t][plan.dest_id] = \
+                    self._inds_to_ports(t, plan.src_idx)
+                self._out_port_plans[t][plan.dest_id] = IndexPlan(plan.src_idx)
+            if plan.dest_id == self.id:
+                self.log_info('extracting %s input ports for %s' % \
+                              (t, plan.src_id))
+                self._in_port_dict_ids[t][plan.src_id] = plan.dest_idx
+                self._in_port_dict[t][plan.src_id] = \
+                    self._inds_to_ports(t, plan.dest_idx)
+                self._in_port_plans[t][plan.src_id] = IndexPlan(plan.dest_idx)
+
+        # Allocate send buffers for the data to transmit:
+        self._alloc_out_bufs()
 
     def pre_run(self, *args, **kwargs):
         """
@@ -493,6 +655,33 @@ class Module(BaseModule):
                 
         self.log_info('exiting')
 
+def _check_connection(args):
+    """
+    Check two modules' interfaces against a pattern and find their common ports.
+
+    Parameters
+    ----------
+    args : tuple
+        Interfaces of the two modules, the pattern's interface, the
+        identifiers of the pattern's interfaces to connect to the respective
+        modules, and a flag that indicates whether to check compatibility.
+
+    Returns
+    -------
+    result : dict
+        Compatibility of each module's interface with the pattern ('compat_0',
+        'compat_1') and the spiking ports each module's interface shares with
+        the pattern ('common_spike_ports_0', 'common_spike_ports_1').
+    """
+
+    int_m_0, int_m_1, int_pat, int_0, int_1, compat_check = args
+    result = _check_compat(args)
+    result['common_spike_ports_0'] = \
+        int_m_0.get_common_ports(0, int_pat, int_0, 'spike')
+    result['common_spike_ports_1'] = \
+        int_m_1.get_common_ports(0, int_pat, int_1, 'spike')
+    return result
+
 class Manager(BaseManager):
     """
     Module manager.
@@ -517,9 +706,40 @@ class Manager(BaseManager):
         Table of data transmission connections between modules.
     """ 
 
-    def connect(self, m_0, m_1, pat, int_0=0, int_1=1, compat_check=True):
+    _check_func = staticmethod(_check_connection)
+
+    def _validate(self, m_0, m_1, pat, int_0, int_1, result, claims):
+        """
+        Check that two modules can be connected with a pattern.
+
+        Parameters
+        ----------
+        m_0, m_1 : BaseModule
+            Module instances to connect.
+        pat : Pattern
+            Pattern instance.
+        int_0, int_1 : int
+            Which of the pattern's interfaces to connect to `m_0` and `m_1`,
+            respectively.
+        result : dict
+            Output of `_check_func` for the connection.
+        claims : dict
+            Input ports claimed by the modules once the connections validated
+            so far are established, keyed on module ID.
+        """
+
+        super(Manager, self)._validate(m_0, m_1, pat, int_0, int_1, result,
+                                       claims)
+
+        # The ports common to each of the pattern's interfaces and the
+        # respective interfaces of the modules connected to them should be
+        # disjoint:
+        assert set(result['common_spike_ports_0']).isdisjoint(
+            result['common_spike_ports_1'])
+
+    def _link(self, m_0, m_1, pat, int_0, int_1, result):
         """
-        Connect two module instances with a Pattern instance.
+        Connect two modules with a pattern that has been validated.
 
         Parameters
         ----------
@@ -530,35 +750,13 @@ class Manager(BaseManager):
         int_0, int_1 : int
             Which of the pattern's interfaces to connect to `m_0` and `m_1`,
             respectively.
-        compat_check : bool
-            Check whether the interfaces of the specified modules
-            are compatible with the specified pattern. This option is provided
-            because compatibility checking can be expensive.        
+        result : dict
+            Output of `_check_func` for the connection; must have been
+            accepted by `_validate`.
         """
 
-        assert isinstance(m_0, BaseModule) and isinstance(m_1, BaseModule)
-        assert isinstance(pat, Pattern)
-        assert int_0 in pat.interface_ids and int_1 in pat.interface_ids
-
-        self.log_info('connecting modules {0} and {1}'
-                         .format(m_0.id, m_1.id))
-
-        # Check whether the interfaces exposed by the modules and the
-        # pattern share compatible subsets of ports:
-        if compat_check:
-            self.log_info('checking compatibility of modules {0} and {1} and'
-                             ' assigned pattern'.format(m_0.id, m_1.id))
-            assert m_0.interface.is_compatible(0, pat.interface, int_0, True)
-            assert m_1.interface.is_compatible(0, pat.interface, int_1, True)
-
-        # Find the ports common to each of the pattern's interfaces and the
-        # respective interfaces of the modules connected to them; these two sets
-        # of ports should be disjoint:
-        common_spike_ports_0 = \
-            m_0.interface.get_common_ports(0, pat.interface, int_0, 'spike')
-        common_spike_ports_1 = \
-            m_1.interface.get_common_ports(0, pat.interface, int_1, 'spike')
-        assert set(common_spike_ports_0).isdisjoint(common_spike_ports_1)
+        common_spike_ports_0 = result['common_spike_ports_0']
+        common_spike_ports_1 = result['common_spike_ports_1']
 
         # Set the mappings between port identifiers and integer indices in the
         # pattern's interfaces to conform to those of the connected modules'
@@ -570,30 +768,7 @@ class Manager(BaseManager):
             np.concatenate((m_0.pm['spike'].get_map(common_spike_ports_0),
                             m_1.pm['spike'].get_map(common_spike_ports_1))))
 
-        # Add the module and pattern instances to the internal dictionaries of
-        # the manager instance if they are not already there:
-        if m_0.id not in self.modules:
-            self.add_mod(m_0)
-        if m_1.id not in self.modules:
-            self.add_mod(m_1)
-
-        # Make the timing listener aware of the module IDs:
-        self.time_listener.add(m_0.id)
-        self.time_listener.add(m_1.id)
-
-        # Pass the pattern to the modules being connected:
-        self.log_info('passing connection pattern to modules {0} and {1}'.format(m_0.id, m_1.id))
-        m_0.connect(m_1, pat, int_0, int_1, compat_check)
-        m_1.connect(m_0, pat, int_1, int_0, compat_check)
-
-        # Update the routing table:
-        self.log_info('updating routing table')
-        if pat.is_connected(0, 1):
-            self.routing_table[m_0.id, m_1.id] = 1
-        if pat.is_connected(1, 0):
-            self.routing_table[m_1.id, m_0.id] = 1
-
-        self.log_info('connected modules {0} and {1}'.format(m_0.id, m_1.id))
+        super(Manager, self)._link(m_0, m_1, pat, int_0, int_1, result)
 
 if __name__ == '__main__':
     import time
@@ -5,6 +5,7 @@ Represent connectivity pattern using pandas DataFrame.
 """
 
 from collections import OrderedDict
+import hashlib
 import itertools
 import re
 
@@ -12,7 +13,321 @@ import networkx as nx
 import numpy as np
 import pandas as pd
 
-from plsel import Selector, BasePortMapper, SelectorMethods
+from plsel import Selector, BasePortMapper, SelectorMethods, PortTrie, port_ids
+from tools.misc import load_npz
+
+# Characters denoting selector operators that combine several identifiers:
+_combining_re = re.compile(r'[,+()]')
+
+# Codes denoting the types of values saved by `_encode_values`:
+_NULL, _STR, _UNICODE, _INT, _FLOAT, _BOOL = range(6)
+
+def _encode_values(values):
+    """
+    Encode a sequence of scalars as integer codes and a table of distinct values.
+
+    Parameters
+    ----------
+    values : sequence
+        Strings, numbers, or nulls.
+
+    Returns
+    -------
+    codes : numpy.ndarray of int64
+        Position of each value in the table of distinct values; nulls are
+        denoted by -1.
+    kinds : numpy.ndarray of int8
+        Type code of each distinct value.
+    strs : numpy.ndarray of unicode
+        Distinct string and floating point values (the latter represented as
+        strings); empty for other values.
+    ints : numpy.ndarray of int64
+        Distinct integer and boolean values; 0 for other values.
+    """
+
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    codes = codes.astype(np.int64)
+    n = len(uniques)
+
+    # Avoid examining each distinct value if all of them have the same type:
+    inferred = pd.lib.infer_dtype(uniques)
+    if inferred == 'integer':
+        return codes, np.full(n, _INT, np.int8), \
+            np.zeros(n, np.unicode_), uniques.astype(np.int64)
+    elif inferred == 'string':
+        return codes, np.full(n, _STR, np.int8), \
+            np.char.decode(uniques.astype(np.bytes_), 'utf-8'), \
+            np.zeros(n, np.int64)
+    elif inferred == 'unicode':
+        return codes, np.full(n, _UNICODE, np.int8), \
+            uniques.astype(np.unicode_), np.zeros(n, np.int64)
+
+    kinds = np.empty(n, dtype=np.int8)
+    strs = [u'']*n
+    ints = np.zeros(n, dtype=np.int64)
+    for i, u in enumerate(uniques):
+        if isinstance(u, (bool, np.bool_)):
+            kinds[i], ints[i] = _BOOL, u
+        elif isinstance(u, (int, long, np.integer)):
+            kinds[i], ints[i] = _INT, u
+        elif isinstance(u, (float, np.floating)):
+            kinds[i], strs[i] = _FLOAT, unicode(repr(float(u)))
+        elif isinstance(u, str):
+            kinds[i], strs[i] = _STR, u.decode('utf-8')
+        elif isinstance(u, unicode):
+            kinds[i], strs[i] = _UNICODE, u
+        else:
+            raise ValueError('cannot encode value of type %s' % type(u))
+    return codes, kinds, np.array(strs, dtype=np.unicode_), ints
+
+def _decode_values(codes, kinds, strs, ints):
+    """
+    Decode values encoded by `_encode_values`.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray of int
+        Position of each value in the table of distinct values; nulls are
+        denoted by -1.
+    kinds : numpy.ndarray of int8
+        Type code of each distinct value.
+    strs : numpy.ndarray of unicode
+        Distinct string and floating point values.
+    ints : numpy.ndarray of int64
+        Distinct integer and boolean values.
+
+    Returns
+    -------
+    values : numpy.ndarray of object
+        Decoded values; nulls are represented by NaN.
+    """
+
+    conv = {_STR: lambda m: np.char.encode(strs[m], 'utf-8'),
+            _UNICODE: lambda m: strs[m],
+            _INT: lambda m: ints[m],
+            _FLOAT: lambda m: strs[m].astype(np.float64),
+            _BOOL: lambda m: ints[m].astype(np.bool_)}
+    kinds = np.asarray(kinds)
+    strs = np.asarray(strs)
+    ints = np.asarray(ints)
+    uniques = np.empty(len(kinds)+1, dtype=object)
+    for k, f in conv.iteritems():
+        mask = kinds == k
+        if mask.any():
+            uniques[:-1][mask] = f(mask).astype(object)
+    uniques[-1] = np.nan
+
+    # Nulls are mapped to the last entry in the table:
+    return uniques[np.where(codes < 0, len(kinds), codes)]
+
+def _store_values(arrays, key, values):
+    """
+    Encode values and store the encoded arrays in a dict.
+    """
+
+    codes, kinds, strs, ints = _encode_values(values)
+    arrays[key+'_codes'] = codes
+    arrays[key+'_kinds'] = kinds
+    arrays[key+'_strs'] = strs
+    arrays[key+'_ints'] = ints
+
+def _fetch_values(arrays, key):
+    """
+    Decode values stored in a dict by `_store_values`.
+    """
+
+    return _decode_values(arrays[key+'_codes'], arrays[key+'_kinds'],
+                          arrays[key+'_strs'], arrays[key+'_ints'])
+
+def _index_labels(idx):
+    """
+    Return the levels of an index and the labels of its rows.
+
+    Parameters
+    ----------
+    idx : pandas.Index or pandas.MultiIndex
+        Index.
+
+    Returns
+    -------
+    levels : list of numpy.ndarray
+        Distinct values in each level of the index.
+    labels : list of numpy.ndarray of int
+        Position in the corresponding level of each row's value.
+    """
+
+    if isinstance(idx, pd.MultiIndex):
+        return [l.values for l in idx.levels], \
+            [np.asarray(l) for l in idx.labels]
+    else:
+        labels, level = pd.factorize(idx.values)
+        return [level], [labels]
+
+def _same_values(a, b):
+    """
+    Check whether two arrays contain the same values.
+
+    Nulls in the same positions of both arrays are deemed to be equal.
+    """
+
+    if a.shape != b.shape or a.dtype != b.dtype:
+        return False
+    eq = a == b
+    if not isinstance(eq, np.ndarray):
+        return False
+    return eq.all() or (eq | (pd.isnull(a) & pd.isnull(b))).all()
+
+def _store_index(arrays, prefix, idx):
+    """
+    Encode an index and store the encoded arrays in a dict.
+    """
+
+    levels, labels = _index_labels(idx)
+    arrays[prefix+'multi'] = np.array(isinstance(idx, pd.MultiIndex))
+    _store_values(arrays, prefix+'names', idx.names)
+    for k, (level, label) in enumerate(zip(levels, labels)):
+        _store_values(arrays, prefix+'level_%i' % k, level)
+        arrays[prefix+'labels_%i' % k] = label
+
+# Version of the data from which content_hash() computes digests; must be
+# incremented whenever that data changes so that digests computed by earlier
+# versions (e.g., those naming cached files) are not reused:
+_CONTENT_HASH_VERSION = 1
+
+def content_hash(*objs):
+    """
+    Compute a digest of the contents of interfaces, patterns, and port mappers.
+
+    Parameters
+    ----------
+    objs : sequence
+        Interface, Pattern, or `neurokernel.plsel.BasePortMapper` instances
+        or other objects whose `repr` identifies their value (e.g., numbers
+        or strings).
+
+    Returns
+    -------
+    digest : str
+        Hexadecimal SHA-1 digest. Objects with equal contents have the same
+        digest regardless of the process in which it is computed.
+    """
+
+    h = hashlib.sha1()
+    h.update('content_hash:%i;' % _CONTENT_HASH_VERSION)
+    for obj in objs:
+        if isinstance(obj, (Interface, Pattern)):
+            arrays = obj._to_arrays()
+        elif isinstance(obj, BasePortMapper):
+            arrays = {'portmap': np.asarray(obj.portmap)}
+            _store_index(arrays, 'index_', obj.index)
+        else:
+            arrays = {'repr': np.array(repr(obj))}
+        h.update('%s:%i;' % (obj.__class__.__name__, len(arrays)))
+        for k in sorted(arrays):
+            a = np.ascontiguousarray(arrays[k])
+            h.update('%s:%s:%r;' % (k, a.dtype.str, a.shape))
+            h.update(a.tobytes())
+    return h.hexdigest()
+
+def _read_csv_positions(interface, names, columns, file_name, chunksize,
+                        **kwargs):
+    """
+    Read connections between ports in an interface from a CSV file in chunks.
+
+    Parameters
+    ----------
+    interface : Interface
+        Interface containing the connected ports.
+    names : list of str
+        Names of the source and destination port identifier levels, i.e., of
+        the first columns in the file; there must be as many source and
+        destination levels as there are levels in the interface's index.
+    columns : list of str
+        Names of the connection attribute columns that follow the identifier
+        levels in the file.
+    file_name : str
+        Input file name.
+    chunksize : int
+        Number of rows to read at a time.
+    kwargs : dict
+        Additional arguments to pass to `pandas.read_csv`.
+
+    Returns
+    -------
+    pos_src, pos_dest : numpy.ndarray of int64
+        Positions of the source and destination ports of each connection in the
+        interface's index.
+    data : dict of numpy.ndarray
+        Connection attribute arrays keyed on column name.
+
+    Notes
+    -----
+    Each chunk's port tokens are matched against the tokens in each level of
+    the interface's index and discarded; only the positions of the ports and
+    the attributes of the connections are retained.
+    """
+
+    levels, labels = _index_labels(interface.data.index)
+    n = len(levels)
+    if len(names) != 2*n:
+        raise ValueError('incorrectly named pattern index levels')
+
+    # Tokens are matched on their string representations because the type of
+    # a token cannot be inferred from a CSV file; blank tokens (i.e., padding)
+    # are read as null values:
+    level_strs = [pd.Index([t if isinstance(t, basestring) else str(t) \
+                            for t in level]) for level in levels]
+
+    # Combine the labels of each port in the interface's index into a single
+    # integer key one level at a time; after each level, the keys are
+    # replaced by their positions among the distinct keys of the interface's
+    # ports so that they never exceed the number of ports times the number of
+    # tokens in a level and therefore cannot overflow:
+    uniques = []
+    keys = np.zeros(len(interface.data), dtype=np.int64)
+    for k in xrange(n):
+        keys = keys*len(levels[k])+np.asarray(labels[k], dtype=np.int64)
+        u, keys = np.unique(keys, return_inverse=True)
+        uniques.append(u)
+
+    # Position in the interface's index of the port with each key:
+    key_pos = np.empty(len(keys), dtype=np.int64)
+    key_pos[keys] = np.arange(len(keys))
+
+    kwargs['names'] = list(names)+list(columns)
+    kwargs['dtype'] = {name: str for name in names}
+    kwargs['chunksize'] = chunksize
+    pos = ([], [])
+    data = {c: [] for c in columns}
+    offset = 0
+    for chunk in pd.read_csv(file_name, **kwargs):
+        for i in xrange(2):
+            key = np.zeros(len(chunk), dtype=np.int64)
+            valid = np.ones(len(chunk), dtype=np.bool)
+            for k in xrange(n):
+                code = level_strs[k].get_indexer(
+                    chunk[names[i*n+k]].fillna('').values)
+                valid &= code >= 0
+                u = uniques[k]
+                if not len(u):
+                    valid[:] = False
+                    break
+                raw = key*len(levels[k])+code.clip(0)
+                key = np.searchsorted(u, raw).clip(0, len(u)-1)
+                valid &= u[key] == raw
+            if not valid.all():
+                raise ValueError('row %i contains ports not in pattern '
+                                 'interfaces' % (offset+np.argmin(valid)))
+            pos[i].append(key_pos[key])
+        for c in columns:
+            data[c].append(chunk[c].values)
+        offset += len(chunk)
+
+    if not offset:
+        return np.array([], np.int64), np.array([], np.int64), \
+            {c: np.array([], object) for c in columns}
+    return np.concatenate(pos[0]), np.concatenate(pos[1]), \
+        {c: np.concatenate(data[c]) for c in columns}
 
 class Interface(object):
     """
@@ -57,11 +372,21 @@ class Interface(object):
     columns : list, default = ['interface', 'io', 'type']
         Data column names.
 
+    Notes
+    -----
+    If `use_trie` is set to True, selectors are resolved using a prefix
+    tree built from the index of port identifiers (see `plsel.PortTrie`).
+
     See Also
     --------
     plsel.SelectorMethods
     """
 
+    use_trie = False
+
+    # Incremented whenever the interface's data is modified in place:
+    _version = 0
+
     def __init__(self, selector='', columns=['interface', 'io', 'type']):
 
         # All ports in an interface must contain at least the following
@@ -87,10 +412,11 @@ class Interface(object):
             raise ValueError('Duplicate interface index entries detected.')
 
     def __getitem__(self, key):
+        trie = self.trie if self.use_trie else None
         if type(key) == tuple and len(key) > 1:
-            return self.sel.select(self.data[list(key[1:])], key[0])
+            return self.sel.select(self.data[list(key[1:])], key[0], trie=trie)
         else:
-            return self.sel.select(self.data, key)
+            return self.sel.select(self.data, key, trie=trie)
 
     def __setitem__ambiguous__(self, key, value):
         if type(key) == tuple:
@@ -130,6 +456,7 @@ class Interface(object):
 
         for k, v in data.iteritems():
             self.data[k].ix[idx] = v
+        self._version += 1
 
     def __setitem__(self, key, value):
         if type(key) == tuple:
@@ -180,7 +507,8 @@ class Interface(object):
                                       len(self.index.levshape))
         for k, v in data.iteritems():
             self.data[k].ix[s] = v
-        
+        self._version += 1
+
     @property
     def index(self):
         """
@@ -201,6 +529,150 @@ class Interface(object):
 
         return set(self.data['interface'])
 
+    @property
+    def trie(self):
+        """
+        Prefix tree over the port identifiers in the interface.
+
+        Returns
+        -------
+        result : neurokernel.plsel.PortTrie
+            Prefix tree built from the index of the interface. The tree is
+            cached until the index is replaced.
+        """
+
+        t = getattr(self, '_trie', None)
+        if t is None or t.index is not self.data.index:
+            t = PortTrie(self.data.index)
+            self._trie = t
+        return t
+
+    def _port_positions(self, ports):
+        """
+        Find the rows of the interface containing the specified ports.
+
+        Parameters
+        ----------
+        ports : sequence of tuple
+            Expanded port identifiers.
+
+        Returns
+        -------
+        result : numpy.ndarray of int
+            Positions of the ports in the interface's index; ports not in the
+            interface are denoted by -1.
+        """
+
+        # The interface's ports must be interned before the specified ports
+        # are looked up:
+        self.port_ids()
+        return self._id_positions(port_ids.get_many(ports))
+
+    def _id_positions(self, q):
+        """
+        Find the rows of the interface containing the ports with the specified IDs.
+
+        Parameters
+        ----------
+        q : numpy.ndarray of int
+            Port IDs assigned by `neurokernel.plsel.port_ids`.
+
+        Returns
+        -------
+        result : numpy.ndarray of int
+            Positions of the ports in the interface's index; ports not in the
+            interface are denoted by -1.
+        """
+
+        ids = self.port_ids()
+        if not len(ids):
+            return -np.ones(len(q), dtype=np.int64)
+        sorter = np.argsort(ids)
+        pos = np.searchsorted(ids, q, sorter=sorter).clip(0, len(ids)-1)
+        result = sorter[pos]
+        result[(ids[result] != q) | (q < 0)] = -1
+        return result
+
+    def _port_tuples(self, pos):
+        """
+        Return the identifiers of the ports at the specified positions.
+
+        Parameters
+        ----------
+        pos : numpy.ndarray of int
+            Positions of the ports in the interface's index.
+
+        Returns
+        -------
+        result : list of tuple
+            Port identifiers padded to the number of levels in the index.
+        """
+
+        idx = self.data.index[pos]
+        if isinstance(idx, pd.MultiIndex):
+            return idx.tolist()
+        else:
+            return [(t,) for t in idx]
+
+    def port_ids(self, i=None):
+        """
+        Retrieve interned integer IDs of the ports in the interface.
+
+        Parameters
+        ----------
+        i : int
+            Interface identifier. If set to None, return the IDs of all ports.
+
+        Returns
+        -------
+        result : numpy.ndarray of int64
+            Integer IDs assigned by `neurokernel.plsel.port_ids` to the port
+            identifiers in the order in which they appear in the index.
+
+        Notes
+        -----
+        The IDs of all ports are cached until the index is replaced.
+        """
+
+        cache = getattr(self, '_port_ids_cache', None)
+        if cache is None or cache[0] is not self.data.index:
+            cache = (self.data.index, port_ids.index_ids(self.data.index))
+            self._port_ids_cache = cache
+        if i is None:
+            return cache[1]
+        else:
+            return cache[1][(self.data['interface'] == i).values]
+
+    def select_port_ids(self, i, port_type=None, ports=None):
+        """
+        Retrieve interned integer IDs of selected ports in an interface.
+
+        Parameters
+        ----------
+        i : int
+            Interface identifier.
+        port_type : str
+            If specified, only return the IDs of ports of this type.
+        ports : str
+            If specified, only return the IDs of ports comprised by this
+            selector.
+
+        Returns
+        -------
+        result : numpy.ndarray of int64
+            Integer IDs assigned by `neurokernel.plsel.port_ids` to the
+            selected port identifiers in the order in which they appear in
+            the index.
+        """
+
+        mask = (self.data['interface'] == i).values
+        if port_type is not None:
+            mask &= (self.data['type'] == port_type).values
+        ids = self.port_ids()[mask]
+        if ports is not None:
+            ids = ids[np.in1d(ids, port_ids.index_ids(self[ports].index))]
+        return ids
+
     @property
     def io_inv(self):
         """
@@ -298,20 +770,38 @@ class Interface(object):
         new Interface instance.
         """
 
+        return cls._from_data(df.copy())
+
+    @classmethod
+    def _from_data(cls, df):
+        """
+        Create an Interface that uses the specified DataFrame as its data.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            DataFrame with a MultiIndex and data columns 'interface',
+            'io', and 'type' (additional columns may also be present).
+
+        Returns
+        -------
+        i : Interface
+            Generated Interface instance.
+
+        Notes
+        -----
+        Unlike `from_df`, the DataFrame is not copied; the port identifiers
+        in its index are not parsed because they are assumed to be expanded.
+        """
+
         assert set(df.columns).issuperset(['interface', 'io', 'type'])
-        if isinstance(df.index, pd.MultiIndex):
-            if len(df.index):
-                i = cls(df.index.tolist(), df.columns)
-            else:
-                i = cls([()], df.columns)
-        elif isinstance(df.index, pd.Index):
-            if len(df.index):
-                i = cls([(s,) for s in df.index.tolist()], df.columns)
-            else:
-                i = cls([()], df.columns)
-        else:
+        if not isinstance(df.index, pd.Index):
             raise ValueError('invalid index type')
-        i.data = df.copy()
+        i = cls.__new__(cls)
+        i.sel = SelectorMethods()
+        i.num_levels = df.index.nlevels if len(df.index) else 0
+        i.data = df
+        i.pm = {}
         i.__validate_index__(i.index)
         return i
 
@@ -410,6 +900,88 @@ class Interface(object):
             i[sel_int, 'interface'] = n
         return i
 
+    def _mask(self, col, value):
+        """
+        Find the ports whose attribute has the specified value.
+
+        Parameters
+        ----------
+        col : str
+            Attribute (i.e., data column) name.
+        value : object
+            Attribute value.
+
+        Returns
+        -------
+        result : numpy.ndarray of bool
+            Mask of the rows of the interface's data whose attribute `col` is
+            equal to `value`.
+
+        Notes
+        -----
+        Masks are cached until the interface is modified with `__setitem__`,
+        its data or index is replaced, or the values of the attribute are
+        modified in place through the `data` attribute.
+        """
+
+        objs = (self.data, self.data.index)
+        cache = getattr(self, '_mask_cache', None)
+        if cache is None or self._version != cache[1] or \
+           not all(x is y for x, y in zip(objs, cache[0])):
+            cache = (objs, self._version, {}, {})
+            self._mask_cache = cache
+        columns, masks = cache[2], cache[3]
+
+        # Discard the masks computed from an attribute whose values have
+        # changed since they were computed:
+        values = self.data[col].values
+        if col not in columns or not _same_values(values, columns[col]):
+            for k in [k for k in masks if k[0] == col]:
+                del masks[k]
+            columns[col] = values.copy()
+        try:
+            return masks[(col, value)]
+        except KeyError:
+            mask = (self.data[col] == value).values
+            masks[(col, value)] = mask
+            return mask
+
+    def _ports_with(self, i=None, tuples=False, **kwargs):
+        """
+        Restrict Interface ports to those with the specified attribute values.
+
+        Parameters
+        ----------
+        i : int
+            Interface identifier. If None, return ports in all interfaces.
+        tuples : bool
+            If True, return a list of tuples; if False, return an
+            Interface instance.
+        kwargs : dict
+            Attribute values keyed on attribute name.
+
+        Returns
+        -------
+        interface : Interface or list of tuples
+            Either an Interface instance containing the selected ports and
+            their attributes, or a list of tuples corresponding to the
+            expanded ports.
+        """
+
+        if i is not None:
+            kwargs['interface'] = i
+        try:
+            mask = np.ones(len(self.data), dtype=np.bool)
+            for col, value in kwargs.iteritems():
+                mask &= self._mask(col, value)
+        except:
+            return [] if tuples else Interface()
+        pos = np.flatnonzero(mask)
+        if tuples:
+            return self.data.index[pos].tolist()
+        else:
+            return self._from_data(self.data.take(pos, is_copy=False))
+
     def gpot_ports(self, i=None, tuples=False):
         """
         Restrict Interface ports to graded potential ports.
@@ -430,27 +1002,7 @@ class Interface(object):
             corresponding to the expanded ports.
         """
 
-        if i is None:
-            try:
-                df = self.data[self.data['type'] == 'gpot']
-            except:
-                df = None
-        else:
-            try:
-                df = self.data[(self.data['type'] == 'gpot') & \
-                               (self.data['interface'] == i)]
-            except:
-                df = None
-        if tuples:
-            if df is None:
-                return []
-            else:
-                return df.index.tolist()
-        else:
-            if df is None:
-                return Interface()
-            else:
-                return self.from_df(df)
+        return self._ports_with(i, tuples, type='gpot')
 
     def in_ports(self, i=None, tuples=False):
         """
@@ -472,27 +1024,7 @@ class Interface(object):
             corresponding to the expanded ports.
         """
 
-        if i is None:
-            try:
-                df = self.data[self.data['io'] == 'in']
-            except:
-                df = None
-        else:
-            try:
-                df = self.data[(self.data['io'] == 'in') & \
-                               (self.data['interface'] == i)]
-            except:
-                df = None
-        if tuples:
-            if df is None:
-                return []
-            else:
-                return df.index.tolist()
-        else:
-            if df is None:
-                return Interface()
-            else:
-                return self.from_df(df)
+        return self._ports_with(i, tuples, io='in')
 
     def interface_ports(self, i=None, tuples=False):
         """
@@ -520,57 +1052,44 @@ class Interface(object):
             else:
                 return self.copy()
         else:
-            try:
-                df = self.data[self.data['interface'] == i]
-            except:
-                df = None
-            if tuples:
-                if df is None:
-                    return []
-                else:
-                    return df.index.tolist()
-            else:
-                if df is None:
-                    return Interface()
-                else:
-                    return self.from_df(df)
+            return self._ports_with(i, tuples)
 
-    def _merge_on_interfaces(self, a, i, b):
+    def _match_rows(self, a, i, b):
         """
-        Merge contents of this and another Interface instance.
+        Match the ports in an interface with those in another Interface instance.
+
+        Parameters
+        ----------
+        a : int
+            Identifier of interface in the current instance.
+        i : Interface
+            Interface instance containing the other interface.
+        b : int
+            Identifier of interface in instance `i`.
+
+        Returns
+        -------
+        rows_a, rows_b : numpy.ndarray of int
+            Positions in the indices of this instance and of `i` of each pair
+            of identical port identifiers in interfaces `a` and `b`.
+        n_a, n_b : int
+            Numbers of ports in interfaces `a` and `b`.
 
         Notes
         -----
-        If the number of levels in one Interface instance's DataFrame index is
-        greater than that of the other, the number of levels in the index of the
-        merged DataFrames instances is set to the former and the index with the
-        smaller number is padded with blank entries to enable Panda's merge
-        mechanism to function properly.
+        Port identifiers are matched using their interned IDs, which do not
+        depend on padding; this obviates the need to pad the index with the
+        smaller number of levels before comparing the identifiers.
         """
 
         assert isinstance(i, Interface)
-        df_left = self.data[self.data['interface'] == a]
-        df_right = i.data[i.data['interface'] == b]
-        n_left_names = len(self.data.index.names)
-        n_right_names = len(i.data.index.names)
-
-        # Pandas' merge mechanism fails if the number of levels in each of the 
-        # merged MultiIndex indices differs and there is overlap of more than
-        # one level; we therefore pad the index with the smaller number of
-        # levels before attempting the merge:
-        if n_left_names > n_right_names:
-            for n in xrange(i.num_levels, i.num_levels+(n_left_names-n_right_names)):
-                new_col = str(n)
-                df_right[new_col] = ''
-                df_right.set_index(new_col, append=True, inplace=True)
-        elif n_left_names < n_right_names:
-            for n in xrange(self.num_levels, self.num_levels+(n_right_names-n_left_names)):
-                new_col = str(n)
-                df_left[new_col] = ''
-                df_left.set_index(new_col, append=True, inplace=True)
-        return pd.merge(df_left, df_right,                            
-                        left_index=True,
-                        right_index=True)
+        x = (self.data['interface'] == a).values
+        y = (i.data['interface'] == b).values
+        rows_a = np.flatnonzero(x)
+        rows_b = i._id_positions(self.port_ids()[rows_a])
+        found = rows_b >= 0
+        found[found] = y[rows_b[found]]
+        return rows_a[found], rows_b[found], x.sum(), y.sum()
 
     def get_common_ports(self, a, i, b, t=None):
         """
@@ -603,23 +1122,16 @@ class Interface(object):
         """
 
         if t is None:
-            x = self.data[self.data['interface'] == a]
-            y = i.data[i.data['interface'] == b]
-        else:
-            x = self.data[(self.data['interface'] == a) & (self.data['type'] == t)]
-            y = i.data[(i.data['interface'] == b) & (i.data['type'] == t)]
-        if isinstance(x.index, pd.MultiIndex):
-            x_list = [tuple(a for a in b if a != '') \
-                      for b in x.index]
+            x = (self.data['interface'] == a).values
+            y = (i.data['interface'] == b).values
         else:
-            x_list = [(a,) for a in x.index]
-        if isinstance(y.index, pd.MultiIndex):
-            y_list = [tuple(a for a in b if a != '') \
-                      for b in y.index]
-        else:
-            y_list = [(a,) for a in y.index]
+            x = ((self.data['interface'] == a) & (self.data['type'] == t)).values
+            y = ((i.data['interface'] == b) & (i.data['type'] == t)).values
 
-        return list(set(x_list).intersection(y_list))
+        # Intersect the interned IDs of the ports; identifiers are interned
+        # without their padding:
+        common = np.intersect1d(self.port_ids()[x], i.port_ids()[y])
+        return port_ids.lookup_many(common)
         
     def is_compatible(self, a, i, b, allow_subsets=False):
         """
@@ -656,8 +1168,20 @@ class Interface(object):
         same order.
         """
         
-        # Merge the interface data on their indices (i.e., their port identifiers):
-        data_merged = self._merge_on_interfaces(a, i, b)
+        rows_a, rows_b, n_a, n_b = self._match_rows(a, i, b)
+
+        # Compatible identifiers must have the same non-null 'type'
+        # attribute and their non-null 'io' attributes must be the inverse
+        # of each other:
+        type_x = self.data['type'].values[rows_a]
+        type_y = i.data['type'].values[rows_b]
+        io_x = self.data['io'].values[rows_a]
+        io_y = i.data['io'].values[rows_b]
+        compatible = ((type_x == type_y) | \
+                      (pd.isnull(type_x) & pd.isnull(type_y))) & \
+                     (((io_x == 'out') & (io_y == 'in')) | \
+                      ((io_x == 'in') & (io_y == 'out')) | \
+                      (pd.isnull(io_x) & pd.isnull(io_y)))
 
         # Check whether there are compatible subsets, i.e., at least one pair of
         # ports from the two interfaces that are compatible with each other:
@@ -665,19 +1189,9 @@ class Interface(object):
 
             # If the interfaces share no identical port identifiers, they are
             # incompatible:
-            if not len(data_merged):
+            if not len(rows_a):
                 return False
-
-            # Compatible identifiers must have the same non-null 'type'
-            # attribute and their non-null 'io' attributes must be the inverse
-            # of each other:
-            if not data_merged.apply(lambda row: \
-                    ((row['type_x'] == row['type_y']) or \
-                     (pd.isnull(row['type_x']) and pd.isnull(row['type_y']))) and \
-                    ((row['io_x'] == 'out' and row['io_y'] == 'in') or \
-                     (row['io_x'] == 'in' and row['io_y'] == 'out') or \
-                     (pd.isnull(row['io_x']) and pd.isnull(row['io_y']))),
-                                     axis=1).any():
+            if not compatible.any():
                 return False
 
         # Require that all ports in the two interfaces be compatible:
@@ -685,20 +1199,9 @@ class Interface(object):
             
             # If one interface contains identifiers not in the other, they are
             # incompatible:
-            if len(data_merged) < max(len(self.data[self.data['interface'] == a]),
-                                      len(i.data[i.data['interface'] == b])):
+            if len(rows_a) < max(n_a, n_b):
                 return False
-
-            # Compatible identifiers must have the same non-null 'type'
-            # attribute and their non-null 'io' attributes must be the inverse
-            # of each other:
-            if not data_merged.apply(lambda row: \
-                    ((row['type_x'] == row['type_y']) or \
-                     (pd.isnull(row['type_x']) and pd.isnull(row['type_y']))) and \
-                    ((row['io_x'] == 'out' and row['io_y'] == 'in') or \
-                     (row['io_x'] == 'in' and row['io_y'] == 'out') or \
-                     (pd.isnull(row['io_x']) and pd.isnull(row['io_y']))),
-                                     axis=1).all():
+            if not compatible.all():
                 return False
 
         # All tests passed:
@@ -757,27 +1260,7 @@ class Interface(object):
             corresponding to the expanded ports.
         """
 
-        if i is None:
-            try:
-                df = self.data[self.data['io'] == 'out']
-            except:
-                df = None
-        else:
-            try:
-                df = self.data[(self.data['io'] == 'out') & \
-                               (self.data['interface'] == i)]
-            except:
-                df = None
-        if tuples:
-            if df is None:
-                return []
-            else:
-                return df.index.tolist()
-        else:
-            if df is None:
-                return Interface()
-            else:
-                return self.from_df(df)
+        return self._ports_with(i, tuples, io='out')
 
     def port_select(self, f, inplace=False):
         """
@@ -828,27 +1311,7 @@ class Interface(object):
             corresponding to the expanded ports.
         """
 
-        if i is None:
-            try:
-                df = self.data[self.data['type'] == 'spike']
-            except:
-                df = None
-        else:
-            try:
-                df = self.data[(self.data['type'] == 'spike') & \
-                               (self.data['interface'] == i)]
-            except:
-                df = None
-        if tuples:
-            if df is None:
-                return []
-            else:
-                return df.index.tolist()
-        else:
-            if df is None:
-                return Interface()
-            else:
-                return self.from_df(df)
+        return self._ports_with(i, tuples, type='spike')
 
     def to_selectors(self, i=None):
         """
@@ -905,20 +1368,121 @@ class Interface(object):
         except:
             return []
     
-    def which_int(self, s):
+    def _to_arrays(self, prefix=''):
         """
-        Return the interface containing the identifiers comprised by a selector.
+        Encode the interface's index and data as arrays.
 
         Parameters
         ----------
-        selector : str or unicode
-            Port selector.
+        prefix : str
+            Prefix to prepend to the names of the arrays.
 
         Returns
         -------
-        i : set
-            Set of identifiers for interfaces that contain ports comprised by
-            the selector.
+        arrays : dict of numpy.ndarray
+            Arrays keyed on their names.
+        """
+
+        arrays = {}
+        _store_index(arrays, prefix, self.data.index)
+        _store_values(arrays, prefix+'columns', self.data.columns)
+        for j, c in enumerate(self.data.columns):
+            _store_values(arrays, prefix+'col_%i' % j, self.data[c].values)
+        return arrays
+
+    @classmethod
+    def _from_arrays(cls, arrays, prefix=''):
+        """
+        Create an Interface from arrays created by `_to_arrays`.
+
+        Parameters
+        ----------
+        arrays : dict of numpy.ndarray
+            Arrays keyed on their names.
+        prefix : str
+            Prefix prepended to the names of the arrays.
+
+        Returns
+        -------
+        i : Interface
+            Generated Interface instance.
+        """
+
+        names = [None if pd.isnull(n) else n \
+                 for n in _fetch_values(arrays, prefix+'names')]
+        levels = [_fetch_values(arrays, prefix+'level_%i' % k) \
+                  for k in xrange(len(names))]
+        labels = [arrays[prefix+'labels_%i' % k] for k in xrange(len(names))]
+        if arrays[prefix+'multi']:
+            idx = pd.MultiIndex(levels=levels, labels=labels, names=names,
+                                verify_integrity=False)
+        else:
+            idx = pd.Index(levels[0][labels[0]], name=names[0])
+        columns = list(_fetch_values(arrays, prefix+'columns'))
+        data = OrderedDict((c, _fetch_values(arrays, prefix+'col_%i' % j)) \
+                           for j, c in enumerate(columns))
+        return cls._from_data(pd.DataFrame(data, index=idx, columns=columns))
+
+    def save(self, file_name):
+        """
+        Save the interface to a file in NumPy's .npz format.
+
+        Parameters
+        ----------
+        file_name : str
+            Output file name; the '.npz' extension is appended to the name if
+            it is not already there.
+
+        Notes
+        -----
+        The port identifiers are stored as the distinct tokens in each level
+        of the interface's index and the position of each port's tokens among
+        them; attribute values are stored as integer codes into tables of
+        distinct values. The file is not compressed so that it can be
+        memory-mapped when loaded.
+
+        See Also
+        --------
+        Interface.load
+        """
+
+        np.savez(file_name, **self._to_arrays())
+
+    @classmethod
+    def load(cls, file_name, mmap_mode=None):
+        """
+        Load an interface saved with `Interface.save`.
+
+        Parameters
+        ----------
+        file_name : str
+            Input file name.
+        mmap_mode : {None, 'r', 'r+', 'c'}
+            If not None, memory-map the arrays in the file rather than reading
+            them into memory (see `neurokernel.tools.misc.load_npz`).
+
+        Returns
+        -------
+        i : Interface
+            Loaded Interface instance.
+        """
+
+        return cls._from_arrays(load_npz(file_name, mmap_mode))
+
+    def which_int(self, s):
+        """
+        Return the interface containing the identifiers comprised by a selector.
+
+        Parameters
+        ----------
+        selector : str or unicode
+            Port selector.
+
+        Returns
+        -------
+        i : set
+            Set of identifiers for interfaces that contain ports comprised by
+            the selector.
         """
 
         try:
@@ -991,6 +1555,12 @@ class Interface(object):
         assert isinstance(other, Interface)
         return self.data.equals(other.data)
 
+    def __getstate__(self):
+        # Cached values are not pickled because the port IDs they may contain
+        # are only valid within the current process:
+        return dict((k, v) for k, v in self.__dict__.iteritems() \
+                    if k not in ('_trie', '_port_ids_cache', '_mask_cache'))
+
     def __len__(self):
         return self.data.__len__()
 
@@ -1049,6 +1619,9 @@ class Pattern(object):
     plsel.SelectorMethods
     """
 
+    # Incremented whenever the pattern's data is modified in place:
+    _version = 0
+
     def __init__(self, *selectors, **kwargs):
         columns = kwargs['columns'] if kwargs.has_key('columns') else ['conn']
         self.sel = SelectorMethods()
@@ -1398,6 +1971,192 @@ class Pattern(object):
         return cls._create_from(*selectors, from_sel=from_sel, to_sel=to_sel, 
                                 data=data, columns=columns, comb_op='.+')
 
+    @classmethod
+    def from_arrays(cls, src, dest, data=1, sel0=None, sel1=None,
+                    columns=['conn']):
+        """
+        Create pattern from arrays of source and destination port identifiers.
+
+        For example: ::
+
+            p = Pattern.from_arrays(['/foo[0]', '/foo[1]'],
+                                    ['/bar[1]', '/bar[0]'])
+
+        results in a pattern with the following connections: ::
+
+            '/foo[0]' -> '/bar[1]'
+            '/foo[1]' -> '/bar[0]'
+
+        Parameters
+        ----------
+        src, dest : sequence
+            Source and destination port identifiers; each entry must be either
+            a selector string comprising a single port (e.g., '/foo[0]') or a
+            tuple of tokens (e.g., ('foo', 0)). The ith source port is
+            connected to the ith destination port.
+        data : scalar or dict
+            Connection attribute data. If a scalar, it is assigned to the
+            first data column; if a dict, each value may be either a scalar or
+            a sequence with one entry per connection.
+        sel0, sel1 : str, unicode, or sequence
+            Selectors defining the sets of ports in the pattern's two
+            interfaces. If not specified, the interfaces respectively comprise
+            the specified source and destination ports.
+        columns : sequence of str
+            Data column names.
+
+        Returns
+        -------
+        result : Pattern
+            Pattern instance.
+        """
+
+        src = cls._expand_ports(src)
+        dest = cls._expand_ports(dest)
+        if sel0 is None:
+            sel0 = sorted(set(src))
+        if sel1 is None:
+            sel1 = sorted(set(dest))
+        p = cls(sel0, sel1, columns=columns)
+        p.connect_many(src, dest, data)
+        return p
+
+    @classmethod
+    def _expand_ports(cls, ports, n=0):
+        """
+        Expand a sequence of single-port identifiers into token tuples.
+
+        Parameters
+        ----------
+        ports : sequence
+            Port identifiers; each entry must be either a selector string
+            comprising a single port or a tuple of tokens.
+        n : int
+            Number of levels to which to pad the expanded identifiers with ''.
+
+        Returns
+        -------
+        result : list of tuple
+            Expanded port identifiers.
+        """
+
+        # Selectors that each comprise a single port without any combining
+        # operators can be parsed all at once:
+        if all([type(x) in [str, unicode] and not _combining_re.search(x) \
+                for x in ports]):
+            parse_list = SelectorMethods.parse(','.join(ports)) \
+                         if len(ports) else []
+
+            # Bracketed integers are parsed as single-entry lists:
+            parse_list = [[t[0] if type(t) == list and len(t) == 1 else t \
+                           for t in tokens] for tokens in parse_list]
+            if len(parse_list) == len(ports) and \
+               all([type(t) in [int, str, unicode] \
+                    for tokens in parse_list for t in tokens]):
+                return [tuple(tokens)+('',)*(n-len(tokens)) \
+                        for tokens in parse_list]
+
+        result = []
+        for x in ports:
+            if type(x) in [str, unicode]:
+                t = SelectorMethods.expand(x, n)
+                if len(t) != 1:
+                    raise ValueError('selector %s does not comprise a single port' % x)
+                result.append(t[0])
+            else:
+                t = tuple(x)
+                result.append(t+('',)*(n-len(t)))
+        return result
+
+    def connect_many(self, src, dest, data=1):
+        """
+        Add or update several connections at once.
+
+        Parameters
+        ----------
+        src, dest : sequence
+            Source and destination port identifiers; each entry must be either
+            a selector string comprising a single port (e.g., '/foo[0]') or a
+            tuple of tokens (e.g., ('foo', 0)). The ith source port is
+            connected to the ith destination port.
+        data : scalar or dict
+            Connection attribute data. If a scalar, it is assigned to the
+            first data column; if a dict, each value may be either a scalar or
+            a sequence with one entry per connection.
+
+        Notes
+        -----
+        This is equivalent to assigning to `self[src[i], dest[i]]` for each
+        pair of ports, but validates and sorts the pattern's index only once.
+        """
+
+        src = self._expand_ports(src, self.num_levels['from'])
+        dest = self._expand_ports(dest, self.num_levels['to'])
+        if len(src) != len(dest):
+            raise ValueError('numbers of source and destination ports differ')
+
+        # Ensure that the ports are in the pattern's interfaces:
+        pos_src = self.interface._port_positions(src)
+        pos_dest = self.interface._port_positions(dest)
+        if (pos_src < 0).any() or (pos_dest < 0).any():
+            raise ValueError('ports not in pattern interfaces')
+        self._connect_positions(pos_src, pos_dest, data)
+
+    def _connect_positions(self, pos_src, pos_dest, data=1):
+        """
+        Add or update connections between ports at the specified positions.
+
+        Parameters
+        ----------
+        pos_src, pos_dest : numpy.ndarray of int
+            Positions of the source and destination ports in the index of the
+            pattern's interface.
+        data : scalar or dict
+            Connection attribute data (see `connect_many`).
+        """
+
+        # Ensure that each connection joins ports in different interfaces:
+        int_ids = self.interface.data['interface'].values
+        if (int_ids[pos_src] == int_ids[pos_dest]).any():
+            raise ValueError('connected ports must be in different interfaces')
+
+        # Ensure that data to set is in dict form:
+        if np.isscalar(data):
+            data = {self.data.columns[0]: data}
+        elif type(data) != dict:
+            raise ValueError('cannot assign specified value')
+
+        src = self.interface._port_tuples(pos_src)
+        dest = self.interface._port_tuples(pos_dest)
+        idx = pd.MultiIndex.from_tuples([f+t for f, t in zip(src, dest)],
+                                        names=self.data.index.names) \
+              if len(src) else self.data.index[:0]
+        if idx.duplicated().any():
+            raise ValueError('Duplicate pattern entries detected.')
+        new_data = pd.DataFrame(data=data, index=idx,
+                                columns=[c for c in self.data.columns \
+                                         if c in data], dtype=object)
+
+        # Attributes of existing connections not specified in `data` are
+        # retained; combining the data may coerce the type of object columns,
+        # so it is restored afterwards:
+        new_data = new_data.combine_first(self.data)[self.data.columns]
+        for c in self.data.columns:
+            if self.data[c].dtype == object:
+                new_data[c] = new_data[c].astype(object)
+
+        # Validate updated DataFrame's index before updating the instance's
+        # data attribute:
+        self.__validate_index__(new_data.index)
+        self.data = new_data
+        self.data.sort(inplace=True)
+
+        # Update the `io` attributes of the pattern's interfaces:
+        io = self.interface.data.columns.get_loc('io')
+        self.interface.data.iloc[pos_src, io] = 'in'
+        self.interface.data.iloc[pos_dest, io] = 'out'
+        self.interface._version += 1
+
     def __validate_index__(self, idx):
         """
         Raise an exception if the specified index will result in an invalid pattern.
@@ -1513,6 +2272,7 @@ class Pattern(object):
         if found:
             for k, v in data.iteritems():
                 self.data[k].ix[idx] = v
+            self._version += 1
 
         # Otherwise, populate a new DataFrame with the specified attributes:
         else:
@@ -1539,6 +2299,62 @@ class Pattern(object):
         else:
             return self.sel.select(self.data, selector=selector)
 
+    def _conn_port_ids(self):
+        """
+        Retrieve interned IDs of the source and destination ports of each connection.
+
+        Returns
+        -------
+        src, dest : numpy.ndarray of int64
+            IDs assigned by `neurokernel.plsel.port_ids` to the source and
+            destination ports in the rows of the pattern's index.
+
+        Notes
+        -----
+        The IDs are cached until the index is replaced.
+        """
+
+        cache = getattr(self, '_conn_port_ids_cache', None)
+        if cache is None or cache[0] is not self.data.index:
+            tuples = self.data.index.values
+            cache = (self.data.index,
+                     port_ids.intern_many(t[self.from_slice] for t in tuples),
+                     port_ids.intern_many(t[self.to_slice] for t in tuples))
+            self._conn_port_ids_cache = cache
+        return cache[1], cache[2]
+
+    def _connected_idx(self, from_ids, to_ids, which):
+        """
+        Find the ports in the connections between the specified ports.
+
+        Parameters
+        ----------
+        from_ids, to_ids : numpy.ndarray of int64
+            IDs of the source and destination ports.
+        which : str
+            If 'from', return the source ports of the selected connections;
+            if 'to', return their destination ports.
+
+        Returns
+        -------
+        idx : list of tuple
+            Port identifiers in the order in which they first appear in the
+            pattern's index.
+        """
+
+        src, dest = self._conn_port_ids()
+        rows = np.flatnonzero(np.in1d(src, from_ids) & np.in1d(dest, to_ids))
+        if which == 'from':
+            ids, s = src[rows], self.from_slice
+        else:
+            ids, s = dest[rows], self.to_slice
+
+        # Remove duplicate ports from output without perturbing the order
+        # of the remaining ports:
+        ids_u, first = np.unique(ids, return_index=True)
+        tuples = self.data.index.values
+        return [tuples[i][s] for i in rows[np.sort(first)]]
+
     def src_idx(self, src_int, dest_int, 
                 src_type=None, dest_type=None, dest_ports=None):                
         """
@@ -1576,45 +2392,11 @@ class Pattern(object):
         assert src_int in self.interface.interface_ids and \
             dest_int in self.interface.interface_ids
         
-        # Filter destination ports by specified type:
-        if dest_type is None:
-            to_int = self.interface.interface_ports(dest_int)
-        else:
-            to_f = lambda x: x['type'] == dest_type
-            to_int = self.interface.interface_ports(dest_int).data_select(to_f)
-
-        # Filter destination ports by specified ports:
-        if dest_ports is None:
-            to_idx = to_int.index
-        else:
-            to_idx = to_int[dest_ports].index
-
-        # Filter source ports by specified type:
-        if src_type is None:
-            from_int = self.interface.interface_ports(src_int)
-        else:
-            from_f = lambda x: x['type'] == src_type
-            from_int = self.interface.interface_ports(src_int).data_select(from_f)
-
-        from_idx = from_int.index
-
-        # Construct index from those rows in the pattern whose ports have been
-        # selected by the above code:
-        if isinstance(from_idx, pd.MultiIndex):
-            if isinstance(to_idx, pd.MultiIndex):
-                f = lambda x: x[self.from_slice] in from_idx and x[self.to_slice] in to_idx
-            else:
-                f = lambda x: x[self.from_slice] in from_idx and x[self.to_slice][0] in to_idx
-        else:
-            if isinstance(to_idx, pd.MultiIndex):
-                f = lambda x: x[self.from_slice][0] in from_idx and x[self.to_slice] in to_idx
-            else:
-                f = lambda x: x[self.from_slice][0] in from_idx and x[self.to_slice][0] in to_idx
-        idx = self.data.select(f).index
-                
-        # Remove duplicate tuples from output without perturbing the order
-        # of the remaining tuples:
-        return OrderedDict.fromkeys([x[self.from_slice] for x in idx]).keys()
+        # Select the ports of the specified types in each interface:
+        from_ids = self.interface.select_port_ids(src_int, src_type)
+        to_ids = self.interface.select_port_ids(dest_int, dest_type,
+                                                dest_ports)
+        return self._connected_idx(from_ids, to_ids, 'from')
 
     def dest_idx(self, src_int, dest_int, 
                  src_type=None, dest_type=None, src_ports=None):
@@ -1653,45 +2435,11 @@ class Pattern(object):
         assert src_int in self.interface.interface_ids and \
             dest_int in self.interface.interface_ids
 
-        # Filter source ports by specified type:
-        if src_type is None:
-            from_int = self.interface.interface_ports(src_int)
-        else:
-            from_f = lambda x: x['type'] == src_type
-            from_int = self.interface.interface_ports(src_int).data_select(from_f)
-
-        # Filter source ports by specified ports:
-        if src_ports is None:
-            from_idx = from_int.index    
-        else:
-            from_idx = from_int[src_ports].index
-            
-        # Filter destination ports by specified type:
-        if dest_type is None:
-            to_int = self.interface.interface_ports(dest_int)
-        else:
-            to_f = lambda x: x['type'] == dest_type
-            to_int = self.interface.interface_ports(dest_int).data_select(to_f)
-
-        to_idx = to_int.index
-
-        # Construct index from those rows in the pattern whose ports have been
-        # selected by the above code:
-        if isinstance(from_idx, pd.MultiIndex):
-            if isinstance(to_idx, pd.MultiIndex):
-                f = lambda x: x[self.from_slice] in from_idx and x[self.to_slice] in to_idx
-            else:
-                f = lambda x: x[self.from_slice] in from_idx and x[self.to_slice][0] in to_idx
-        else:
-            if isinstance(to_idx, pd.MultiIndex):
-                f = lambda x: x[self.from_slice][0] in from_idx and x[self.to_slice] in to_idx
-            else:
-                f = lambda x: x[self.from_slice][0] in from_idx and x[self.to_slice][0] in to_idx
-        idx = self.data.select(f).index
-
-        # Remove duplicate tuples from output without perturbing the order
-        # of the remaining tuples:
-        return OrderedDict.fromkeys([x[self.to_slice] for x in idx]).keys()
+        # Select the ports of the specified types in each interface:
+        from_ids = self.interface.select_port_ids(src_int, src_type,
+                                                  src_ports)
+        to_ids = self.interface.select_port_ids(dest_int, dest_type)
+        return self._connected_idx(from_ids, to_ids, 'to')
 
     def __len__(self):
         return self.data.__len__()
@@ -1719,32 +2467,56 @@ class Pattern(object):
         assert from_int in self.interface.interface_ids
         assert to_int in self.interface.interface_ids
 
-        # Get indices of the 'from' and 'to' interfaces as lists to speed up the
-        # check below [*]:
-        from_idx = set(self.interface.data[self.interface.data['interface'] == from_int].index.tolist())
-        to_idx = set(self.interface.data[self.interface.data['interface'] == to_int].index.tolist())
+        return (from_int, to_int) in self._int_conn_pairs()
 
-        # Get index of all defined connections:
-        idx = self.data[self.data['conn'] != 0].index
-        for t in idx:
-            
-            # Split tuple into 'from' and 'to' identifiers; since the interface
-            # index for a 'from' or 'to' identifier is an Index rather than a
-            # MultiIndex, we need to extract a scalar rather than a tuple in the
-            # former case:
-            if self.num_levels['from'] == 1:
-                from_id = t[0]
-            else:
-                from_id = t[0:self.num_levels['from']]
-            if self.num_levels['to'] == 1:
-                to_id = t[self.num_levels['from']]
-            else:
-                to_id = t[self.num_levels['from']:self.num_levels['from']+self.num_levels['to']]
+    def _int_conn_pairs(self):
+        """
+        Find the pairs of interfaces connected by the pattern.
 
-            # Check whether port identifiers are in the interface indices [*]:                
-            if from_id in from_idx and to_id in to_idx:
-                return True
-        return False
+        Returns
+        -------
+        result : set of tuple
+            Pairs of interface identifiers `(from_int, to_int)` such that at
+            least one nonzero connection exists from a port in `from_int` to a
+            port in `to_int`.
+
+        Notes
+        -----
+        The result is cached until the pattern or its interface is modified;
+        the cached result is also discarded if the connection data or the
+        interface identifiers of the ports are modified in place through the
+        `data` attributes.
+        """
+
+        objs = (self.data, self.data.index,
+                self.interface.data, self.interface.data.index)
+        versions = (self._version, self.interface._version)
+        values = (self.data['conn'].values,
+                  self.interface.data['interface'].values)
+        cache = getattr(self, '_int_conn_pairs_cache', None)
+        if cache is not None and versions == cache[1] and \
+           all(x is y for x, y in zip(objs, cache[0])) and \
+           all(_same_values(x, y) for x, y in zip(values, cache[2])):
+            return cache[3]
+
+        src, dest = self._conn_port_ids()
+        conn = self.data['conn'].values != 0
+        from_pos = self.interface._id_positions(src[conn])
+        to_pos = self.interface._id_positions(dest[conn])
+        valid = (from_pos >= 0) & (to_pos >= 0)
+
+        # Encode each pair of interface identifiers as a single integer so
+        # that the distinct pairs can be found without a Python loop:
+        codes, uniques = pd.factorize(self.interface.data['interface'].values)
+        from_codes = codes[from_pos[valid]]
+        to_codes = codes[to_pos[valid]]
+        valid = (from_codes >= 0) & (to_codes >= 0)
+        n = len(uniques)
+        pairs = np.unique(from_codes[valid]*n+to_codes[valid])
+        result = set(zip(uniques[pairs // n], uniques[pairs % n]))
+        self._int_conn_pairs_cache = (objs, versions,
+                                      tuple(x.copy() for x in values), result)
+        return result
 
     def from_csv(self, file_name, **kwargs):
         """
@@ -1771,6 +2543,141 @@ class Pattern(object):
         # Restore MultiIndex level names:
         self.data.index.names = index_names
 
+    def read_csv(self, file_name, chunksize=100000, **kwargs):
+        """
+        Add connections read from a CSV file in chunks.
+
+        Given N 'from' levels and M 'to' levels in the internal index, 
+        the method assumes that the first N+M columns in the file specify
+        the index levels and that the remaining columns contain the
+        pattern's data columns.
+
+        Parameters
+        ----------
+        file_name : str
+            Input file name.
+        chunksize : int
+            Number of rows to read at a time.
+        kwargs : dict
+            Additional arguments to pass to `pandas.read_csv` (e.g., `sep`).
+
+        Notes
+        -----
+        Unlike `from_csv`, this method validates the ports in each row against
+        the pattern's interfaces and adds the connections to those already in
+        the pattern. Only the positions of the connected ports and the
+        connection attributes are retained while reading the file.
+
+        See Also
+        --------
+        pandas.read_csv
+        """
+
+        pos_src, pos_dest, data = \
+            _read_csv_positions(self.interface, self.data.index.names,
+                                list(self.data.columns), file_name,
+                                chunksize, **kwargs)
+        self._connect_positions(pos_src, pos_dest, data)
+
+    def save(self, file_name):
+        """
+        Save the pattern to a file in NumPy's .npz format.
+
+        Parameters
+        ----------
+        file_name : str
+            Output file name; the '.npz' extension is appended to the name if
+            it is not already there.
+
+        Notes
+        -----
+        The pattern's interface is stored as described in `Interface.save`;
+        each connection is stored as the positions of its source and
+        destination ports in the interface's index. The file is not
+        compressed so that it can be memory-mapped when loaded.
+
+        See Also
+        --------
+        Pattern.load
+        """
+
+        np.savez(file_name, **self._to_arrays())
+
+    def _to_arrays(self):
+        """
+        Encode the pattern's interface and connections as arrays.
+
+        Returns
+        -------
+        arrays : dict of numpy.ndarray
+            Arrays keyed on their names.
+        """
+
+        arrays = self.interface._to_arrays('int_')
+        src, dest = self._conn_port_ids()
+        arrays['src'] = self.interface._id_positions(src)
+        arrays['dest'] = self.interface._id_positions(dest)
+        if (arrays['src'] < 0).any() or (arrays['dest'] < 0).any():
+            raise ValueError('pattern contains ports not in its interface')
+        _store_values(arrays, 'names', self.data.index.names)
+        _store_values(arrays, 'columns', self.data.columns)
+        for j, c in enumerate(self.data.columns):
+            _store_values(arrays, 'col_%i' % j, self.data[c].values)
+        return arrays
+
+    @classmethod
+    def load(cls, file_name, mmap_mode=None):
+        """
+        Load a pattern saved with `Pattern.save`.
+
+        Parameters
+        ----------
+        file_name : str
+            Input file name.
+        mmap_mode : {None, 'r', 'r+', 'c'}
+            If not None, memory-map the arrays in the file rather than reading
+            them into memory (see `neurokernel.tools.misc.load_npz`).
+
+        Returns
+        -------
+        p : Pattern
+            Loaded Pattern instance.
+        """
+
+        arrays = load_npz(file_name, mmap_mode)
+        interface = Interface._from_arrays(arrays, 'int_')
+
+        # Construct the pattern's index from the labels of the source and
+        # destination ports in the interface's index; only the tokens used by
+        # the connections are retained in each level:
+        names = list(_fetch_values(arrays, 'names'))
+        int_levels, int_labels = _index_labels(interface.data.index)
+        if len(names) != 2*len(int_levels):
+            raise ValueError('incorrectly named pattern index levels')
+        if len(arrays['src']):
+            levels = []
+            labels = []
+            for pos in (arrays['src'], arrays['dest']):
+                for level, label in zip(int_levels, int_labels):
+                    used, label = np.unique(label[pos], return_inverse=True)
+                    levels.append(level[used])
+                    labels.append(label)
+        else:
+            levels = [[] for n in names]
+            labels = [[] for n in names]
+        idx = pd.MultiIndex(levels=levels, labels=labels, names=names,
+                            verify_integrity=False)
+        columns = list(_fetch_values(arrays, 'columns'))
+        data = OrderedDict((c, _fetch_values(arrays, 'col_%i' % j)) \
+                           for j, c in enumerate(columns))
+
+        p = cls.__new__(cls)
+        p.sel = SelectorMethods()
+        p.interface = interface
+        p.num_levels = {'from': len(int_levels), 'to': len(int_levels)}
+        p.data = pd.DataFrame(data, index=idx, columns=columns)
+        return p
+
     @classmethod
     def from_graph(cls, g):
         """
@@ -1888,3 +2795,481 @@ class Pattern(object):
             g.add_edge(id_from, id_to, d)
 
         return g
+
+class SparsePattern(object):
+    """
+    Connectivity pattern stored as arrays of interned port IDs.
+
+    This class provides an alternative to `Pattern` for patterns with very
+    many connections. Rather than storing connections in a DataFrame indexed
+    by the concatenated source and destination port identifiers, each
+    connection is stored as a pair of integer IDs assigned to its ports by
+    `plsel.port_ids` (i.e., in coordinate format); connection attributes are
+    stored in one array per attribute.
+
+    Examples
+    --------
+    >>> p = SparsePattern('/x[0:3]','/y[0:4]')
+    >>> p['/x[0]', '/y[0:2]'] = 1
+    >>> p['/y[2]', '/x[1]'] = 1
+    >>> p['/y[3]', '/x[2]'] = 1
+
+    Attributes
+    ----------
+    src, dest : numpy.ndarray of int64
+        IDs of the source and destination ports of each connection.
+    attrs : collections.OrderedDict of numpy.ndarray
+        Connection attribute arrays keyed on column name.
+    interface : Interface
+        Interfaces containing port identifiers and attributes.
+
+    Parameters
+    ----------
+    sel0, sel1, ...: str, unicode, or sequence
+        Selectors defining the sets of ports potentially connected by the 
+        pattern. These selectors must be disjoint, i.e., no identifier 
+        comprised by one selector may be in any other selector.
+    columns : sequence of str
+        Data column names.
+
+    Notes
+    -----
+    Connections are kept in the lexicographic order of their source and
+    destination port identifiers, i.e., the order of the rows of an
+    equivalent `Pattern` instance's `data` attribute.
+
+    See Also
+    --------
+    Pattern
+    """
+
+    def __init__(self, *selectors, **kwargs):
+        columns = kwargs['columns'] if kwargs.has_key('columns') else ['conn']
+
+        # Use an empty Pattern to validate the selectors and create the
+        # interfaces:
+        p = Pattern(*selectors, columns=columns)
+        self.sel = p.sel
+        self.interface = p.interface
+        self.num_levels = p.num_levels
+        self.src = np.array([], dtype=np.int64)
+        self.dest = np.array([], dtype=np.int64)
+        self.attrs = OrderedDict((c, np.array([], dtype=object)) \
+                                 for c in columns)
+
+    @property
+    def columns(self):
+        """
+        Connection attribute names.
+        """
+
+        return self.attrs.keys()
+
+    @property
+    def interface_ids(self):
+        """
+        Interface identifiers.
+        """
+
+        return self.interface.interface_ids
+
+    @classmethod
+    def from_arrays(cls, src, dest, data=1, sel0=None, sel1=None,
+                    columns=['conn']):
+        """
+        Create pattern from arrays of source and destination port identifiers.
+
+        Parameters
+        ----------
+        src, dest : sequence
+            Source and destination port identifiers; each entry must be either
+            a selector string comprising a single port (e.g., '/foo[0]') or a
+            tuple of tokens (e.g., ('foo', 0)). The ith source port is
+            connected to the ith destination port.
+        data : scalar or dict
+            Connection attribute data. If a scalar, it is assigned to the
+            first data column; if a dict, each value may be either a scalar or
+            a sequence with one entry per connection.
+        sel0, sel1 : str, unicode, or sequence
+            Selectors defining the sets of ports in the pattern's two
+            interfaces. If not specified, the interfaces respectively comprise
+            the specified source and destination ports.
+        columns : sequence of str
+            Data column names.
+
+        Returns
+        -------
+        result : SparsePattern
+            SparsePattern instance.
+        """
+
+        src = Pattern._expand_ports(src)
+        dest = Pattern._expand_ports(dest)
+        if sel0 is None:
+            sel0 = sorted(set(src))
+        if sel1 is None:
+            sel1 = sorted(set(dest))
+        p = cls(sel0, sel1, columns=columns)
+        p.connect_many(src, dest, data)
+        return p
+
+    @classmethod
+    def from_pattern(cls, pat):
+        """
+        Create a sparse pattern containing the same connections as a Pattern.
+
+        Parameters
+        ----------
+        pat : Pattern
+            Pattern instance.
+
+        Returns
+        -------
+        result : SparsePattern
+            SparsePattern instance.
+        """
+
+        p = cls.__new__(cls)
+        p.sel = pat.sel
+        p.interface = Interface.from_df(pat.interface.data)
+        p.num_levels = dict(pat.num_levels)
+        p.src = port_ids.intern_many(t[pat.from_slice] for t in pat.data.index)
+        p.dest = port_ids.intern_many(t[pat.to_slice] for t in pat.data.index)
+        p.attrs = OrderedDict((c, pat.data[c].values.copy()) \
+                              for c in pat.data.columns)
+        p._sort()
+        return p
+
+    def to_pattern(self):
+        """
+        Create a Pattern containing the same connections as this instance.
+
+        Returns
+        -------
+        result : Pattern
+            Pattern instance.
+        """
+
+        names = ['from_%s' % i for i in xrange(self.num_levels['from'])]+ \
+                ['to_%s' %i for i in xrange(self.num_levels['to'])]
+        if len(self.src):
+            idx = pd.MultiIndex.from_tuples(
+                [f+t for f, t in zip(self._ports(self.src, 'from'),
+                                     self._ports(self.dest, 'to'))],
+                names=names)
+        else:
+            idx = pd.MultiIndex(levels=[[]]*len(names),
+                                labels=[[]]*len(names), names=names)
+        df = pd.DataFrame(self.attrs, index=idx, columns=self.columns)
+        return Pattern.from_df(self.interface.data, df)
+
+    def _ports(self, ids, which):
+        """
+        Convert port IDs into port identifiers padded to the pattern's levels.
+        """
+
+        n = self.num_levels[which]
+        return [k+('',)*(n-len(k)) for k in port_ids.lookup_many(ids)]
+
+    def _sort(self):
+        """
+        Sort connections in lexicographic order of their port identifiers.
+        """
+
+        # The levels of a MultiIndex are sorted, so the rank of each port can
+        # be computed from the level labels:
+        idx = self.interface.data.index
+        if isinstance(idx, pd.MultiIndex):
+            order = np.lexsort([np.asarray(l) for l in idx.labels][::-1])
+        else:
+            order = np.argsort(idx.values, kind='mergesort')
+        ranks = np.empty(len(idx), dtype=np.int64)
+        ranks[order] = np.arange(len(idx))
+        order = np.lexsort((ranks[self.interface._id_positions(self.dest)],
+                            ranks[self.interface._id_positions(self.src)]))
+        self.src = self.src[order]
+        self.dest = self.dest[order]
+        for c in self.attrs:
+            self.attrs[c] = self.attrs[c][order]
+
+    def connect_many(self, src, dest, data=1):
+        """
+        Add or update several connections at once.
+
+        Parameters
+        ----------
+        src, dest : sequence
+            Source and destination port identifiers; each entry must be either
+            a selector string comprising a single port (e.g., '/foo[0]') or a
+            tuple of tokens (e.g., ('foo', 0)). The ith source port is
+            connected to the ith destination port.
+        data : scalar or dict
+            Connection attribute data. If a scalar, it is assigned to the
+            first data column; if a dict, each value may be either a scalar or
+            a sequence with one entry per connection.
+        """
+
+        src = Pattern._expand_ports(src, self.num_levels['from'])
+        dest = Pattern._expand_ports(dest, self.num_levels['to'])
+        if len(src) != len(dest):
+            raise ValueError('numbers of source and destination ports differ')
+
+        # Ensure that the ports are in the pattern's interfaces:
+        pos_src = self.interface._port_positions(src)
+        pos_dest = self.interface._port_positions(dest)
+        if (pos_src < 0).any() or (pos_dest < 0).any():
+            raise ValueError('ports not in pattern interfaces')
+        self._connect_positions(pos_src, pos_dest, data)
+
+    def _connect_positions(self, pos_src, pos_dest, data=1):
+        """
+        Add or update connections between ports at the specified positions.
+
+        Parameters
+        ----------
+        pos_src, pos_dest : numpy.ndarray of int
+            Positions of the source and destination ports in the index of the
+            pattern's interface.
+        data : scalar or dict
+            Connection attribute data (see `connect_many`).
+        """
+
+        # Ensure that each connection joins ports in different interfaces:
+        int_ids = self.interface.data['interface'].values
+        if (int_ids[pos_src] == int_ids[pos_dest]).any():
+            raise ValueError('connected ports must be in different interfaces')
+
+        # Ensure that data to set is in dict form:
+        if np.isscalar(data):
+            data = {self.columns[0]: data}
+        elif type(data) != dict:
+            raise ValueError('cannot assign specified value')
+        N = len(pos_src)
+        values = {}
+        for c, v in data.iteritems():
+            if c not in self.attrs:
+                raise ValueError('invalid column %s' % c)
+            a = np.empty(N, dtype=object)
+            a[:] = v
+            values[c] = a
+
+        new_src = self.interface.port_ids()[pos_src]
+        new_dest = self.interface.port_ids()[pos_dest]
+        new_keys = (new_src << 32) | new_dest
+        if len(np.unique(new_keys)) != N:
+            raise ValueError('Duplicate pattern entries detected.')
+
+        # Find the existing connections to update:
+        keys = (self.src << 32) | self.dest
+        sorter = np.argsort(keys)
+        i = np.searchsorted(keys, new_keys, sorter=sorter)
+        found = np.zeros(N, dtype=bool)
+        if len(keys):
+            i = sorter[i.clip(0, len(keys)-1)]
+            found = keys[i] == new_keys
+        i = i[found]
+
+        # Validate the updated connections before modifying the instance:
+        all_src = np.concatenate((self.src, new_src[~found]))
+        all_dest = np.concatenate((self.dest, new_dest[~found]))
+        if len(np.unique(all_dest)) != len(all_dest):
+            raise ValueError('Fan-in pattern entries detected.')
+        if len(np.intersect1d(all_src, all_dest)):
+            raise ValueError('Ports cannot both receive input and send output.')
+
+        for c in self.attrs:
+            a = self.attrs[c].astype(object)
+            if c in values:
+                a[i] = values[c][found]
+                new = values[c][~found]
+            else:
+                new = np.empty((~found).sum(), dtype=object)
+                new[:] = np.nan
+            self.attrs[c] = np.concatenate((a, new))
+        self.src = all_src
+        self.dest = all_dest
+        self._sort()
+
+        # Update the `io` attributes of the pattern's interfaces:
+        io = self.interface.data.columns.get_loc('io')
+        self.interface.data.iloc[pos_src, io] = 'in'
+        self.interface.data.iloc[pos_dest, io] = 'out'
+        self.interface._version += 1
+
+    def read_csv(self, file_name, chunksize=100000, **kwargs):
+        names = ['from_%s' % i for i in xrange(self.num_levels['from'])]+ \
+                ['to_%s' %i for i in xrange(self.num_levels['to'])]
+        pos_src, pos_dest, data = \
+            _read_csv_positions(self.interface, names, self.columns,
+                                file_name, chunksize, **kwargs)
+        self._connect_positions(pos_src, pos_dest, data)
+    read_csv.__doc__ = Pattern.read_csv.__doc__
+
+    def __setitem__(self, key, value):
+        # Must pass more than one argument to the [] operators:
+        assert type(key) == tuple
+
+        # Ensure that the ports are in different interfaces:
+        assert self.interface.which_int(key[0]) != \
+            self.interface.which_int(key[1])
+
+        # Connect all pairs of ports comprised by the specified selectors:
+        key_0_exp = self.sel.expand(key[0], self.num_levels['from'])
+        key_1_exp = self.sel.expand(key[1], self.num_levels['to'])
+        pairs = list(itertools.product(key_0_exp, key_1_exp))
+
+        # Ensure that data to set is in dict form:
+        if len(key) > 2:
+            if np.isscalar(value):
+                data = {k:value for k in key[2:]}
+            elif type(value) == dict:
+                data = value
+            elif np.iterable(value) and len(value) <= len(key[2:]):
+                data = {k:v for k, v in zip(key[2:], value)}
+            else:
+                raise ValueError('cannot assign specified value')
+        else:
+            if np.isscalar(value) or type(value) == dict:
+                data = value
+            elif np.iterable(value) and len(value) <= len(self.columns):
+                data = {k:v for k, v in zip(self.columns, value)}
+            else:
+                raise ValueError('cannot assign specified value')
+        self.connect_many([p[0] for p in pairs], [p[1] for p in pairs], data)
+
+    def __len__(self):
+        return len(self.src)
+
+    def __repr__(self):
+        return 'SparsePattern (%i connections)' % len(self.src)
+
+    def _select(self, src_int, dest_int, src_type, dest_type,
+                src_ports=None, dest_ports=None):
+        """
+        Find the connections between ports in the specified interfaces.
+        """
+
+        assert src_int != dest_int
+        assert src_int in self.interface.interface_ids and \
+            dest_int in self.interface.interface_ids
+        return np.in1d(self.src, self.interface.select_port_ids(src_int,
+                                                   src_type, src_ports)) & \
+            np.in1d(self.dest, self.interface.select_port_ids(dest_int,
+                                                   dest_type, dest_ports))
+
+    @classmethod
+    def _unique(cls, ids):
+        """
+        Remove duplicate IDs without perturbing the order of the remaining IDs.
+        """
+
+        ids_u, first = np.unique(ids, return_index=True)
+        return ids[np.sort(first)]
+
+    def src_idx(self, src_int, dest_int, 
+                src_type=None, dest_type=None, dest_ports=None):
+        mask = self._select(src_int, dest_int, src_type, dest_type,
+                            dest_ports=dest_ports)
+        return self._ports(self._unique(self.src[mask]), 'from')
+    src_idx.__doc__ = Pattern.src_idx.__doc__
+
+    def dest_idx(self, src_int, dest_int, 
+                 src_type=None, dest_type=None, src_ports=None):
+        mask = self._select(src_int, dest_int, src_type, dest_type,
+                            src_ports=src_ports)
+        return self._ports(self._unique(self.dest[mask]), 'to')
+    dest_idx.__doc__ = Pattern.dest_idx.__doc__
+
+    def is_connected(self, from_int, to_int):
+        """
+        Check whether the specified interfaces are connected.
+
+        Parameters
+        ----------
+        from_int, to_int : int
+            Interface identifiers; must be in `self.interface.keys()`.
+
+        Returns
+        -------
+        result : bool
+            True if at least one connection from a port identifier in interface 
+            `from_int` to a port identifier in interface `to_int` exists.
+        """
+
+        mask = self._select(from_int, to_int, None, None)
+        if 'conn' in self.attrs:
+            mask &= self.attrs['conn'] != 0
+        return bool(mask.any())
+
+    def connected_ports(self, i=None, tuples=False):
+        """
+        Return ports that are connected by the pattern.
+        
+        Parameters
+        ----------
+        i : int
+            Interface identifier.
+        tuples : bool
+            If True, return a list of tuples; if False, return an
+            Interface instance.
+
+        Returns
+        -------
+        interface : Interface
+            Either an Interface instance containing all connected ports and 
+            their attributes in the specified interface, or a list of tuples
+            corresponding to the expanded ports.
+
+        Notes
+        -----
+        Returned ports are listed in lexicographic order.
+        """
+
+        mask = np.in1d(self.interface.port_ids(),
+                       np.concatenate((self.src, self.dest)))
+        df = self.interface.data[mask].sort_index()
+        if i is not None:
+            df = df[df['interface'] == i]
+        if tuples:
+            return df.index.tolist()
+        else:
+            return Interface.from_df(df)
+
+    def to_graph(self):
+        """
+        Convert the pattern to a networkx directed graph.
+        
+        Returns
+        -------
+        g : networkx.DiGraph
+            Graph whose nodes are the pattern's ports 
+            and whose edges are the pattern's connections.
+
+        Notes
+        -----
+        The 'conn' attribute of the connections is not transferred to the graph
+        edges.
+        """
+
+        g = nx.DiGraph()
+
+        # Add all of the ports as nodes:
+        for t, row in self.interface.data.iterrows():
+            id = self.sel.tokens_to_str(t)
+
+            # Replace NaNs with empty strings:
+            d = {k: (v if str(v) != 'nan' else '') \
+                 for k, v in row.to_dict().iteritems()}
+
+            # Each node's name corresponds to the port identifier string:
+            g.add_node(id, d)
+
+        # Add all of the connections as edges; the 'conn' attribute is
+        # discarded because the existence of the edge indicates that the
+        # connection exists:
+        columns = [c for c in self.columns if c != 'conn']
+        for k, (f, t) in enumerate(zip(self._ports(self.src, 'from'),
+                                       self._ports(self.dest, 'to'))):
+            g.add_edge(self.sel.tokens_to_str(f), self.sel.tokens_to_str(t),
+                       {c: self.attrs[c][k] for c in columns})
+        return g
@@ -4,15 +4,15 @@
 Path-like row selector for pandas DataFrames with hierarchical MultiIndexes.
 """
 
+import collections
 import copy
+import heapq
 import itertools
 import re
 
 import msgpack
 import numpy as np
 import pandas as pd
-import ply.lex as lex
-import ply.yacc as yacc
 
 # Work around lack of support for serializing slices in msgpack 0.4.4:
 def _encode(obj):
@@ -34,6 +34,370 @@ def _decode(obj):
 _packb = lambda x: msgpack.packb(x, default=_encode)
 _unpackb = lambda x: msgpack.unpackb(x, object_hook=_decode)
 
+class SelectorToken(collections.namedtuple('SelectorToken',
+                                            'type value lineno lexpos')):
+    """
+    Token extracted from a selector string.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return 'LexToken(%s,%r,%d,%d)' % self
+
+class LRUCache(object):
+    """
+    Size-bounded least-recently-used cache.
+
+    Examples
+    --------
+    >>> c = LRUCache(2)
+    >>> c['a'] = 1
+    >>> c['b'] = 2
+    >>> c['c'] = 3
+    >>> 'a' in c
+    False
+    >>> c.get('b')
+    2
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries retained by the cache. If 0, no entries
+        are retained.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups that found a cached entry.
+    misses : int
+        Number of lookups that did not find a cached entry.
+    maxsize : int
+        Maximum number of entries retained by the cache.
+
+    Notes
+    -----
+    Cached values are returned as-is; callers should only store values that
+    will not be modified after retrieval.
+    """
+
+    def __init__(self, maxsize=1024):
+        assert maxsize >= 0
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Retrieve a cached value and mark it as most recently used.
+
+        Parameters
+        ----------
+        key : hashable
+            Cache key.
+        default : object
+            Value to return if `key` is not in the cache.
+
+        Returns
+        -------
+        value : object
+            Cached value or `default`.
+        """
+
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        else:
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        if not self.maxsize:
+            return
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """
+        Discard all cached entries and reset the hit/miss counters.
+        """
+
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """
+        Return cache statistics.
+
+        Returns
+        -------
+        result : dict
+            Dictionary containing the number of hits and misses, the maximum
+            cache size, and the current number of cached entries.
+        """
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'maxsize': self.maxsize, 'currsize': len(self._data)}
+
+    def __repr__(self):
+        return 'LRUCache(hits=%i, misses=%i, maxsize=%i, currsize=%i)' % \
+            (self.hits, self.misses, self.maxsize, len(self._data))
+
+def _level_from_token(token):
+    """
+    Convert an unambiguous token into a level of a selector box.
+
+    Integer intervals are stored as xrange instances so that they are never
+    expanded; other tokens are stored as tuples of values.
+    """
+
+    if type(token) in [int, str, unicode]:
+        return (token,)
+    elif type(token) == slice:
+        return xrange(token.start, token.stop)
+    else:
+        return tuple(token)
+
+def _level_contains(level, value):
+    """
+    Check whether a value is in a box level.
+    """
+
+    if isinstance(level, xrange) and \
+       isinstance(value, (int, long, np.integer)):
+        return len(level) > 0 and level[0] <= value <= level[-1]
+    else:
+        return value in level
+
+def _level_intersect(a, b):
+    """
+    Return the values in box level `a` that are also in box level `b`.
+    """
+
+    if isinstance(a, xrange) and isinstance(b, xrange):
+        if not len(a) or not len(b):
+            return ()
+        start = max(a[0], b[0])
+        stop = min(a[-1], b[-1])+1
+        return xrange(start, max(start, stop))
+    elif isinstance(a, xrange):
+        return tuple(v for v in b if _level_contains(a, v))
+    else:
+        return tuple(v for v in a if _level_contains(b, v))
+
+def _level_diff(a, b):
+    """
+    Return the values in box level `a` that are not in box level `b`.
+
+    The result is a list of levels because removing values from the interior
+    of an interval splits it into several intervals.
+    """
+
+    if isinstance(a, xrange):
+        if not len(a):
+            return []
+        start, stop = a[0], a[-1]+1
+        if isinstance(b, xrange):
+            cuts = [(b[0], b[-1]+1)] if len(b) else []
+        else:
+            cuts = [(v, v+1) for v in sorted(set(b)) \
+                    if isinstance(v, (int, long, np.integer)) and \
+                    start <= v < stop]
+        result = []
+        for c_start, c_stop in cuts:
+            if c_start > start:
+                result.append(xrange(start, min(c_start, stop)))
+            start = max(start, c_stop)
+        if start < stop:
+            result.append(xrange(start, stop))
+        return result
+    else:
+        return [tuple(v for v in a if not _level_contains(b, v))]
+
+def _box_len(box):
+    """
+    Return the number of identifiers comprised by a selector box.
+    """
+
+    n = 1
+    for level in box:
+        n *= len(level)
+    return n
+
+def _box_contains(box, t):
+    """
+    Check whether an identifier is comprised by a selector box.
+    """
+
+    if len(t) != len(box):
+        return False
+    for level, value in itertools.izip(box, t):
+        if not _level_contains(level, value):
+            return False
+    return True
+
+def _box_diff(a, b):
+    """
+    Return disjoint boxes comprising the identifiers in box `a` not in box `b`.
+    """
+
+    if len(a) != len(b):
+        return [a]
+    common = [_level_intersect(x, y) for x, y in itertools.izip(a, b)]
+    if not all(map(len, common)):
+        return [a]
+    result = []
+    for i in xrange(len(a)):
+        for d in _level_diff(a[i], b[i]):
+            if len(d):
+                result.append(tuple(common[:i])+(d,)+tuple(a[i+1:]))
+    return result
+
+def _box_intersects(a, b):
+    """
+    Check whether two selector boxes comprise any common identifiers.
+    """
+
+    if len(a) != len(b):
+        return False
+    for x, y in itertools.izip(a, b):
+        if not len(_level_intersect(x, y)):
+            return False
+    return True
+
+class ParsedSelector(object):
+    """
+    Selector string that has been tokenized and parsed.
+
+    Instances may be passed to the methods of SelectorMethods wherever a
+    selector string is accepted; doing so avoids parsing the same string
+    repeatedly when it is passed to several methods.
+
+    Parameters
+    ----------
+    s : ParsedSelector, str, or unicode
+        Existing ParsedSelector instance or selector string.
+
+    Attributes
+    ----------
+    source : str or unicode
+        Selector string.
+    tokens : tuple of tuples
+        Parsed token sequences; list tokens are stored as tuples.
+    max_levels : int
+        Maximum number of levels in selector.
+    ambiguous : bool
+        True if the selector contains ambiguous symbols such as '*' or '[:]'.
+
+    Notes
+    -----
+    Instances are immutable; use the `parse()` method to obtain a modifiable
+    list of token sequences.
+    """
+
+    __slots__ = ('_source', '_tokens', '_max_levels', '_ambiguous')
+
+    def __init__(self, s):
+        if isinstance(s, ParsedSelector):
+            self._source = s._source
+            self._tokens = s._tokens
+            self._max_levels = s._max_levels
+            self._ambiguous = s._ambiguous
+        elif isinstance(s, basestring): # python2 dependency
+            self._source = s
+            self._tokens = SelectorParser._freeze_parsed(SelectorParser.parse(s))
+            self._max_levels = max(map(len, self._tokens) or [0])
+            self._ambiguous = SelectorMethods.is_ambiguous(s)
+        else:
+            raise ValueError('invalid selector type')
+
+    @property
+    def source(self):
+        """
+        Selector string.
+        """
+
+        return self._source
+
+    @property
+    def tokens(self):
+        """
+        Parsed token sequences.
+        """
+
+        return self._tokens
+
+    @property
+    def max_levels(self):
+        """
+        Maximum number of levels in selector.
+        """
+
+        return self._max_levels
+
+    @property
+    def ambiguous(self):
+        """
+        True if the selector is ambiguous.
+        """
+
+        return self._ambiguous
+
+    def parse(self, pad_len=0):
+        """
+        Return the parsed selector as a modifiable list of token sequences.
+
+        Parameters
+        ----------
+        pad_len : int
+            Length to which token sequences should be padded with blanks.
+            If infinite, the sequences are padded to the length of the longest
+            sequence.
+
+        Returns
+        -------
+        result : list of list
+            Parsed selector.
+        """
+
+        return SelectorParser.pad_parsed(
+            SelectorParser._thaw_parsed(self._tokens), pad_len)
+
+    def __eq__(self, other):
+        return isinstance(other, ParsedSelector) and \
+            self._source == other._source
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((ParsedSelector, self._source))
+
+    def __getstate__(self):
+        return self._source
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def __str__(self):
+        return self._source
+
+    def __repr__(self):
+        return 'ParsedSelector(%r)' % self._source
+
 class Selector(object):
     """
     Validated and expanded port selector.
@@ -53,24 +417,158 @@ class Selector(object):
         Expanded selector.
     max_levels : int
         Maximum number of levels in selector.
+
+    Notes
+    -----
+    Selectors are not expanded upon construction. The identifiers are stored
+    as a sequence of parts that are only enumerated when iterated over or when
+    the `expanded` attribute is accessed:
+
+    - ('box', levels): the Cartesian product of a sequence of levels, each of
+      which is either a tuple of tokens or an xrange of integers;
+    - ('merge', boxes): the sorted union of disjoint boxes with sorted levels;
+    - ('concat', sels): the elementwise concatenation of Selector instances;
+    - ('ids', ids): a tuple of explicitly enumerated identifiers.
     """
 
+    # Maximum number of boxes for which union() avoids expansion:
+    _union_max_boxes = 256
+
     def __init__(self, s):
         if isinstance(s, Selector):
             self._str = copy.copy(s._str)
-            self._expanded = copy.copy(s._expanded)
+            self._parts = s._parts
+            self._len = s._len
             self._max_levels = copy.copy(s._max_levels)
         elif isinstance(s, basestring): # python2 dependency
             self._str = copy.copy(s)
+            self._set_parts(self._parts_from_parsed(s))
+        elif isinstance(s, ParsedSelector):
+            self._str = s.source
+            self._set_parts(self._parts_from_parsed(s))
+        else:
+            self._str = None
+            self._set_parts(self._parts_from_parsed(s))
+
+    @classmethod
+    def _parts_from_parsed(cls, s):
+        """
+        Convert a selector string or sequence into a list of box parts.
+        """
 
-            # Save expanded selector as tuple because it shouldn't need to be
-            # modified after expansion:
-            self._expanded = tuple(SelectorMethods.expand(s))
-            self._max_levels = max(map(len, self._expanded))
+        if isinstance(s, basestring):
+            s = SelectorMethods._try_parsed(s)
+        assert SelectorMethods.is_selector(s)
+        assert not SelectorMethods.is_ambiguous(s)
+        if isinstance(s, ParsedSelector):
+            p = s.tokens
+        elif np.iterable(s):
+            p = s
         else:
-            self._expanded = tuple(SelectorMethods.expand(s))
-            self._max_levels = max(map(len, self._expanded))
-            self._str = SelectorMethods.collapse(self._expanded)
+            raise ValueError('invalid selector type')
+        return [('box', tuple(_level_from_token(token) for token in tokens)) \
+                for tokens in p]
+
+    @classmethod
+    def _from_parts(cls, parts, s=None):
+        """
+        Create a Selector instance from a list of parts.
+        """
+
+        out = cls.__new__(cls)
+        out._str = s
+        out._set_parts(parts)
+        return out
+
+    def _set_parts(self, parts):
+        """
+        Save parts that comprise identifiers along with their size.
+        """
+
+        # Discard parts that don't comprise any identifiers; boxes with no
+        # levels only comprise the empty identifier:
+        self._parts = tuple(p for p in parts \
+                            if self._part_len(p) and self._part_max_levels(p))
+        self._len = sum(map(self._part_len, self._parts))
+        self._max_levels = max(map(self._part_max_levels, self._parts) or [0])
+
+    @staticmethod
+    def _part_len(part):
+        kind, data = part
+        if kind == 'box':
+            return _box_len(data)
+        elif kind == 'merge':
+            return sum(map(_box_len, data))
+        elif kind == 'concat':
+            return len(data[0])
+        else:
+            return len(data)
+
+    @staticmethod
+    def _part_max_levels(part):
+        kind, data = part
+        if kind == 'box':
+            return len(data)
+        elif kind == 'merge':
+            return max(map(len, data) or [0])
+        elif kind == 'concat':
+            return sum([s.max_levels for s in data])
+        else:
+            return max(map(len, data) or [0])
+
+    @staticmethod
+    def _part_iter(part):
+        kind, data = part
+        if kind == 'box':
+            return itertools.product(*data)
+        elif kind == 'merge':
+            return heapq.merge(*[itertools.product(*b) for b in data])
+        elif kind == 'concat':
+            return (tuple(itertools.chain(*t)) for t in \
+                    itertools.izip(*[s._iter_ids() for s in data]))
+        else:
+            return iter(data)
+
+    @staticmethod
+    def _part_contains(part, t):
+        kind, data = part
+        if kind == 'box':
+            return _box_contains(data, t)
+        elif kind == 'merge':
+            return any(_box_contains(b, t) for b in data)
+        elif kind == 'concat':
+            return t in Selector._part_iter(part)
+        else:
+            return t in data
+
+    def _boxes(self):
+        """
+        Return the identifiers in the selector as a list of boxes.
+
+        The boxes are only guaranteed to enumerate the identifiers in the
+        selector's order if the selector consists solely of 'box' parts.
+        Explicitly enumerated identifiers are converted into boxes containing
+        single values.
+        """
+
+        result = []
+        for part in self._parts:
+            kind, data = part
+            if kind == 'box':
+                result.append(data)
+            elif kind == 'merge':
+                result.extend(data)
+            else:
+                result.extend(tuple((v,) for v in t) \
+                              for t in self._part_iter(part))
+        return result
+
+    def _iter_ids(self):
+        """
+        Iterate over the identifiers comprised by the selector.
+        """
+
+        return itertools.chain(*map(self._part_iter, self._parts))
 
     @property
     def nonempty(self):
@@ -86,15 +584,43 @@ class Selector(object):
         String representation of selector.
         """
 
+        if self._str is None:
+            self._str = SelectorMethods.collapse(self.expanded)
         return self._str
 
     @property
     def expanded(self):
         """
         Expanded selector.
+
+        The expansion is recomputed every time this attribute is accessed; use
+        `expanded_chunks()` to process the identifiers of very large selectors.
         """
 
-        return self._expanded
+        return tuple(self._iter_ids()) or ((),)
+
+    def expanded_chunks(self, n):
+        """
+        Iterate over the expanded selector in chunks.
+
+        Parameters
+        ----------
+        n : int
+            Maximum number of identifiers in each chunk.
+
+        Returns
+        -------
+        result : iterator
+            Iterator over tuples containing at most `n` identifiers each.
+        """
+
+        assert n > 0
+        ids = self._iter_ids()
+        while True:
+            chunk = tuple(itertools.islice(ids, n))
+            if not chunk:
+                break
+            yield chunk
 
     @property
     def max_levels(self):
@@ -121,16 +647,8 @@ class Selector(object):
             arguments.
         """
 
-        out = cls('')
-        out._str = ','.join([s.str for s in sels if s.nonempty])
-        try:
-            out._max_levels = max([s.max_levels for s in sels if s.nonempty])
-        except ValueError:
-            out._max_levels = 0
-
-        out._expanded = tuple(i for s in sels \
-                for i in s._expanded if s.nonempty) or ((),)
-        return out
+        return cls._from_parts([p for s in sels for p in s._parts],
+                               ','.join([s.str for s in sels if s.nonempty]))
 
     @classmethod
     def concat(cls, *sels):
@@ -150,23 +668,18 @@ class Selector(object):
             Selector instances.
         """
 
-        out = cls('')
         s_len = None
-        e_list = []
         for s in sels:
             if s_len is None:
                 s_len = len(s)
             else:
                 assert len(s) == s_len
-            if not e_list:
-                e_list = list(list(t) for t in s._expanded)
-            else:
-                for e, t in zip(e_list, s._expanded):
-                    e.extend(t)
-        out._expanded = tuple(tuple(e) for e in e_list)
-        out._str = '.+'.join([s.str for s in sels if s.nonempty])
-        out._max_levels = sum([s.max_levels for s in sels if s.nonempty])
-        return out
+        s_str = '.+'.join([s.str for s in sels if s.nonempty])
+        sels = [s for s in sels if s.nonempty]
+        if len(sels) > 1:
+            return cls._from_parts([('concat', tuple(sels))], s_str)
+        else:
+            return cls._from_parts([p for s in sels for p in s._parts], s_str)
 
     @classmethod
     def prod(cls, *sels):
@@ -174,12 +687,29 @@ class Selector(object):
         Compute the product of identifiers in multiple selectors.
         """
 
-        out = cls('')
-        out._str = '+'.join([s.str for s in sels if s.nonempty])
-        out._max_levels = sum([s.max_levels for s in sels if s.nonempty])
-        out._expanded = tuple(tuple(j for j in itertools.chain(*i)) \
-                for i in itertools.product(*[s.expanded for s in sels]))
-        return out
+        s_str = '+'.join([s.str for s in sels if s.nonempty])
+
+        # Empty selectors don't contribute any tokens to the product:
+        sels = [s for s in sels if s.nonempty]
+        if not sels:
+            return cls._from_parts([], s_str)
+
+        # If the selectors only contain boxes, the product can be computed
+        # from the products of their boxes; to preserve the order of the
+        # identifiers, the selectors preceding the last one containing several
+        # boxes must be enumerated:
+        if all([kind == 'box' for s in sels for kind, data in s._parts]):
+            m = max([i for i, s in enumerate(sels) if len(s._parts) > 1] or [0])
+            parts = []
+            for prefix in itertools.product(*[s._iter_ids() for s in sels[:m]]):
+                prefix = tuple((v,) for v in itertools.chain(*prefix))
+                for rest in itertools.product(*[s._parts for s in sels[m:]]):
+                    parts.append(('box', prefix+sum([d for k, d in rest], ())))
+            return cls._from_parts(parts, s_str)
+        else:
+            ids = tuple(tuple(itertools.chain(*i)) for i in \
+                        itertools.product(*[tuple(s._iter_ids()) for s in sels]))
+            return cls._from_parts([('ids', ids)], s_str)
 
     @classmethod
     def union(cls, *sels):
@@ -187,43 +717,48 @@ class Selector(object):
         Compute the union of the identifiers in multiple selectors.
         """
 
-        out = cls('')
-        tmp = set()
-        for s in sels:
-            if s.nonempty:
-                tmp = tmp.union(s.expanded)
-        if tmp:
-            out._expanded = tuple(sorted(tmp))
-        else:
-            out._expanded = ((),)
-        try:
-            out._max_levels = max([s.max_levels for s in sels if s.nonempty])
-        except ValueError:
-            out._max_levels = 0
-        out._str = SelectorMethods.collapse(out._expanded)
-        return out
+        boxes = [b for s in sels if s.nonempty for b in s._boxes()]
+        if len(boxes) > cls._union_max_boxes:
+            tmp = set()
+            for s in sels:
+                if s.nonempty:
+                    tmp = tmp.union(s._iter_ids())
+            return cls._from_parts([('ids', tuple(sorted(tmp)))])
+
+        # Split the boxes into disjoint boxes whose levels are sorted so that
+        # their identifiers can be enumerated in sorted order by merging:
+        result = []
+        for b in boxes:
+            pieces = [tuple(l if isinstance(l, xrange) else \
+                            tuple(sorted(set(l))) for l in b)]
+            for r in result:
+                pieces = [x for p in pieces for x in _box_diff(p, r)]
+            result.extend(p for p in pieces if _box_len(p))
+        return cls._from_parts([('merge', tuple(result))] if result else [])
 
     def __add__(self, y):
         return self.add(self, y)
 
     def __len__(self):
-        if len(self._expanded) == 1 and not self._expanded[0]:
-            return 0
-        else:
-            return len(self._expanded)
+        return self._len
+
+    def __contains__(self, t):
+        t = tuple(t)
+        return any(self._part_contains(p, t) for p in self._parts)
 
     def __iter__(self):
         if self.nonempty:
-            for t in self._expanded:
+            for t in self._iter_ids():
                 yield (t,)
         else:
             yield ((),)
 
     def __repr__(self):
-        if len(self._str) <= 100:
-            return 'Selector(\'%s\')' % self._str
+        s = self.str
+        if len(s) <= 100:
+            return 'Selector(\'%s\')' % s
         else:
-            return 'Selector(\'%s\')' % (self._str[0:25]+' ... '+self._str[-25:])
+            return 'Selector(\'%s\')' % (s[0:25]+' ... '+s[-25:])
 
 class SelectorParser(object):
     """
@@ -275,6 +810,12 @@ class SelectorParser(object):
     tokens = ('ASTERISK', 'COMMA', 'DOTPLUS', 'INTEGER', 'INTEGER_SET',
               'INTERVAL', 'LPAREN', 'PLUS', 'RPAREN', 'STRING', 'STRING_SET')
 
+    # Memoized parser output keyed on selector string:
+    _parse_cache = LRUCache(1024)
+
+    # Maximum length of a selector string whose parser output is memoized:
+    _parse_cache_max_len = 10000
+
     @classmethod
     def _parse_interval_str(cls, s):
         """
@@ -292,140 +833,238 @@ class SelectorParser(object):
             stop = int(stop)
         return slice(start, stop)
 
-    @classmethod
-    def t_PLUS(cls, t):
-        r'\+'
-        return t
+    # Token types and regular expressions; when several expressions match at
+    # some position in a selector string, the first one listed is used:
+    _token_rules = (
+        ('PLUS', r'\+'),
+        ('DOTPLUS', r'\.\+'),
+        ('COMMA', r'\,'),
+        ('LPAREN', r'\('),
+        ('RPAREN', r'\)'),
+        ('ASTERISK', r'/\*'),
+        ('INTEGER', r'/?\d+'),
+        ('INTEGER_SET', r'/?\[(?:\d+,?)+\]'),
+        ('INTERVAL', r'/?\[\d*\:\d*\]'),
+        ('STRING', r'/[^*/\[\]\(\):,\.\d][^+*/\[\]\(\):,\.]*'),
+        ('STRING_SET', r'/?\[(?:[^+*/\[\]\(\):,\.\d][^+*/\[\]\(\):,\.]*,?)+\]'))
+    _token_re = re.compile('|'.join(['(?P<%s>%s)' % r for r in _token_rules]))
+
+    # Tokens that denote a single selector level:
+    _level_tokens = frozenset(['ASTERISK', 'INTEGER', 'INTEGER_SET',
+                               'INTERVAL', 'STRING', 'STRING_SET'])
 
     @classmethod
-    def t_DOTPLUS(cls, t):
-        r'\.\+'
-        return t
+    def _token_value(cls, token_type, s):
+        """
+        Convert the text matched by a token into its value.
+        """
 
-    @classmethod
-    def t_COMMA(cls, t):
-        r'\,'
-        return t
+        if token_type in ['ASTERISK', 'STRING']:
+            return s.strip('/')
+        elif token_type == 'INTEGER':
+            return int(s.strip('/'))
+        elif token_type == 'INTEGER_SET':
+            return map(int, s.strip('/[]').split(','))
+        elif token_type == 'INTERVAL':
+            return cls._parse_interval_str(re.search('\[(.+)\]', s).group(1))
+        elif token_type == 'STRING_SET':
+            return s.strip('/[]').split(',')
+        else:
+            return s
 
     @classmethod
-    def t_LPAREN(cls, t):
-        r'\('
-        return t
+    def _syntax_error(cls, token):
+        raise ValueError('Cannot parse selector - syntax error: %s' % (token,))
 
+    # A selector is a list of lists of levels:
     @classmethod
-    def t_RPAREN(cls, t):
-        r'\)'
-        return t
+    def _p_comma(cls, a, b):
+        return a+b
 
     @classmethod
-    def t_ASTERISK(cls, t):
-        r'/\*'
-        t.value = t.value.strip('/')
-        return t
+    def _p_plus(cls, a, b):
+        return [x+y for x, y in itertools.product(a, b)]
 
     @classmethod
-    def t_INTEGER(cls, t):
-        r'/?\d+'
-        t.value = int(t.value.strip('/'))
-        return t
+    def _p_dotplus(cls, a, b):
 
-    @classmethod
-    def t_INTEGER_SET(cls, t):
-        r'/?\[(?:\d+,?)+\]'
-        t.value = map(int, t.value.strip('/[]').split(','))
-        return t
+        # Expand ranges and wrap strings with lists in each selector:
+        for p in [a, b]:
+            for i in xrange(len(p)):
+                for j in xrange(len(p[i])):
+                    if type(p[i][j]) in [int, str, unicode]:
+                        p[i][j] = [p[i][j]]
+                    elif type(p[i][j]) == slice:
+                        p[i][j] = range(p[i][j].start, p[i][j].stop)
 
-    @classmethod
-    def t_INTERVAL(cls, t):
-        r'/?\[\d*\:\d*\]'
-        t.value = cls._parse_interval_str(re.search('\[(.+)\]', t.value).group(1))
-        return t
+        # Fully expand both selectors into individual identifiers
+        ids_a = [list(x) for y in a for x in itertools.product(*y)]
+        ids_b = [list(x) for y in b for x in itertools.product(*y)]
 
-    @classmethod
-    def t_STRING(cls, t):
-        r'/[^*/\[\]\(\):,\.\d][^+*/\[\]\(\):,\.]*'
-        t.value = t.value.strip('/')
-        return t
+        # The expanded selectors must comprise the same number of identifiers:
+        assert len(ids_a) == len(ids_b)
+        return [x+y for (x, y) in zip(ids_a, ids_b)]
 
     @classmethod
-    def t_STRING_SET(cls, t):
-        r'/?\[(?:[^+*/\[\]\(\):,\.\d][^+*/\[\]\(\):,\.]*,?)+\]'
-        t.value = t.value.strip('/[]').split(',')
-        return t
+    def _peek(cls, tokens, i):
+        """
+        Return the token at some position or None if there are no more tokens.
 
-    @classmethod
-    def t_error(cls, t):
-        raise ValueError('Cannot tokenize selector - illegal character: %s' % t.value[0])
+        Errors encountered while tokenizing are only reported when the
+        position of the illegal character is reached.
+        """
 
-    # A selector is a list of lists of levels:
-    @classmethod
-    def p_selector_paren_selector(cls, p):
-        'selector : LPAREN selector RPAREN'
-        p[0] = p[2]
+        if i >= len(tokens):
+            return None
+        elif tokens[i].type == 'error':
+            raise ValueError('Cannot tokenize selector - '
+                             'illegal character: %s' % tokens[i].value)
+        else:
+            return tokens[i]
 
     @classmethod
-    def p_selector_comma_selector(cls, p):
-        'selector : selector COMMA selector'
-        p[0] = p[1]+p[3]
+    def _parse_tokens(cls, tokens, i=0):
+        """
+        Parse a list of tokens starting at some position.
 
-    @classmethod
-    def p_selector_plus_selector(cls, p):
-        'selector : selector PLUS selector'
-        p[0] = [a+b for a, b in itertools.product(p[1], p[3])]
+        Recursive descent parser for the grammar
 
-    @classmethod
-    def p_selector_dotplus_selector(cls, p):
-        'selector : selector DOTPLUS selector'
-        # Expand ranges and wrap strings with lists in each selector:
-        for i in xrange(len(p[1])): 
-            for j in xrange(len(p[1][i])): 
-                if type(p[1][i][j]) in [int, str, unicode]:
-                    p[1][i][j] = [p[1][i][j]]
-                elif type(p[1][i][j]) == slice:
-                    p[1][i][j] = range(p[1][i][j].start, p[1][i][j].stop)
-        for i in xrange(len(p[3])):
-            for j in xrange(len(p[3][i])):
-                if type(p[3][i][j]) in [int, str, unicode]:
-                    p[3][i][j] = [p[3][i][j]]
-                elif type(p[3][i][j]) == slice:
-                    p[3][i][j] = range(p[3][i][j].start, p[3][i][j].stop)
-                    
-        # Fully expand both selectors into individual identifiers
-        ids_1 = [list(x) for y in p[1] for x in itertools.product(*y)]
-        ids_3 = [list(x) for y in p[3] for x in itertools.product(*y)]
-        
-        # The expanded selectors must comprise the same number of identifiers:
-        assert len(ids_1) == len(ids_3)        
-        p[0] = [a+b for (a, b) in zip(ids_1, ids_3)]
+        selector : LPAREN selector RPAREN
+                 | selector COMMA selector
+                 | selector PLUS selector
+                 | selector DOTPLUS selector
+                 | selector PLUS level
+                 | selector level
+                 | level
 
-    @classmethod
-    def p_selector_selector_plus_level(cls, p):
-        'selector : selector PLUS level'
-        p[0] = [x+[p[3]] for x in p[1]]
+        Juxtaposed levels and levels following PLUS are appended to the
+        preceding selector; COMMA, PLUS, and DOTPLUS otherwise group to the
+        right.
 
-    @classmethod
-    def p_selector_selector_level(cls, p):
-        'selector : selector level'
-        p[0] = [x+[p[2]] for x in p[1]]
+        Parameters
+        ----------
+        tokens : list
+            Tokens returned by `_tokenize()`.
+        i : int
+            Position of first token to parse.
 
-    @classmethod
-    def p_selector_level(cls, p):
-        'selector : level'
-        p[0] = [[p[1]]]
+        Returns
+        -------
+        result : list of list
+            Parsed selector.
+        i : int
+            Position of first token following parsed selector.
+        """
+
+        # Parse the operands separated by COMMA, PLUS, and DOTPLUS
+        # iteratively so that long lists of selectors don't exhaust the stack;
+        # since the operators group to the right, the operands are combined
+        # starting with the last one:
+        actions = {'COMMA': cls._p_comma, 'PLUS': cls._p_plus,
+                   'DOTPLUS': cls._p_dotplus}
+        operands = []
+        ops = []
+        while True:
+            result, i = cls._parse_operand(tokens, i)
+            operands.append(result)
+            t = cls._peek(tokens, i)
+            if t is None or t.type == 'RPAREN':
+                break
+            elif t.type in actions:
+                ops.append(t.type)
+                i += 1
+            else:
+                cls._syntax_error(t)
+
+        result = operands.pop()
+        while ops:
+
+            # Concatenate runs of comma-separated operands all at once to
+            # avoid repeatedly copying the accumulated result:
+            if ops[-1] == 'COMMA':
+                parts = [result]
+                while ops and ops[-1] == 'COMMA':
+                    ops.pop()
+                    parts.append(operands.pop())
+                result = [x for part in reversed(parts) for x in part]
+            else:
+                result = actions[ops.pop()](operands.pop(), result)
+        return result, i
 
     @classmethod
-    def p_level(cls, p):
-        '''level : ASTERISK
-                 | INTEGER
-                 | INTEGER_SET
-                 | INTERVAL
-                 | STRING
-                 | STRING_SET'''
-        p[0] = p[1]
+    def _parse_operand(cls, tokens, i):
+        """
+        Parse a parenthesized selector or level and the levels appended to it.
+
+        Parameters
+        ----------
+        tokens : list
+            Tokens returned by `_tokenize()`.
+        i : int
+            Position of first token to parse.
+
+        Returns
+        -------
+        result : list of list
+            Parsed selector.
+        i : int
+            Position of first token following parsed selector.
+        """
+
+        t = cls._peek(tokens, i)
+        if t is None:
+            cls._syntax_error(t)
+        elif t.type == 'LPAREN':
+            result, i = cls._parse_tokens(tokens, i+1)
+            t = cls._peek(tokens, i)
+            if t is None or t.type != 'RPAREN':
+                cls._syntax_error(t)
+            i += 1
+        elif t.type in cls._level_tokens:
+            result = [[t.value]]
+            i += 1
+        else:
+            cls._syntax_error(t)
+
+        while True:
+            t = cls._peek(tokens, i)
+            if t is None:
+                break
+            elif t.type in cls._level_tokens:
+                result = [x+[t.value] for x in result]
+                i += 1
+            elif t.type == 'PLUS':
+                u = cls._peek(tokens, i+1)
+                if u is not None and u.type in cls._level_tokens:
+                    result = [x+[u.value] for x in result]
+                    i += 2
+                else:
+                    break
+            else:
+                break
+        return result, i
 
     @classmethod
-    def p_error(cls, p):
-        raise ValueError('Cannot parse selector - syntax error: %s' % p)
+    def _tokenize(cls, selector):
+        """
+        Tokenize a selector string up to the first illegal character.
+
+        If an illegal character is found, the last token in the returned list
+        is of type 'error' and contains the illegal character.
+        """
+
+        token_list = []
+        i = 0
+        N = len(selector)
+        while i < N:
+            m = cls._token_re.match(selector, i)
+            if not m:
+                token_list.append(SelectorToken('error', selector[i], 1, i))
+                break
+            token_list.append(SelectorToken(m.lastgroup,
+                    cls._token_value(m.lastgroup, m.group()), 1, i))
+            i = m.end()
+        return token_list
 
     @classmethod
     def tokenize(cls, selector):
@@ -440,15 +1079,13 @@ class SelectorParser(object):
         Returns
         -------
         token_list : list
-            List of tokens extracted by ply.
+            List of tokens; each token has `type`, `value`, `lineno`, and
+            `lexpos` attributes.
         """
 
-        cls.lexer.input(selector)
-        token_list = []
-        while True:
-            token = cls.lexer.token()
-            if not token: break
-            token_list.append(token)
+        token_list = cls._tokenize(selector)
+        for i in xrange(len(token_list)):
+            cls._peek(token_list, i)
         return token_list
 
     @classmethod
@@ -507,16 +1144,52 @@ class SelectorParser(object):
         This method does not expand selectors into the tokens corresponding to
         individual port identifiers.
 
+        Parsed selectors are memoized in a size-bounded cache unless they are
+        longer than `_parse_cache_max_len` characters; each call returns a new
+        list that may be modified without affecting the cache.
+
         See Also
         --------
         SelectorMethods.expand
         """
 
-        if re.search('^\s*$', selector):
-            result = [[]]
-        else:
-            result = cls.parser.parse(selector, lexer=cls.lexer)
-        return cls.pad_parsed(result, pad_len)
+        if isinstance(selector, ParsedSelector):
+            return selector.parse(pad_len)
+        frozen = cls._parse_cache.get(selector)
+        if frozen is None:
+            if re.search('^\s*$', selector):
+                result = [[]]
+            else:
+                tokens = cls._tokenize(selector)
+                result, i = cls._parse_tokens(tokens)
+                t = cls._peek(tokens, i)
+                if t is not None:
+                    cls._syntax_error(t)
+            frozen = cls._freeze_parsed(result)
+
+            # Only memoize the output for selector strings that aren't too
+            # long to avoid retaining huge strings and lists of tokens:
+            if len(selector) <= cls._parse_cache_max_len:
+                cls._parse_cache[selector] = frozen
+        return cls.pad_parsed(cls._thaw_parsed(frozen), pad_len)
+
+    @staticmethod
+    def _freeze_parsed(parsed):
+        """
+        Convert a parsed selector into an immutable nested tuple.
+        """
+
+        return tuple(tuple(tuple(t) if type(t) == list else t \
+                           for t in tokens) for tokens in parsed)
+
+    @staticmethod
+    def _thaw_parsed(frozen):
+        """
+        Convert an immutable parsed selector back into a list of lists.
+        """
+
+        return [[list(t) if type(t) == tuple else t for t in tokens] \
+                for tokens in frozen]
 
 class SelectorMethods(SelectorParser):
     """
@@ -528,8 +1201,61 @@ class SelectorMethods(SelectorParser):
     The class can also be used to create new MultiIndex instances from selectors
     that can be fully expanded into an explicit set of identifiers (and
     therefore contain no ambiguous symbols such as '*' or '[:]').
+
+    The results of parsing, expanding, and checking selector strings are
+    memoized in size-bounded caches shared by all instances of the class;
+    see `cache_info()` and `cache_clear()`.
     """
 
+    # Memoized results keyed on selector strings (or, for max_levels(),
+    # hashable selectors); created here because one can't create a cache that
+    # is an attribute of the classmethod itself:
+    _expand_cache = LRUCache(1024)
+    _is_ambiguous_cache = LRUCache(1024)
+    _max_levels_cache = LRUCache(1024)
+
+    # Maximum number of identifiers in a memoized expansion:
+    _expand_cache_max_ids = 10000
+
+    # Maximum number of pairwise selector box comparisons to perform before
+    # resorting to expansion:
+    _box_max_comparisons = 65536
+
+    @classmethod
+    def _caches(cls):
+        """
+        Return the memoization caches used by the class keyed on method name.
+        """
+
+        return {'parse': cls._parse_cache,
+                'expand': cls._expand_cache,
+                'is_ambiguous': cls._is_ambiguous_cache,
+                'max_levels': cls._max_levels_cache}
+
+    @classmethod
+    def cache_info(cls):
+        """
+        Return statistics for the selector memoization caches.
+
+        Returns
+        -------
+        result : dict
+            Dictionary mapping method names ('parse', 'expand', 'is_ambiguous',
+            'max_levels') to dicts containing the number of cache hits and
+            misses, the maximum cache size, and the current cache size.
+        """
+
+        return {k: v.info() for k, v in cls._caches().iteritems()}
+
+    @classmethod
+    def cache_clear(cls):
+        """
+        Clear the selector memoization caches and their hit/miss counters.
+        """
+
+        for c in cls._caches().itervalues():
+            c.clear()
+
     @classmethod
     def is_identifier(cls, s):
         """
@@ -651,12 +1377,15 @@ class SelectorMethods(SelectorParser):
         # The Selector class can only encapsulate an unambiguous selector:
         if isinstance(selector, Selector):
             return False
+        if isinstance(selector, ParsedSelector):
+            return selector.ambiguous
 
         if type(selector) in [str, unicode]:
-            if re.search(r'(?:\*)|(?:\:\])', selector):
-                return True
-            else:
-                return False
+            result = cls._is_ambiguous_cache.get(selector)
+            if result is None:
+                result = bool(re.search(r'(?:\*)|(?:\:\])', selector))
+                cls._is_ambiguous_cache[selector] = result
+            return result
         elif type(selector) in [list, tuple]:
             for tokens in selector:
                 for token in tokens:
@@ -690,6 +1419,8 @@ class SelectorMethods(SelectorParser):
 
         if isinstance(selector, Selector): 
             return len(selector) == 0
+        if isinstance(selector, ParsedSelector):
+            selector = selector.source
 
         if type(selector) in [str, unicode] and \
            re.search('^\s*$', selector):
@@ -742,6 +1473,20 @@ class SelectorMethods(SelectorParser):
         # All tokens are valid:
         return True
         
+    @classmethod
+    def _try_parsed(cls, s):
+        """
+        Convert a selector string into a ParsedSelector if it can be parsed.
+
+        Strings that cannot be parsed are returned unchanged so that they fail
+        the validity check performed by the caller.
+        """
+
+        try:
+            return ParsedSelector(s)
+        except Exception:
+            return s
+
     @classmethod
     def is_selector_str(cls, s):
         """
@@ -785,7 +1530,7 @@ class SelectorMethods(SelectorParser):
             (e.g., [['foo', (0, 2)]], [['bar', 'baz'], ['qux', 0]]).
         """
 
-        if isinstance(s, Selector):
+        if isinstance(s, (Selector, ParsedSelector)):
             return True
         elif type(s) in [str, unicode]:
             return cls.is_selector_str(s)
@@ -839,11 +1584,22 @@ class SelectorMethods(SelectorParser):
                 return [tuple(x)+('',)*(pad_len-len(x)) \
                         for x in selector.expanded]
 
+        # Use memoized expansion of selector strings if available:
+        if type(selector) in [str, unicode] or \
+           isinstance(selector, ParsedSelector):
+            key = selector.source if isinstance(selector, ParsedSelector) \
+                  else selector
+            result = cls._expand_cache.get((key, pad_len))
+            if result is not None:
+                return list(result)
+
+        if type(selector) in [str, unicode]:
+            selector = cls._try_parsed(selector)
         assert cls.is_selector(selector)
         assert not cls.is_ambiguous(selector)
 
-        if type(selector) in [str, unicode]:
-            p = cls.parse(selector)
+        if isinstance(selector, ParsedSelector):
+            p = selector.parse()
         elif np.iterable(selector):
 
             # Assume empty iterables are empty selectors:
@@ -882,10 +1638,15 @@ class SelectorMethods(SelectorParser):
 
         # If the selector doesn't expand to anything, return a list containing
         # an empty tuple:
-        if result:
-            return result
-        else:
-            return [()]
+        if not result:
+            result = [()]
+
+        # Only memoize expansions of selector strings that aren't too large
+        # to avoid retaining huge lists of identifiers:
+        if isinstance(selector, ParsedSelector) and \
+           len(result) <= cls._expand_cache_max_ids:
+            cls._expand_cache[(selector.source, pad_len)] = tuple(result)
+        return result
 
     @classmethod
     def is_expandable(cls, selector):
@@ -907,12 +1668,14 @@ class SelectorMethods(SelectorParser):
             Selector instances.
         """
 
+        if type(selector) in [str, unicode]:
+            selector = cls._try_parsed(selector)
         assert cls.is_selector(selector)
 
         if isinstance(selector, Selector) or cls.is_ambiguous(selector):
             return False
-        if type(selector) in [str, unicode]:
-            p = cls.parse(selector)
+        if isinstance(selector, ParsedSelector):
+            p = selector.parse()
         elif type(selector) in [list, tuple]:
             p = selector
         else:
@@ -1019,9 +1782,19 @@ class SelectorMethods(SelectorParser):
 
         if isinstance(selector, basestring):
             return selector
+        if isinstance(selector, ParsedSelector):
+            return selector.source
         if isinstance(selector, Selector):
             return selector.str
         assert np.iterable(selector)
+
+        # Use compact representation if all identifiers only contain
+        # integer and string tokens:
+        selector = list(selector)
+        try:
+            return cls._collapse(selector)
+        except (ValueError, TypeError):
+            pass
         result_list = []
         for tokens in selector:
             result_list.append(cls.tokens_to_str(tokens))
@@ -1030,12 +1803,13 @@ class SelectorMethods(SelectorParser):
     @classmethod
     def _collapse(cls, id_list):
         """
-        Collapse a list of identifiers into a selector string.
+        Collapse a list of identifiers into a compact selector string.
 
         Parameters
         ----------
         id_list : list of tuple
-            List of identifiers; each identifier is a list of token tuples.
+            List of identifiers; each identifier is a tuple of integer or
+            string tokens.
 
         Returns
         -------
@@ -1044,69 +1818,153 @@ class SelectorMethods(SelectorParser):
 
         Notes
         -----
-        Expects all identifiers in the given list to have the same
-        number of levels.
+        Adjacent identifiers that share leading tokens are grouped together,
+        runs of consecutive integers are converted into intervals, and
+        adjacent tokens followed by identical remaining levels are combined
+        into sets; the order of the identifiers is preserved. Trailing blank
+        tokens (i.e., padding) and empty identifiers are ignored.
+
+        Raises a ValueError if some token cannot be represented in a selector
+        string.
         """
 
-        # XXX doesn't collapse expanded selectors such as /foo/xxx,/bar/yyy
-        # properly
-        raise NotImplemented('unfinished method - should eventually replace collapse()')
+        def strip(t):
+            t = list(t)
+            while t and t[-1] == '':
+                t.pop()
+            return tuple(t)
+        ids = [strip(t) if t and t[-1] == '' else tuple(t) for t in id_list]
+
+        # Convert numpy integers to ints:
+        tokens = set(itertools.chain.from_iterable(ids))
+        if any([isinstance(x, np.integer) for x in tokens]):
+            ids = [tuple(int(x) if isinstance(x, np.integer) else x \
+                         for x in t) for t in ids]
+            tokens = set(itertools.chain.from_iterable(ids))
+
+        # Only check each distinct token once:
+        for x in tokens:
+            if type(x) in [int, long]:
+                if x < 0:
+                    raise ValueError('invalid token')
+            elif not (type(x) in [str, unicode] and cls._str_token_re.match(x)):
+                raise ValueError('invalid token')
+        return ','.join(cls._collapse_ids([t for t in ids if t], 0))
 
-        # Can only collapse list identifiers that all have the same number of
-        # levels:
-        assert len(set(map(len, id_list))) == 1
+    # Tokens that can be represented as strings in a selector:
+    _str_token_re = re.compile(r'[^+*/\[\]\(\):,\.\d][^+*/\[\]\(\):,\.]*$')
 
-        # Collect all tokens for each level:
-        levels = [[] for i in xrange(max(map(len, id_list)))]
-        for i in xrange(len(id_list)):
-            for j in xrange(len(id_list[i])):
-                if not(id_list[i][j] in levels[j]):
-                    levels[j].append(id_list[i][j])
+    @classmethod
+    def _collapse_ids(cls, ids, depth):
+        """
+        Collapse the levels of identifiers starting at some depth.
+
+        Parameters
+        ----------
+        ids : list of tuple
+            Identifiers whose levels preceding `depth` are identical.
+        depth : int
+            First level to collapse.
+
+        Returns
+        -------
+        result : list of str
+            Selector strings whose concatenation with the preceding levels
+            expands into the given identifiers.
+        """
+
+        # If `depth` is the last level of all identifiers, its tokens can be
+        # collapsed directly:
+        if all([len(t) == depth+1 for t in ids]):
+            result = []
+            for k, g in itertools.groupby([t[depth] for t in ids],
+                                          lambda x: type(x) in [int, long]):
+                result.extend(cls._collapse_level(list(g)))
+            return result
+
+        # Group adjacent identifiers that have the same token at `depth`;
+        # identifiers that have no more levels are denoted by None:
+        runs = []
+        for t in ids:
+            token = t[depth] if len(t) > depth else None
+            if runs and runs[-1][0] == token and \
+               type(runs[-1][0]) == type(token):
+                runs[-1][1].append(t)
+            else:
+                runs.append([token, [t]])
+        frags = [['']*len(r) if token is None else \
+                 cls._collapse_ids(r, depth+1) for token, r in runs]
 
-        def collapse_level(level):
-            """
-            Recursively called function to collapse all values in a single level.
-            """
+        # Combine the tokens of adjacent runs whose remaining levels collapse
+        # into the same single string:
+        result = []
+        i = 0
+        while i < len(runs):
+            token = runs[i][0]
+            if token is None:
+                result.extend(frags[i])
+                i += 1
+                continue
+            j = i+1
+            if len(frags[i]) == 1:
+                while j < len(runs) and runs[j][0] is not None and \
+                      (type(runs[j][0]) in [int, long]) == \
+                      (type(token) in [int, long]) and \
+                      frags[j] == frags[i]:
+                    j += 1
+            for level in cls._collapse_level([r[0] for r in runs[i:j]]):
+                result.extend([level+f for f in frags[i]])
+            i = j
+        return result
+
+    @classmethod
+    def _collapse_level(cls, tokens):
+        """
+        Collapse a sequence of tokens of the same type into selector levels.
+
+        Parameters
+        ----------
+        tokens : list
+            Integer or string tokens.
+
+        Returns
+        -------
+        result : list of str
+            Selector levels that expand into the specified tokens in order.
+        """
 
-            type_set = set(map(type, level))
-            if type_set == set([int]):
+        if type(tokens[0]) in [str, unicode]:
+            if len(tokens) == 1:
+                return ['/'+tokens[0]]
+            else:
+                return ['/['+','.join(tokens)+']']
 
-                # If a level only contains consecutive integers, convert it into an
-                # interval:
-                level.sort()
-                if cls.are_consecutive(level):
-                    return ['[%s:%s]' % (min(level), max(level)+1)]
+        def fmt(ints):
+            if len(ints) == 1:
+                return '/%i' % ints[0]
+            else:
+                return '['+','.join(map(str, ints))+']'
 
-                # If a level contains nonconsecutive integers, convert it into a
-                # list:
-                else:
-                    return ['['+','.join([str(i) for i in level])+']']
-            elif type_set in set([str, unicode]):
-                if len(level) == 1:
-                    return level
-                else:
-                    return ['['+','.join([s for s in level])+']']
+        # Convert runs of consecutive integers into intervals and combine
+        # the remaining integers into sets:
+        result = []
+        single = []
+        i = 0
+        while i < len(tokens):
+            j = i+1
+            while j < len(tokens) and tokens[j] == tokens[j-1]+1:
+                j += 1
+            if j-i > 1:
+                if single:
+                    result.append(fmt(single))
+                    single = []
+                result.append('[%i:%i]' % (tokens[i], tokens[j-1]+1))
             else:
-                level_int = sorted([x for x in level if type(x) == int])
-                level_str = sorted([x for x in level if type(x) in [str, unicode]])
-                return collapse_level(level_int)+collapse_level(level_str)
-
-        # If a level contains multiple string AND integer tokens, convert it to
-        # a list:
-
-        collapsed_list = []
-        for level in levels:
-            collapsed_list.append(collapse_level(sorted(level)))
-        selector_list = []
-        for t in itertools.product(*collapsed_list):
-            selector = ''
-            for s in t:
-                if s[0] == '[':
-                    selector += s
-                else:
-                    selector = selector + '/' + s
-            selector_list.append(selector)
-        return ','.join(selector_list)
+                single.append(tokens[i])
+            i = j
+        if single:
+            result.append(fmt(single))
+        return result
 
     @classmethod
     def are_disjoint(cls, *selectors):
@@ -1139,6 +1997,18 @@ class SelectorMethods(SelectorParser):
         if len(selectors) == 1: return True
         assert all(map(lambda s: not cls.is_ambiguous(s), selectors))
 
+        # Compare the boxes comprised by each pair of selectors unless there
+        # are too many of them:
+        boxes = [Selector(selector)._boxes() for selector in selectors]
+        if sum(map(len, boxes))**2 <= cls._box_max_comparisons:
+            for i in xrange(len(boxes)):
+                for j in xrange(i+1, len(boxes)):
+                    for a in boxes[i]:
+                        for b in boxes[j]:
+                            if _box_intersects(a, b):
+                                return False
+            return True
+
         # Expand selectors into sets of identifiers:
         ids = set()
         for selector in selectors:
@@ -1174,15 +2044,8 @@ class SelectorMethods(SelectorParser):
             Number of identifiers comprised by selector.
         """
 
-        e = cls.expand(selector)
-        if e == [()] or e == ((),):
-            return 0
-        else:
-            return len(e)
+        return len(Selector(selector))
 
-    # Need to create cache here because one can't assign create a cache that is
-    # an attribute of the classmethod itself:
-    __max_levels_cache = {}
     @classmethod
     def max_levels(cls, selector):
         """
@@ -1202,8 +2065,9 @@ class SelectorMethods(SelectorParser):
 
         assert cls.is_selector(selector)
 
-        # Selector class instances already contain max_levels precomputed:
-        if isinstance(selector, Selector):
+        # Selector and ParsedSelector class instances already contain
+        # max_levels precomputed:
+        if isinstance(selector, (Selector, ParsedSelector)):
             return selector.max_levels
 
         # Handle unhashable selectors:
@@ -1215,9 +2079,10 @@ class SelectorMethods(SelectorParser):
             h = selector
 
         # Use memoization:
-        try:
-            return cls.__max_levels_cache[h]
-        except:
+        count = cls._max_levels_cache.get(h)
+        if count is not None:
+            return count
+        else:
             if isinstance(selector, Selector):
                 return selector.max_levels
             elif type(selector) in [str, unicode]:
@@ -1232,7 +2097,7 @@ class SelectorMethods(SelectorParser):
                     count = 0
             else:
                 raise ValueError('invalid selector type')
-            cls.__max_levels_cache[h] = count
+            cls._max_levels_cache[h] = count
             return count
 
     @classmethod
@@ -1249,7 +2114,7 @@ class SelectorMethods(SelectorParser):
         row : sequence
             Data corresponding to a single row of a MultiIndex.
         parse_list : list
-            List of lists of token values extracted by ply.
+            List of lists of token values extracted by the parser.
         start, stop : int
             Start and end indices in `row` over which to test entries. If
             the 
@@ -1319,7 +2184,7 @@ class SelectorMethods(SelectorParser):
         row : scalar
             Data corresponding to a single row of an Index.
         parse_list : list
-            List of lists of token values extracted by ply.
+            List of lists of token values extracted by the parser.
 
         Returns
         -------
@@ -1353,6 +2218,135 @@ class SelectorMethods(SelectorParser):
                 continue
         return False
 
+    @classmethod
+    def _level_match(cls, values, token):
+        """
+        Check which values in an index level match a single token.
+
+        Parameters
+        ----------
+        values : pandas.Index
+            Unique values in a level of a MultiIndex or Index.
+        token : object
+            Token value extracted by the parser.
+
+        Returns
+        -------
+        result : numpy.ndarray
+            Boolean array with one more entry than `values`; the last entry
+            indicates whether a missing (NaN) value matches the token.
+        """
+
+        N = len(values)
+        result = np.empty(N+1, dtype=bool)
+
+        # Comparisons against numeric levels can be vectorized provided that
+        # the token values are also numeric; string tokens never match numeric
+        # values:
+        numeric = values.dtype.kind in 'iuf'
+        v = values.values
+
+        # '*' and unrecognized tokens match everything:
+        if token == '*':
+            result[:] = True
+        elif type(token) in [int, str, unicode]:
+            if numeric and type(token) == int:
+                result[:N] = v == token
+            elif numeric:
+                result[:N] = False
+            else:
+                result[:N] = [x == token for x in v]
+            result[N] = False
+        elif type(token) == list:
+            if numeric and all([type(t) == int for t in token]):
+                result[:N] = np.in1d(v, token)
+            else:
+                result[:N] = [x in token for x in v]
+            result[N] = False
+        elif type(token) == slice:
+            i_start = token.start
+            i_stop = token.stop
+            if numeric:
+                m = np.ones(N, dtype=bool)
+                if i_start is not None:
+                    m &= v >= i_start
+                if i_stop is not None:
+                    m &= v < i_stop
+                result[:N] = m
+            else:
+                result[:N] = [(i_start is None or x >= i_start) and \
+                              (i_stop is None or x < i_stop) for x in v]
+
+            # Comparisons with NaN are always false, so NaN values fall
+            # within any interval:
+            result[N] = True
+        else:
+            result[:] = True
+        return result
+
+    @classmethod
+    def _index_mask(cls, index, parse_list, start=None, stop=None):
+        """
+        Find the rows in a MultiIndex or Index that match a parsed selector.
+
+        Rather than testing each row individually, each token is compared with
+        the unique values in the corresponding index level; the per-level
+        results are then mapped onto the rows via the level labels, combined
+        across the levels in each token list, and combined across the token
+        lists.
+
+        Parameters
+        ----------
+        index : pandas.MultiIndex or pandas.Index
+            Index whose rows should be checked.
+        parse_list : list
+            List of lists of token values extracted by the parser.
+        start, stop : int
+            Start and end indices of the MultiIndex levels over which to test
+            entries. Ignored if `index` is an Index.
+
+        Returns
+        -------
+        result : numpy.ndarray
+            Boolean array indicating which rows match the selector.
+
+        See Also
+        --------
+        SelectorMethods._multiindex_row_in, SelectorMethods._index_row_in
+        """
+
+        if isinstance(index, pd.MultiIndex):
+            levels = [index.levels[i] for i in range(index.nlevels)[start:stop]]
+            labels = [np.asarray(index.labels[i]) \
+                      for i in range(index.nlevels)[start:stop]]
+        else:
+            codes, uniques = pd.factorize(index)
+            levels = [pd.Index(uniques)]
+            labels = [codes]
+
+            # An Index row is a scalar and can only match a single token:
+            for tokens in parse_list:
+                if len(tokens) > 1:
+                    raise ValueError('index row only is scalar')
+
+        result = np.zeros(len(index), dtype=bool)
+        for tokens in parse_list:
+
+            # A single row will never match an empty token list:
+            if not tokens:
+                continue
+
+            mask = np.ones(len(index), dtype=bool)
+            for i, token in enumerate(tokens):
+                if token == '*':
+                    continue
+
+                # Missing values have label -1 and therefore map onto the
+                # last entry of the level match array:
+                mask &= cls._level_match(levels[i], token)[labels[i]]
+            result |= mask
+        return result
+
     @classmethod
     def is_in(cls, s, t):
         """
@@ -1375,6 +2369,20 @@ class SelectorMethods(SelectorParser):
         assert cls.is_selector(s)
         assert cls.is_selector(t)
 
+        # Remove the boxes comprised by `t` from those comprised by `s` unless
+        # there are too many of them:
+        s_sel = Selector(s)
+        if not s_sel.nonempty:
+            return True
+        s_boxes = s_sel._boxes()
+        t_boxes = Selector(t)._boxes()
+        if len(s_boxes)*len(t_boxes) <= cls._box_max_comparisons:
+            for b in t_boxes:
+                s_boxes = [x for a in s_boxes for x in _box_diff(a, b)]
+                if not s_boxes:
+                    return True
+            return not any(map(_box_len, s_boxes))
+
         s_exp = set(cls.expand(s))
         if s_exp == set([()]):
             return True
@@ -1407,15 +2415,17 @@ class SelectorMethods(SelectorParser):
             `df.index` is an Index, the result is a list of labels.
         """
 
+        if type(selector) in [str, unicode]:
+            selector = cls._try_parsed(selector)
         assert cls.is_selector(selector)
         max_levels = cls.max_levels(selector)
         if isinstance(selector, Selector):
             parse_list = selector.expanded
-        elif type(selector) in [str, unicode]:
-            try:
+        elif isinstance(selector, ParsedSelector):
+            if selector.ambiguous:
+                parse_list = selector.parse()
+            else:
                 parse_list = cls.expand(selector, max_levels)
-            except:
-                parse_list = cls.parse(selector)
         elif type(selector) in [list, tuple]:
             parse_list = selector
         else:
@@ -1427,12 +2437,11 @@ class SelectorMethods(SelectorParser):
             raise ValueError('Maximum number of levels in selector exceeds that of '
                              'DataFrame index')
 
+        mask = cls._index_mask(df.index, parse_list, start, stop)
         if isinstance(df.index, pd.MultiIndex):
-            return [t for t in df.index \
-                    if cls._multiindex_row_in(t, parse_list, start, stop)]
+            return list(df.index[mask])
         else:
-            return [(t,) for t in df.index \
-                    if cls._index_row_in(t, parse_list)]
+            return [(t,) for t in df.index[mask]]
 
     @classmethod
     def get_index(cls, df, selector, start=None, stop=None, names=[]):
@@ -1457,6 +2466,8 @@ class SelectorMethods(SelectorParser):
             selector.
         """
 
+        if type(selector) in [str, unicode]:
+            selector = cls._try_parsed(selector)
         assert cls.is_selector(selector)
 
         tuples = cls.get_tuples(df, selector, start, stop)
@@ -1756,6 +2767,8 @@ class SelectorMethods(SelectorParser):
         The selector may not contain ambiguous symbols such as '*' or '[:]'.
         """
 
+        if type(selector) in [str, unicode]:
+            selector = cls._try_parsed(selector)
         assert cls.is_selector(selector)
         assert not cls.is_ambiguous(selector)
 
@@ -1810,7 +2823,7 @@ class SelectorMethods(SelectorParser):
         return pd.MultiIndex(levels=levels, labels=labels, names=names)
 
     @classmethod
-    def select(cls, df, selector, start=None, stop=None):
+    def select(cls, df, selector, start=None, stop=None, trie=None):
         """
         Select rows from DataFrame using a path-like selector.
 
@@ -1823,51 +2836,462 @@ class SelectorMethods(SelectorParser):
             (e.g., [['foo', (0, 2)]]).
         start, stop : int
             Start and end indices in `row` over which to test entries.
+        trie : PortTrie
+            Prefix tree built from the index of `df`. If specified, the rows
+            matching the selector are found by walking the tree rather than
+            by checking all rows. Ignored if the tree wasn't built from the
+            index of `df`.
+
+        Returns
+        -------
+        result : pandas.DataFrame
+            DataFrame containing selected rows.
+        """
+
+        if type(selector) in [str, unicode]:
+            selector = cls._try_parsed(selector)
+        assert cls.is_selector(selector)
+        if isinstance(selector, ParsedSelector):
+            if len(df.index.names[start:stop])>1 and not selector.ambiguous:
+                try:
+                    tks = cls.expand(selector)
+                    return df[tks]
+                except:
+                    pass
+            parse_list = selector.parse()
+        elif type(selector) in [list, tuple]:
+            try:
+                tks = cls.expand(selector)
+                return df[tks]
+            except:
+                pass
+            parse_list = selector
+        else:
+            raise ValueError('invalid selector type')
+
+        # The number of tokens must not exceed the number of levels in the
+        # DataFrame's MultiIndex; the maximum number of levels in a selector
+        # containing no identifiers is obviously 0:
+        max_levels = max(map(len, parse_list)) if len(parse_list) else 0
+        if max_levels > len(df.index.names[start:stop]):
+            raise ValueError('Number of levels in selector exceeds number in row subinterval')
+
+        if trie is not None and trie.index is df.index:
+            return df.iloc[trie.query(parse_list, start, stop)]
+        return df[cls._index_mask(df.index, parse_list, start, stop)]
+
+class PortTrie(object):
+    """
+    Prefix tree over the levels of an index of port identifiers.
+
+    Each node of the tree corresponds to the identifiers sharing a sequence of
+    leading tokens; the rows of the index are ordered so that the rows
+    below each node are contiguous. Selectors can therefore be resolved by
+    walking only the subtrees matched by their tokens.
+
+    Parameters
+    ----------
+    idx : pandas.Index or pandas.MultiIndex
+        Index of port identifiers.
+
+    Attributes
+    ----------
+    index : pandas.Index or pandas.MultiIndex
+        Index from which the tree was built.
+
+    Notes
+    -----
+    The tree must be rebuilt if the index is replaced.
+    """
+
+    def __init__(self, idx):
+        self.index = idx
+        if isinstance(idx, pd.MultiIndex):
+            levels = list(idx.levels)
+            labels = [np.asarray(l) for l in idx.labels]
+        else:
+            codes, uniques = pd.factorize(idx)
+            levels = [pd.Index(uniques)]
+            labels = [codes]
+
+        # Integer levels can be queried with intervals without examining all
+        # of the children of a node:
+        self._int_levels = [l.dtype.kind in 'iu' for l in levels]
+        self._order = np.lexsort(labels[::-1]) if labels else \
+                      np.arange(len(idx))
+        sorted_labels = [l[self._order] for l in labels]
+        values = [list(l) for l in levels]
+
+        def build(depth, lo, hi):
+            if depth == len(sorted_labels):
+                return (lo, hi, None)
+            codes = sorted_labels[depth][lo:hi]
+            bounds = np.concatenate(([0], np.flatnonzero(np.diff(codes))+1,
+                                     [len(codes)]))
+            children = {}
+            for a, b in itertools.izip(bounds[:-1], bounds[1:]):
+                code = codes[a]
+                key = values[depth][code] if code >= 0 else None
+                children[key] = build(depth+1, lo+a, lo+b)
+            return (lo, hi, children)
+        self._root = build(0, 0, len(idx))
+
+    def _match(self, node, token, depth):
+        """
+        Return the children of a node that match a token.
+        """
+
+        children = node[2]
+        if not children:
+            return []
+        if token == '*':
+            return children.values()
+        elif type(token) in [int, str, unicode]:
+            c = children.get(token)
+            return [] if c is None else [c]
+        elif type(token) == list:
+            return [children[k] for k in token if k in children]
+        elif type(token) == slice:
+            start, stop = token.start, token.stop
+
+            # Comparisons with missing values (denoted by None) are false,
+            # so they fall within any interval:
+            if self._int_levels[depth] and start is not None and \
+               stop is not None and stop-start < len(children):
+                return [children[k] for k in xrange(start, stop) \
+                        if k in children]+\
+                    ([children[None]] if None in children else [])
+            return [c for k, c in children.iteritems() \
+                    if k is None or ((start is None or k >= start) and \
+                                     (stop is None or k < stop))]
+        else:
+            return children.values()
+
+    def query(self, parse_list, start=None, stop=None):
+        """
+        Find the rows of the index that match a parsed selector.
+
+        Parameters
+        ----------
+        parse_list : list
+            List of lists of token values extracted by the parser.
+        start, stop : int
+            Start and end indices of the index levels over which to match
+            tokens.
+
+        Returns
+        -------
+        result : numpy.ndarray of int
+            Sorted positions of the matching rows.
+        """
+
+        offset = range(len(self._int_levels))[start:stop][:1] or [0]
+        ranges = []
+        for tokens in parse_list:
+
+            # A single row will never match an empty token list:
+            if not tokens:
+                continue
+
+            nodes = [self._root]
+            tokens = ['*']*offset[0]+list(tokens)
+            for depth, token in enumerate(tokens):
+                nodes = [c for n in nodes for c in self._match(n, token, depth)]
+                if not nodes:
+                    break
+            ranges.extend((n[0], n[1]) for n in nodes)
+        if not ranges:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate([self._order[a:b] for a, b in ranges]))
+
+    def __len__(self):
+        return len(self.index)
+
+class PortIdTable(object):
+    """
+    Table that interns port identifiers as dense integer IDs.
+
+    Each distinct port identifier is assigned a unique nonnegative integer
+    the first time it is interned; subsequent set operations, joins, and
+    lookups on identifiers can then be performed on arrays of integers.
+    Trailing blank tokens (i.e., padding) are ignored, so ('foo', 0, '') and
+    ('foo', 0) are assigned the same ID.
+
+    Examples
+    --------
+    >>> t = PortIdTable()
+    >>> t.intern(('foo', 0))
+    0
+    >>> t.intern_many([('foo', 1), ('foo', 0, '')])
+    array([1, 0])
+    >>> t.lookup(1)
+    ('foo', 1)
+
+    Notes
+    -----
+    IDs are only meaningful within the process in which they were assigned.
+    The module-level instance `port_ids` is shared by all classes that use
+    interned identifiers.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._keys = []
+
+    @staticmethod
+    def _key(t):
+        """
+        Convert a port identifier into a hashable tuple without padding.
+        """
+
+        if type(t) != tuple:
+            t = tuple(t) if np.iterable(t) and \
+                not isinstance(t, basestring) else (t,)
+        if t and t[-1] == '':
+            t = list(t)
+            while t and t[-1] == '':
+                t.pop()
+            t = tuple(t)
+        return t
+
+    def intern(self, t):
+        """
+        Return the ID of a port identifier, assigning a new one if necessary.
+
+        Parameters
+        ----------
+        t : tuple
+            Port identifier.
+
+        Returns
+        -------
+        result : int
+            Integer ID.
+        """
+
+        k = self._key(t)
+        try:
+            return self._ids[k]
+        except KeyError:
+            i = len(self._keys)
+            self._ids[k] = i
+            self._keys.append(k)
+            return i
+
+    def intern_many(self, ids):
+        """
+        Return the IDs of several port identifiers, assigning new ones if necessary.
+
+        Parameters
+        ----------
+        ids : iterable of tuple
+            Port identifiers.
+
+        Returns
+        -------
+        result : numpy.ndarray of int64
+            Integer IDs.
+        """
+
+        return np.fromiter(itertools.imap(self.intern, ids), np.int64)
+
+    def get(self, t, default=-1):
+        """
+        Return the ID of a port identifier without assigning a new one.
+
+        Parameters
+        ----------
+        t : tuple
+            Port identifier.
+        default : int
+            Value returned if the identifier hasn't been interned.
+
+        Returns
+        -------
+        result : int
+            Integer ID or `default`.
+        """
+
+        return self._ids.get(self._key(t), default)
+
+    def get_many(self, ids):
+        """
+        Return the IDs of several port identifiers without assigning new ones.
+
+        Parameters
+        ----------
+        ids : iterable of tuple
+            Port identifiers.
+
+        Returns
+        -------
+        result : numpy.ndarray of int64
+            Integer IDs; identifiers that haven't been interned are denoted
+            by -1.
+        """
+
+        return np.fromiter(itertools.imap(self.get, ids), np.int64)
+
+    def lookup(self, i):
+        """
+        Return the port identifier with the specified ID.
+
+        Parameters
+        ----------
+        i : int
+            Integer ID.
+
+        Returns
+        -------
+        result : tuple
+            Port identifier without padding.
+        """
+
+        return self._keys[i]
+
+    def lookup_many(self, ids):
+        """
+        Return the port identifiers with the specified IDs.
+
+        Parameters
+        ----------
+        ids : iterable of int
+            Integer IDs.
+
+        Returns
+        -------
+        result : list of tuple
+            Port identifiers without padding.
+        """
+
+        keys = self._keys
+        return [keys[i] for i in ids]
+
+    def index_ids(self, idx):
+        """
+        Return the IDs of the port identifiers in an index.
+
+        Parameters
+        ----------
+        idx : pandas.Index or pandas.MultiIndex
+            Index of port identifiers.
+
+        Returns
+        -------
+        result : numpy.ndarray of int64
+            Integer IDs of the rows of `idx`, assigning new ones if necessary.
+        """
+
+        if isinstance(idx, pd.MultiIndex):
+            return self.intern_many(idx.values)
+        else:
+            return self.intern_many((x,) for x in idx.values)
+
+    def __contains__(self, t):
+        return self._key(t) in self._ids
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return 'PortIdTable(%i identifiers)' % len(self._keys)
+
+# Port identifier table shared by all users of interned identifiers:
+port_ids = PortIdTable()
+
+class IndexPlan(object):
+    """
+    Precompiled plan for gathering/scattering array entries by integer index.
+
+    Runs of consecutive indices are copied using slices; if the indices
+    contain too many runs for this to be worthwhile, they are copied using
+    `numpy.take` and `numpy.put`.
+
+    Parameters
+    ----------
+    inds : sequence of int
+        Integer indices of array entries.
+    max_runs : int
+        Maximum number of runs of consecutive indices to copy using slices.
+
+    Attributes
+    ----------
+    inds : numpy.ndarray of int
+        Integer indices of array entries.
+    slices : list of tuple
+        Pairs of slices into the indexed array and the gathered array for each
+        run of consecutive indices. Set to None if the plan copies data
+        using `inds`.
+    """
+
+    def __init__(self, inds, max_runs=4):
+        self.inds = np.asarray(inds, dtype=np.int64).ravel()
+        N = len(self.inds)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(self.inds) != 1)+1)) \
+                 if N else np.array([], dtype=np.int64)
+        if len(starts) <= max_runs:
+            stops = np.concatenate((starts[1:], [N])).astype(np.int64)
+            self.slices = [(slice(self.inds[a], self.inds[a]+b-a), slice(a, b)) \
+                           for a, b in itertools.izip(starts, stops)]
+        else:
+            self.slices = None
+
+    def gather(self, src, out=None):
+        """
+        Copy the indexed entries of an array into a contiguous array.
+
+        Parameters
+        ----------
+        src : numpy.ndarray
+            Array from which to copy entries.
+        out : numpy.ndarray
+            Array in which to store the copied entries. If not specified, a new
+            array is allocated.
 
         Returns
         -------
-        result : pandas.DataFrame
-            DataFrame containing selected rows.
+        out : numpy.ndarray
+            Copied entries.
         """
 
-        assert cls.is_selector(selector)
-        if type(selector) in [str, unicode]:
-            if len(df.index.names[start:stop])>1:
-                try:
-                    tks = cls.expand(selector)
-                    return df[tks]
-                except:
-                    pass
-            parse_list = cls.parse(selector)
-        elif type(selector) in [list, tuple]:
-            try:
-                tks = cls.expand(selector)
-                return df[tks]
-            except:
-                pass
-            parse_list = selector
+        if out is None:
+            out = np.empty(len(self.inds), src.dtype)
+        if self.slices is not None:
+            for s, d in self.slices:
+                out[d] = src[s]
         else:
-            raise ValueError('invalid selector type')
+            np.take(src, self.inds, out=out)
+        return out
 
-        # The number of tokens must not exceed the number of levels in the
-        # DataFrame's MultiIndex; the maximum number of levels in a selector
-        # containing no identifiers is obviously 0:
-        max_levels = max(map(len, parse_list)) if len(parse_list) else 0
-        if max_levels > len(df.index.names[start:stop]):
-            raise ValueError('Number of levels in selector exceeds number in row subinterval')
+    def scatter(self, dest, data):
+        """
+        Copy the entries of a contiguous array into the indexed entries of an array.
+
+        Parameters
+        ----------
+        dest : numpy.ndarray
+            Array into which to copy entries.
+        data : numpy.ndarray or scalar
+            Entries to copy.
+        """
 
-        if type(df.index) == pd.MultiIndex:
-            return df.select(lambda row: cls._multiindex_row_in(row, parse_list,
-                                                                start, stop))
+        if self.slices is not None:
+            if np.ndim(data) == 0:
+                for s, d in self.slices:
+                    dest[s] = data
+            else:
+                for s, d in self.slices:
+                    dest[s] = data[d]
         else:
-            return df.select(lambda row: cls._index_row_in(row, parse_list))
+            np.put(dest, self.inds, data)
+
+    def __len__(self):
+        return len(self.inds)
 
-# Set the option optimize=1 in the production version; need to perform these
-# assignments after definition of the rest of the class because the class'
-# internal namespace can't be accessed within its body definition:
-SelectorParser.lexer = lex.lex(module=SelectorParser)
-SelectorParser.parser = yacc.yacc(module=SelectorParser, 
-                                  debug=0, write_tables=0)
+    def __repr__(self):
+        return 'IndexPlan(%i indices, %s)' % \
+            (len(self.inds),
+             'fancy' if self.slices is None else '%i runs' % len(self.slices))
 
 class BasePortMapper(object):
     """
@@ -1903,8 +3327,13 @@ class BasePortMapper(object):
     The selectors may not contain any '*' or '[:]' characters.
     A single port identifier may be mapped to multiple integer indices, 
     but not vice-versa.
+
+    If `use_trie` is set to True, selectors are resolved using a prefix
+    tree built from the index of port identifiers (see `PortTrie`).
     """
 
+    use_trie = False
+
     def __init__(self, selector, portmap=None):
         self.sel = SelectorMethods()
         N = self.sel.count_ports(selector)
@@ -1927,6 +3356,7 @@ class BasePortMapper(object):
 
         c = BasePortMapper('')
         c.portmap = self.portmap.copy()
+        c.use_trie = self.use_trie
         return c
 
     @classmethod
@@ -1983,8 +3413,35 @@ class BasePortMapper(object):
         assert isinstance(pm, cls)
         r = cls('')
         r.portmap = pm.portmap.copy()
+        r.use_trie = pm.use_trie
         return r
 
+    @property
+    def trie(self):
+        """
+        Prefix tree over the port identifiers.
+
+        Returns
+        -------
+        result : neurokernel.plsel.PortTrie
+            Prefix tree built from the index of port identifiers. The tree is
+            cached until the index is replaced.
+        """
+
+        t = getattr(self, '_trie', None)
+        if t is None or t.index is not self.portmap.index:
+            t = PortTrie(self.portmap.index)
+            self._trie = t
+        return t
+
+    def _select(self, selector):
+        """
+        Select entries of the port map, using the prefix tree if enabled.
+        """
+
+        return self.sel.select(self.portmap, selector,
+                               trie=self.trie if self.use_trie else None)
+
     @property
     def index(self):
         """
@@ -2040,7 +3497,7 @@ class BasePortMapper(object):
             Integer indices of ports comprised by selector. 
         """
 
-        return self.sel.select(self.portmap, selector).dropna().values
+        return self._select(selector).dropna().values
 
     def get_map(self, selector):
         """
@@ -2058,7 +3515,7 @@ class BasePortMapper(object):
             Selected data.
         """
 
-        return np.asarray(self.sel.select(self.portmap, selector).dropna())
+        return np.asarray(self._select(selector).dropna())
 
     def set_map(self, selector, portmap):
         """
@@ -2112,6 +3569,296 @@ class BasePortMapper(object):
     def __repr__(self):
         return 'Map:\n----\n'+self.portmap.__repr__()
 
+def _sorted_lookup(a, sorter, q):
+    """
+    Find the positions of all entries of an array that match query values.
+
+    Parameters
+    ----------
+    a : numpy.ndarray
+        Sorted array of values.
+    sorter : numpy.ndarray of int
+        Positions in the original array of the entries of `a`.
+    q : numpy.ndarray
+        Values to find.
+
+    Returns
+    -------
+    result : numpy.ndarray of int
+        Positions in the original array of the entries equal to each value in
+        `q`, in the order of the values in `q`.
+    """
+
+    lo = np.searchsorted(a, q, 'left')
+    hi = np.searchsorted(a, q, 'right')
+
+    # Concatenate the ranges [lo, hi) of sorted positions matching each
+    # queried value:
+    counts = hi-lo
+    offsets = np.repeat(lo-np.cumsum(counts)+counts, counts)
+    return sorter[offsets+np.arange(counts.sum(), dtype=np.int64)]
+
+class ArrayPortMapper(BasePortMapper):
+    """
+    Maps integer sequence to/from path-like port identifiers using arrays.
+
+    Port identifiers are stored as integer IDs interned by `port_ids` rather
+    than as a pandas index; unambiguous selectors are resolved by binary
+    search over the sorted IDs.
+
+    Examples
+    --------
+    >>> pm = ArrayPortMapper('/[a,b][0:2]')
+    >>> print pm.ports_to_inds('/b[0:2]')
+    array([2, 3])
+    >>> print pm.inds_to_ports([0, 1])
+    [('a', 0), ('a', 1)]
+
+    Parameters
+    ----------
+    selector : str, unicode, or sequence
+        Selector string (e.g., '/foo[0:2]') or sequence of token sequences
+        (e.g., [['foo', (0, 2)]]) to map to `data`.
+    portmap : sequence of int
+        Integer indices to map to port identifiers. If no map is specified,
+        it is assumed to be an array of consecutive integers from 0
+        through one less than the number of ports.
+
+    Attributes
+    ----------
+    index : pandas.MultiIndex
+        Index of port identifiers.
+    portmap : pandas.Series
+        Map of port identifiers to integer indices.
+
+    Notes
+    -----
+    `index` and `portmap` are constructed on demand; modifying them in place
+    does not modify the mapper, but assigning to them does. Ambiguous
+    selectors are resolved by matching against `index`.
+
+    Instances are pickled using the port identifiers rather than their
+    interned IDs so that they may be unpickled in other processes.
+    """
+
+    def __init__(self, selector, portmap=None):
+        self.sel = SelectorMethods()
+        s = Selector(selector)
+        N = len(s)
+        if portmap is None:
+            inds = np.arange(N)
+        else:
+            assert len(portmap) == N
+            inds = np.array(portmap)
+        self._set_arrays(port_ids.intern_many(s.expanded), inds, s.max_levels)
+
+    def _set_arrays(self, ids, inds, nlevels):
+        """
+        Set the port IDs and mapped indices and reset the derived lookup data.
+        """
+
+        self._ids = np.asarray(ids, dtype=np.int64)
+        self._inds = inds
+        self._nlevels = nlevels
+
+        # A stable sort keeps the positions of duplicate IDs in port order:
+        self._sorter = np.argsort(self._ids, kind='mergesort')
+        self._sorted_ids = self._ids[self._sorter]
+        self._inds_sorter = None
+        self._index = None
+
+    def _pad(self, k):
+        """
+        Convert an interned key into an identifier as it appears in an index.
+        """
+
+        if self._nlevels == 1:
+            return k[0]
+        return k+('',)*(self._nlevels-len(k))
+
+    def _positions(self, selector):
+        """
+        Find the positions of the ports comprised by a selector.
+
+        Ports selected by an unambiguous selector are returned in the order
+        in which the selector lists them; ports selected by an ambiguous
+        selector are returned in port order.
+        """
+
+        if type(selector) in [str, unicode]:
+            selector = self.sel._try_parsed(selector)
+        assert self.sel.is_selector(selector)
+        if self.sel.max_levels(selector) > max(self._nlevels, 1):
+            raise ValueError('Number of levels in selector exceeds number in row subinterval')
+        if self.sel.is_ambiguous(selector):
+            if isinstance(selector, ParsedSelector):
+                parse_list = selector.parse()
+            else:
+                parse_list = selector
+            return np.flatnonzero(self.sel._index_mask(self.index, parse_list))
+
+        result = _sorted_lookup(self._sorted_ids, self._sorter,
+                                port_ids.get_many(self.sel.expand(selector)))
+        if self._nlevels == 1:
+            return np.unique(result)
+        return result
+
+    @property
+    def index(self):
+        """
+        Port mapper index.
+        """
+
+        if self._index is None:
+            ports = [self._pad(k) for k in port_ids.lookup_many(self._ids)]
+            if self._nlevels > 1:
+                self._index = pd.MultiIndex.from_tuples(ports,
+                                    names=range(self._nlevels))
+            else:
+                self._index = pd.Index(ports, name=0)
+        return self._index
+    @index.setter
+    def index(self, i):
+        assert len(i) == len(self._inds)
+        self._set_arrays(port_ids.index_ids(i), self._inds, i.nlevels)
+
+    @property
+    def portmap(self):
+        """
+        Map of port identifiers to integer indices.
+        """
+
+        return pd.Series(self._inds, index=self.index)
+    @portmap.setter
+    def portmap(self, s):
+        self._set_arrays(port_ids.index_ids(s.index), np.array(s.values),
+                         s.index.nlevels)
+
+    def copy(self):
+        """
+        Return copy of this port mapper.
+
+        Returns
+        -------
+        result : neurokernel.plsel.ArrayPortMapper
+            Copy of port mapper instance.
+        """
+
+        c = ArrayPortMapper('')
+        c._set_arrays(self._ids, self._inds.copy(), self._nlevels)
+        return c
+
+    @classmethod
+    def from_pm(cls, pm):
+        """
+        Create a new port mapper instance given an existing instance.
+
+        Parameters
+        ----------
+        result : neurokernel.plsel.BasePortMapper
+            Existing port mapper instance. If `pm` is not an ArrayPortMapper,
+            its identifiers are interned.
+
+        Returns
+        -------
+        result : neurokernel.plsel.ArrayPortMapper
+            New port mapper instance.
+        """
+
+        assert isinstance(pm, BasePortMapper)
+        if isinstance(pm, ArrayPortMapper):
+            return pm.copy()
+        r = cls('')
+        r.portmap = pm.portmap.copy()
+        return r
+
+    def inds_to_ports(self, inds):
+        """
+        Convert list of integer indices to port identifiers.
+
+        Parameters
+        ----------
+        inds : array_like of int
+            Integer indices of ports.
+
+        Returns
+        -------
+        t : list of tuple
+            Expanded port identifiers.
+        """
+
+        if self._inds_sorter is None:
+            self._inds_sorter = np.argsort(self._inds, kind='mergesort')
+        sorter = self._inds_sorter
+        pos = np.sort(_sorted_lookup(self._inds[sorter], sorter,
+                                     np.unique(np.asarray(inds))))
+        return [self._pad(k) for k in port_ids.lookup_many(self._ids[pos])]
+
+    def ports_to_inds(self, selector):
+        """
+        Convert port selector to list of integer indices.
+
+        Parameters
+        ----------
+        selector : str, unicode, or sequence
+            Selector string (e.g., '/foo[0:2]') or sequence of token sequences
+            (e.g., [['foo', (0, 2)]]).
+
+        Returns
+        -------
+        inds : numpy.ndarray of int
+            Integer indices of ports comprised by selector. 
+        """
+
+        return self._inds[self._positions(selector)]
+
+    def get_map(self, selector):
+        """
+        Retrieve integer indices associated with selector.
+
+        Parameters
+        ----------
+        selector : str, unicode, or sequence
+            Selector string (e.g., '/foo[0:2]') or sequence of token sequences
+            (e.g., [['foo', (0, 2)]]).
+
+        Returns
+        -------
+        result : numpy.ndarray
+            Selected data.
+        """
+
+        return self._inds[self._positions(selector)]
+
+    def set_map(self, selector, portmap):
+        """
+        Set mapped integer index associated with selector.
+
+        Parameters
+        ----------
+        selector : str, unicode, or sequence
+            Selector string (e.g., '/foo[0:2]') or sequence of token sequences
+            (e.g., [['foo', (0, 2)]]).            
+        portmap : sequence of int
+            Integer indices to map to port identifiers.
+        """
+
+        self._inds[self._positions(selector)] = portmap
+        self._inds_sorter = None
+
+    def __len__(self):
+        return len(self._inds)
+
+    def __getstate__(self):
+        return {'ports': port_ids.lookup_many(self._ids),
+                'portmap': self._inds,
+                'nlevels': self._nlevels}
+
+    def __setstate__(self, state):
+        self.sel = SelectorMethods()
+        self._set_arrays(port_ids.intern_many(state['ports']),
+                         state['portmap'], state['nlevels'])
+
 class PortMapper(BasePortMapper):
     """
     Maps a numpy array to/from path-like port identifiers.
@@ -2234,6 +3981,7 @@ class PortMapper(BasePortMapper):
         c = self.__class__('')
         c.portmap = self.portmap.copy()
         c.data = self.data.copy()
+        c.use_trie = self.use_trie
         return c
 
     @classmethod
@@ -2260,6 +4008,7 @@ class PortMapper(BasePortMapper):
         r = cls('')
         r.portmap = pm.portmap.copy()
         r.data = pm.data.copy()
+        r.use_trie = pm.use_trie
         return r
         
     @property
@@ -2291,7 +4040,7 @@ class PortMapper(BasePortMapper):
 
         if self.data is None:
             raise ValueError('port mapper contains no data')
-        return self.data[np.asarray(self.sel.select(self.portmap, selector).dropna().values, dtype=np.int)]
+        return self.data[np.asarray(self._select(selector).dropna().values, dtype=np.int)]
 
     def get_by_inds(self, inds):
         """
@@ -2409,7 +4158,7 @@ class PortMapper(BasePortMapper):
         if self.data is None:
             self.data = data
         else:
-            self.data[np.asarray(self.sel.select(self.portmap, selector).dropna().values, dtype=np.int)] = data
+            self.data[np.asarray(self._select(selector).dropna().values, dtype=np.int)] = data
 
     def set_by_inds(self, inds, data):
         """
@@ -2425,6 +4174,42 @@ class PortMapper(BasePortMapper):
 
         self.data[inds] = data
 
+    def get_by_plan(self, plan, out=None):
+        """
+        Retrieve mapped data specified by a precompiled index plan.
+
+        Parameters
+        ----------
+        plan : neurokernel.plsel.IndexPlan
+            Plan containing the integer indices of data elements to return.
+        out : numpy.ndarray
+            Array in which to store the selected data. If not specified, a new
+            array is allocated.
+
+        Returns
+        -------
+        result : numpy.ndarray
+            Selected data.
+        """
+
+        if self.data is None:
+            raise ValueError('port mapper contains no data')
+        return plan.gather(self.data, out)
+
+    def set_by_plan(self, plan, data):
+        """
+        Set mapped data specified by a precompiled index plan.
+
+        Parameters
+        ----------
+        plan : neurokernel.plsel.IndexPlan
+            Plan containing the integer indices of data elements to update.
+        data : numpy.ndarray
+            Data to assign.
+        """
+
+        plan.scatter(self.data, data)
+
     __getitem__ = get
     __setitem__ = set
 
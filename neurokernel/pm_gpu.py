@@ -203,3 +203,13 @@ class GPUPortMapper(PortMapper):
             self.set_by_inds.cache[inds.dtype] = func
         func(self.data, inds, data, range=slice(0, N, 1))
     set_by_inds.cache = {}
+
+    def get_by_plan(self, plan, out=None):
+        result = self.get_by_inds(plan.inds)
+        if out is None:
+            return result
+        out[:] = result
+        return out
+
+    def set_by_plan(self, plan, data):
+        self.set_by_inds(plan.inds, data)
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
 import numpy as np
+import struct
 import sys, traceback
+import zipfile
 
 def rand_bin_matrix(sh, N, dtype=np.double):
     """
@@ -69,3 +71,72 @@ def catch_exception(func, disp, *args, **kwargs):
         disp(func.__name__ + ': ' + e.__class__.__name__ + ': ' + str(e.message) + \
            ' (' + fname + ':' + str(lineno) + ')')
              
+
+def load_npz(file_name, mmap_mode=None):
+    """
+    Load the arrays stored in an uncompressed .npz file.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of file created by `numpy.savez`.
+    mmap_mode : {None, 'r', 'r+', 'c'}
+        If not None, memory-map the arrays using the specified mode (see
+        `numpy.memmap`) rather than reading them into memory.
+
+    Returns
+    -------
+    result : dict of numpy.ndarray
+        Arrays keyed on their names.
+
+    Notes
+    -----
+    `numpy.load` ignores `mmap_mode` for .npz files; this function therefore
+    maps each array directly from its offset within the file. Arrays
+    containing Python objects cannot be memory-mapped.
+    """
+
+    if mmap_mode is None:
+        f = np.load(file_name)
+        try:
+            return {k: f[k] for k in f.files}
+        finally:
+            f.close()
+
+    result = {}
+    z = zipfile.ZipFile(file_name)
+    try:
+        with open(file_name, 'rb') as fp:
+            for info in z.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError('cannot memory-map compressed array %s' % \
+                                     info.filename)
+
+                # Skip the local file header, whose name and extra fields may
+                # differ in length from those in the central directory:
+                fp.seek(info.header_offset)
+                name_len, extra_len = struct.unpack('<HH', fp.read(30)[26:30])
+                fp.seek(info.header_offset+30+name_len+extra_len)
+                version = np.lib.format.read_magic(fp)
+                if version == (1, 0):
+                    shape, fortran, dtype = \
+                        np.lib.format.read_array_header_1_0(fp)
+                else:
+                    shape, fortran, dtype = \
+                        np.lib.format.read_array_header_2_0(fp)
+                if dtype.hasobject:
+                    raise ValueError('cannot memory-map object array %s' % \
+                                     info.filename)
+
+                name = info.filename
+                if name.endswith('.npy'):
+                    name = name[:-4]
+                if np.prod(shape) == 0:
+                    result[name] = np.empty(shape, dtype)
+                else:
+                    result[name] = np.memmap(fp, dtype, mmap_mode,
+                                             fp.tell(), shape,
+                                             'F' if fortran else 'C')
+    finally:
+        z.close()
+    return result
@@ -77,7 +77,6 @@ if __name__ == "__main__":
             'numexpr >= 2.3',
             'numpy >= 1.2.0',
             'pandas >= 0.15.0',
-            'ply >= 3.4',
             'pycuda >= 2014.1',
             'pyzmq >= 13.0',
             'scipy >= 0.11.0',
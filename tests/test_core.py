@@ -1,13 +1,19 @@
 #!/usr/bin/env python
 
+from collections import deque
 from multiprocessing import Queue
+import os
+import shutil
+import tempfile
 from unittest import main, TestCase
 
 import numpy as np
+from numpy.testing import assert_array_equal
 
 from neurokernel.plsel import Selector, SelectorMethods, PortMapper
-from neurokernel.pattern import Pattern
-from neurokernel.core import Manager, Module
+from neurokernel.pattern import Interface, Pattern
+from neurokernel.core import Manager, Module, _arena_layout, _arena_views, \
+    _arena_alloc, _arena_unpack
 from neurokernel.tools.comm import get_random_port
 from neurokernel.tools.logging import setup_logger
 
@@ -140,6 +146,72 @@ def run_test(m0_sel_in_gpot, m0_sel_in_spike,
     assert all(m0_data_gpot_after == m1_data_gpot_after)
     assert all(m0_data_spike_after == m1_data_spike_after)
 
+def make_modules(dtype_0=np.double, dtype_1=np.double, arena=False,
+                 ports=[0, 1, 2]):
+    """
+    Create two modules and a pattern that connects them in both directions.
+
+    The graded potential ports of the first module are connected to the
+    specified input ports of the second module in reverse order.
+    """
+
+    m0_sel = '/m0/out/gpot[0:3],/m0/out/spike[0:2],/m0/in/gpot[0:2]'
+    m0 = Module(m0_sel, '/m0/in/gpot[0:2]',
+                '/m0/out/gpot[0:3],/m0/out/spike[0:2]',
+                '/m0/out/gpot[0:3],/m0/in/gpot[0:2]', '/m0/out/spike[0:2]',
+                np.arange(5, dtype=dtype_0), np.array([0, 1], np.int32),
+                id='m0', arena=arena)
+    m1_sel = '/m1/in/gpot[0:3],/m1/in/spike[0:2],/m1/out/gpot[0:2]'
+    m1 = Module(m1_sel, '/m1/in/gpot[0:3],/m1/in/spike[0:2]',
+                '/m1/out/gpot[0:2]',
+                '/m1/in/gpot[0:3],/m1/out/gpot[0:2]', '/m1/in/spike[0:2]',
+                np.array([0, 0, 0, 5, 6], dtype_1), np.zeros(2, np.int32),
+                id='m1', arena=arena)
+
+    # The ports in each of the pattern's interfaces are the inverses of the
+    # corresponding module ports:
+    pat = Pattern(m0_sel, m1_sel)
+    pat.interface['/m0/out/gpot[0:3]'] = [0, 'in', 'gpot']
+    pat.interface['/m0/out/spike[0:2]'] = [0, 'in', 'spike']
+    pat.interface['/m0/in/gpot[0:2]'] = [0, 'out', 'gpot']
+    pat.interface['/m1/in/gpot[0:3]'] = [1, 'out', 'gpot']
+    pat.interface['/m1/in/spike[0:2]'] = [1, 'out', 'spike']
+    pat.interface['/m1/out/gpot[0:2]'] = [1, 'in', 'gpot']
+    for i in ports:
+        pat['/m0/out/gpot[%i]' % (2-i), '/m1/in/gpot[%i]' % i] = 1
+    for i in xrange(2):
+        pat['/m0/out/spike[%i]' % i, '/m1/in/spike[%i]' % i] = 1
+        pat['/m1/out/gpot[%i]' % i, '/m0/in/gpot[%i]' % i] = 1
+    return m0, m1, pat
+
+def make_source(ports):
+    """
+    Create a module whose graded potential ports connect to the specified
+    input ports of the second module created by `make_modules()`.
+    """
+
+    m2 = Module('/m2/out/gpot[0:3]', '', '/m2/out/gpot[0:3]',
+                '/m2/out/gpot[0:3]', '', np.zeros(3), np.zeros(0, np.int32),
+                id='m2')
+    m1_sel = '/m1/in/gpot[0:3],/m1/in/spike[0:2],/m1/out/gpot[0:2]'
+    pat = Pattern('/m2/out/gpot[0:3]', m1_sel)
+    pat.interface['/m2/out/gpot[0:3]'] = [0, 'in', 'gpot']
+    pat.interface['/m1/in/gpot[0:3]'] = [1, 'out', 'gpot']
+    pat.interface['/m1/in/spike[0:2]'] = [1, 'out', 'spike']
+    pat.interface['/m1/out/gpot[0:2]'] = [1, 'in', 'gpot']
+    for i in ports:
+        pat['/m2/out/gpot[%i]' % i, '/m1/in/gpot[%i]' % i] = 1
+    return m2, pat
+
+def transmit(src, dest):
+    """
+    Pass the data staged for transmission by one module to another module.
+    """
+
+    src._put_out_data()
+    dest._in_data = {src.id: deque([dict(src._out_data)[dest.id]])}
+    dest._get_in_data()
+
 class test_transmission(TestCase):
     def test_trans_gpot(self):
         m0_sel_in_gpot = Selector('')
@@ -180,6 +252,262 @@ class test_transmission(TestCase):
         run_test(m0_sel_in_gpot, m0_sel_in_spike, m0_sel_out_gpot, m0_sel_out_spike,
                  m1_sel_in_gpot, m1_sel_in_spike, m1_sel_out_gpot, m1_sel_out_spike)
 
+class test_connect(TestCase):
+    def test_fan_in(self):
+        m0, m1, pat = make_modules()
+        m1.connect(m0, pat, 1, 0)
+
+        # Input ports already connected to m0 can't receive input from m2:
+        for ports in [[2], [0, 1]]:
+            m2, pat_2 = make_source(ports)
+            self.assertRaises(AssertionError, m1.connect, m2, pat_2, 1, 0)
+            assert m2.id not in m1.patterns
+
+            # The pattern may connect m2 to a module without other inputs:
+            _, m1_new, _ = make_modules()
+            m1_new.connect(m2, pat_2, 1, 0)
+
+    def test_reconnect(self):
+
+        # Connect m0 to the first input port of m1:
+        m0, m1, pat = make_modules(ports=[0])
+        m1.connect(m0, pat, 1, 0)
+        m2, pat_2 = make_source([0])
+        self.assertRaises(AssertionError, m1.connect, m2, pat_2, 1, 0)
+
+        # Reconnecting m0 to the second input port frees the first one:
+        _, _, pat_0 = make_modules(ports=[1])
+        m1.connect(m0, pat_0, 1, 0)
+        assert m1.patterns[m0.id] is pat_0
+        m1.connect(m2, pat_2, 1, 0)
+        assert sorted(m1.patterns.keys()) == ['m0', 'm2']
+
+        # The input port now connected to m0 is claimed:
+        m3, pat_3 = make_source([1])
+        m3.id = 'm3'
+        self.assertRaises(AssertionError, m1.connect, m3, pat_3, 1, 0)
+
+class test_manager(TestCase):
+    def setUp(self):
+        self.man = Manager(get_random_port(), get_random_port(),
+                           get_random_port())
+
+    def tearDown(self):
+        self.man.sock_ctrl.close()
+
+    def check_linked(self, m0, m1, pat):
+        assert sorted(self.man.modules.keys()) == ['m0', 'm1']
+        assert self.man.routing_table['m0', 'm1'] == 1
+        assert self.man.routing_table['m1', 'm0'] == 1
+        assert m0.patterns['m1'] is pat and m1.patterns['m0'] is pat
+
+    def check_not_linked(self, *mods):
+        assert not self.man.modules
+        assert not self.man.routing_table.connections
+        for m in mods:
+            assert not m.patterns
+
+    def test_connect(self):
+        m0, m1, pat = make_modules()
+        self.man.connect(m0, m1, pat, 0, 1)
+        self.check_linked(m0, m1, pat)
+
+        # A connection that causes fan-in is not established:
+        m2, pat_2 = make_source([0])
+        self.assertRaises(AssertionError, self.man.connect, m2, m1, pat_2,
+                          0, 1)
+        self.check_linked(m0, m1, pat)
+        assert not m2.patterns and m2.id not in m1.patterns
+
+        # An incompatible connection is not established:
+        m0, m1, pat = make_modules()
+        self.tearDown()
+        self.setUp()
+        self.assertRaises(AssertionError, self.man.connect, m0, m1, pat, 1, 0)
+        self.check_not_linked(m0, m1)
+
+    def test_finalize_connections(self):
+        for processes in [None, 2]:
+            m0, m1, pat = make_modules()
+            self.man.connect(m0, m1, pat, 0, 1, deferred=True)
+            self.check_not_linked(m0, m1)
+            self.man.finalize_connections(processes)
+            self.check_linked(m0, m1, pat)
+            assert not self.man._deferred
+            self.tearDown()
+            self.setUp()
+
+    def test_compile_plans(self):
+
+        # Port dictionaries built from compiled link plans should be the
+        # same as those built from the patterns passed to the modules:
+        m0, m1, pat = make_modules()
+        self.man.connect(m0, m1, pat, 0, 1)
+        self.man.compile_plans()
+        assert not m0.patterns and not m1.patterns
+        m0_pat, m1_pat, pat = make_modules()
+        m0_pat.connect(m1_pat, pat, 0, 1)
+        m1_pat.connect(m0_pat, pat, 1, 0)
+        for m, m_pat in [(m0, m0_pat), (m1, m1_pat)]:
+            m._init_port_dicts()
+            m_pat._init_port_dicts()
+            assert m_pat._link_plans is not None
+            for t in ['gpot', 'spike']:
+                for d in ['_out_port_dict', '_in_port_dict']:
+                    ports, ports_pat = getattr(m, d)[t], getattr(m_pat, d)[t]
+                    assert ports == ports_pat
+                    inds = getattr(m, d+'_ids')[t]
+                    inds_pat = getattr(m_pat, d+'_ids')[t]
+                    assert sorted(inds.keys()) == sorted(inds_pat.keys())
+                    for k in inds:
+                        assert_array_equal(inds[k], inds_pat[k])
+        assert m0._out_port_dict['gpot']['m1'] == \
+            [('m0', 'out', 'gpot', i) for i in [0, 1, 2]]
+        assert m1._in_port_dict['gpot']['m0'] == \
+            [('m1', 'in', 'gpot', i) for i in [2, 1, 0]]
+        assert m1._in_port_dict['spike']['m0'] == \
+            [('m1', 'in', 'spike', i) for i in [0, 1]]
+
+        # Both sets of modules should transmit the same data:
+        for src, dest in [(m0, m1), (m1, m0), (m0_pat, m1_pat),
+                          (m1_pat, m0_pat)]:
+            transmit(src, dest)
+        for m, m_pat in [(m0, m0_pat), (m1, m1_pat)]:
+            for t in ['gpot', 'spike']:
+                assert_array_equal(m.pm[t].data, m_pat.pm[t].data)
+        assert_array_equal(m1_pat.pm['gpot']['/m1/in/gpot[0:3]'], [2, 1, 0])
+        assert_array_equal(m0_pat.pm['gpot']['/m0/in/gpot[0:2]'], [5, 6])
+
+    def test_finalize_connections_invalid(self):
+        for processes in [None, 2]:
+
+            # None of the connections is established if any of them is
+            # invalid, even if the invalid one is registered last:
+            m0, m1, pat = make_modules()
+            m2, pat_2 = make_source([0])
+            self.man.connect(m0, m1, pat, 0, 1, deferred=True)
+            self.man.connect(m1, m2, pat_2, 0, 1, deferred=True)
+            self.assertRaises(AssertionError,
+                              self.man.finalize_connections, processes)
+            self.check_not_linked(m0, m1, m2)
+            assert len(self.man._deferred) == 2
+            self.tearDown()
+            self.setUp()
+
+    def test_finalize_connections_fan_in(self):
+        for processes in [None, 2]:
+
+            # Connections that are valid by themselves but cause fan-in when
+            # established together are rejected before any is established:
+            m0, m1, pat = make_modules()
+            m2, pat_2 = make_source([0])
+            self.man.connect(m0, m1, pat, 0, 1, deferred=True)
+            self.man.connect(m2, m1, pat_2, 0, 1, deferred=True)
+            self.assertRaises(AssertionError,
+                              self.man.finalize_connections, processes)
+            self.check_not_linked(m0, m1, m2)
+            assert not m1._claimed_in_ports
+            assert len(self.man._deferred) == 2
+
+            # Connections whose input ports don't overlap are established:
+            self.man._deferred = []
+            m0, m1, pat = make_modules(ports=[1, 2])
+            self.man.connect(m0, m1, pat, 0, 1, deferred=True)
+            self.man.connect(m2, m1, pat_2, 0, 1, deferred=True)
+            self.man.finalize_connections(processes)
+            assert sorted(m1.patterns.keys()) == ['m0', 'm2']
+            assert self.man.routing_table['m2', 'm1'] == 1
+            assert not self.man._deferred
+            self.tearDown()
+            self.setUp()
+
+    def test_cache(self):
+        d = tempfile.mkdtemp()
+        try:
+            m0, m1, pat = make_modules()
+            man = Manager(get_random_port(), get_random_port(),
+                          get_random_port(), cache_dir=d)
+            man.connect(m0, m1, pat, 0, 1)
+            man.compile_plans()
+            man.sock_ctrl.close()
+            assert sorted(f.split('-')[0] for f in os.listdir(d)) == \
+                ['check']+['link']*4
+
+            # A manager sharing the cache directory should neither validate
+            # the connection nor compute the link plans again:
+            def fail(*args, **kwargs):
+                raise AssertionError('cache miss')
+            saved = [(Interface, 'is_compatible'),
+                     (Interface, 'get_common_ports'), (Module, '_link_inds')]
+            saved = [(c, name, c.__dict__.get(name)) for c, name in saved]
+            m0_new, m1_new, pat_new = make_modules()
+            man = Manager(get_random_port(), get_random_port(),
+                          get_random_port(), cache_dir=d)
+            try:
+                for c, name, _ in saved:
+                    setattr(c, name, fail)
+                man.connect(m0_new, m1_new, pat_new, 0, 1)
+                man.compile_plans()
+            finally:
+                for c, name, f in saved:
+                    if f is None:
+                        delattr(c, name)
+                    else:
+                        setattr(c, name, f)
+                man.sock_ctrl.close()
+            for m, m_new in [(m0, m0_new), (m1, m1_new)]:
+                assert len(m_new._link_plans) == len(m._link_plans)
+                key = lambda plan: plan[:3]
+                for plan, plan_new in zip(sorted(m._link_plans, key=key),
+                                          sorted(m_new._link_plans, key=key)):
+                    assert plan_new[:3] == plan[:3]
+                    assert_array_equal(plan_new.src_idx, plan.src_idx)
+                    assert_array_equal(plan_new.dest_idx, plan.dest_idx)
+            pm, pm_new = pat.interface.pm['spike'], pat_new.interface.pm['spike']
+            assert pm_new.index.tolist() == pm.index.tolist()
+            assert_array_equal(pm_new.portmap, pm.portmap)
+        finally:
+            shutil.rmtree(d)
+
+class test_arena(TestCase):
+    def test_arena_views(self):
+        sizes = [3, 2]
+        dtypes = [np.float64, np.int32]
+        offsets, nbytes = _arena_layout(sizes, dtypes)
+        assert offsets == [0, 24]
+        assert nbytes == 32
+        buf = np.zeros(nbytes, np.uint8)
+        gpot, spike = _arena_views(buf, sizes, dtypes)
+        gpot[:] = [1.0, 2.0, 3.0]
+        spike[:] = [0, 1]
+        assert buf.view(np.float64)[1] == 2.0
+        assert buf[24:].view(np.int32)[1] == 1
+
+        # Offsets must be aligned to the element size:
+        assert _arena_layout([1, 1], [np.int8, np.float64]) == ([0, 8], 16)
+
+    def test_arena_alloc_unpack(self):
+        buf, (gpot, spike) = _arena_alloc([3, 2], [np.float32, np.int64])
+        gpot[:] = [1.5, 2.0, 3.0]
+        spike[:] = [0, 1]
+        gpot, spike = _arena_unpack(np.frombuffer(buf.tobytes(), np.uint8))
+        assert gpot.dtype == np.float32 and spike.dtype == np.int64
+        assert_array_equal(gpot, [1.5, 2.0, 3.0])
+        assert_array_equal(spike, [0, 1])
+
+    def test_arena_dtypes(self):
+        for dtype_0, dtype_1 in [(np.float32, np.float64),
+                                 (np.int64, np.float64)]:
+            m0, m1, pat = make_modules(dtype_0, dtype_1, True)
+            m0.connect(m1, pat, 0, 1)
+            m1.connect(m0, pat, 1, 0)
+            m0._init_port_dicts()
+            m1._init_port_dicts()
+            transmit(m0, m1)
+            assert m1.pm['gpot'].dtype == dtype_1
+            assert_array_equal(m1.pm['gpot']['/m1/in/gpot[0:3]'], [2, 1, 0])
+            assert_array_equal(m1.pm['spike']['/m1/in/spike[0:2]'], [0, 1])
+
 
 if __name__ == '__main__':
     main()
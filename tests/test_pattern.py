@@ -1,14 +1,21 @@
 #!/usr/bin/env python
 
+import os
+import pickle
+import shutil
+import tempfile
 from unittest import main, TestCase
 
 import numpy as np
 import pandas as pd
 import networkx as nx
+from numpy.testing import assert_array_equal
 from pandas.util.testing import assert_frame_equal, assert_index_equal, \
     assert_series_equal
 
-from neurokernel.pattern import Interface, Pattern
+from neurokernel.plsel import SelectorMethods
+from neurokernel.pattern import Interface, Pattern, SparsePattern, \
+    content_hash
 
 class test_interface(TestCase):
     def setUp(self):
@@ -87,6 +94,82 @@ class test_interface(TestCase):
                               [('foo', 3), ('foo', 4)])
 
 
+    def test_port_class_cache_data_modified(self):
+        i = Interface('/foo[0:4]')
+        i['/foo[0:4]'] = [0, 'in', 'gpot']
+        assert i.in_ports(tuples=True) == [('foo', k) for k in xrange(4)]
+
+        # Cached masks must be updated when the data are modified directly:
+        i.data['io'] = 'out'
+        assert i.in_ports(tuples=True) == []
+        assert i.out_ports(0, tuples=True) == [('foo', k) for k in xrange(4)]
+        i.data['io'].values[0] = 'in'
+        assert i.in_ports(tuples=True) == [('foo', 0)]
+        i.data['interface'].values[1] = 1
+        assert i.out_ports(0, tuples=True) == [('foo', 2), ('foo', 3)]
+
+    def test_port_class_cache(self):
+        i = Interface('/foo[0:4]')
+        i['/foo[0:2]'] = [0, 'in', 'gpot']
+        i['/foo[2:4]'] = [1, 'out', 'spike']
+        assert i.in_ports(tuples=True) == [('foo', 0), ('foo', 1)]
+        assert i.spike_ports(1, tuples=True) == [('foo', 2), ('foo', 3)]
+
+        # Cached masks must be updated when the interface is modified:
+        i['/foo[1]', 'io', 'type'] = ['out', 'spike']
+        assert i.in_ports(tuples=True) == [('foo', 0)]
+        assert i.spike_ports(tuples=True) == [('foo', 1), ('foo', 2), ('foo', 3)]
+        assert i.spike_ports(1, tuples=True) == [('foo', 2), ('foo', 3)]
+
+        # Chained queries:
+        j = i.out_ports().spike_ports(0)
+        assert j.num_levels == 2
+        assert j.to_tuples() == [('foo', 1)]
+        assert i.in_ports().spike_ports().to_tuples() == []
+
+        # Modifying a restricted interface must not affect the original:
+        j['/foo[1]', 'type'] = 'gpot'
+        assert i.spike_ports(0, tuples=True) == [('foo', 1)]
+
+    def test_port_ids(self):
+        i = Interface('/foo[0:3],/bar')
+        i['/foo[0:2]', 'interface'] = 0
+        i['/foo[2],/bar', 'interface'] = 1
+        j = Interface('/bar,/foo[0:3]')
+        j['/*', 'interface'] = 0
+        ids = i.port_ids()
+        assert len(set(ids)) == 4
+        assert_array_equal(i.port_ids(1), ids[2:])
+        assert_array_equal(j.port_ids(), ids[[3, 0, 1, 2]])
+
+        # Cached IDs must be recomputed when the index changes:
+        i.data = i.data.iloc[::-1]
+        assert_array_equal(i.port_ids(), ids[::-1])
+
+    def test_select_port_ids(self):
+        i = Interface('/foo[0:3],/bar')
+        i['/foo[0:2]', 'interface', 'type'] = [0, 'spike']
+        i['/foo[2],/bar', 'interface', 'type'] = [1, 'gpot']
+        i['/foo[1]', 'type'] = 'gpot'
+        ids = i.port_ids()
+        assert_array_equal(i.select_port_ids(0), ids[:2])
+        assert_array_equal(i.select_port_ids(0, 'gpot'), ids[[1]])
+        assert_array_equal(i.select_port_ids(1, ports='/bar,/foo[0]'),
+                           ids[[3]])
+        assert len(i.select_port_ids(1, 'spike')) == 0
+
+    def test_use_trie(self):
+        i = Interface('/foo[0:3],/bar')
+        i.use_trie = True
+        i['/foo[0:2]', 'interface'] = 0
+        i['/foo[2],/bar', 'interface'] = 1
+        assert_frame_equal(i['/foo[1:]'], i.data.iloc[[1, 2]])
+        assert_frame_equal(i['/bar', 'interface'], i.data.iloc[[3]][['interface']])
+
+        # The prefix tree must be rebuilt when the index changes:
+        i.data = i.data.iloc[::-1]
+        assert_frame_equal(i['/foo[1:]'], i.data.iloc[[1, 2]])
+
     def test_get_common_ports_unequal_num_levels(self):
         # Without type, some with only one level:
         i = Interface('/foo[0:6],/bar')
@@ -149,6 +232,32 @@ class test_interface(TestCase):
                                   '/bar',
                                   '/baz'])
 
+    def test_save_load(self):
+        i = Interface('/foo[0:3],/bar')
+        i['/foo[0:2]'] = [0, 'in', 'gpot']
+        i['/foo[2]', 'interface', 'type'] = [1, 'spike']
+        d = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(d, 'i.npz')
+            i.save(file_name)
+            for mmap_mode in [None, 'r']:
+                j = Interface.load(file_name, mmap_mode)
+                assert_frame_equal(i.data, j.data)
+                assert i.num_levels == j.num_levels
+        finally:
+            shutil.rmtree(d)
+
+    def test_pickle(self):
+        i = Interface('/foo[0:3],/bar')
+        i['/foo[0:2]'] = [0, 'in', 'gpot']
+        i['/foo[2]', 'interface', 'type'] = [1, 'spike']
+        i.in_ports(0)
+        j = pickle.loads(pickle.dumps(i, pickle.HIGHEST_PROTOCOL))
+        assert '_mask_cache' not in j.__dict__
+        assert_frame_equal(i.data, j.data)
+        self.assertSequenceEqual(j.in_ports(0).to_tuples(),
+                                 [('foo', 0), ('foo', 1)])
+
     def test_to_tuples_multi_levels(self):
         i = Interface('/foo[0:4]')
         i['/foo[0:2]', 'interface'] = 0
@@ -576,6 +685,22 @@ class test_interface(TestCase):
         assert i.is_compatible(0, j, 1, True)
         assert i.is_compatible(0, k, 1, True) == False
 
+    def test_is_compatible_diff_levels(self):
+        """
+        Identifiers in interfaces whose indices have different numbers of
+        levels are matched regardless of padding.
+        """
+
+        i = Interface('/foo[0:2],/bar')
+        i['/foo[0:2],/bar'] = [0, 'out', 'gpot']
+        j = Interface('/foo[0:2],/bar')
+        j['/foo[0:2],/bar'] = [1, 'in', 'gpot']
+        k = Interface('/foo[0:2],/bar,/baz[0]')
+        k['/foo[0:2],/bar,/baz[0]'] = [1, 'in', 'gpot']
+        assert i.is_compatible(0, j, 1)
+        assert i.is_compatible(0, k, 1) == False
+        assert i.is_compatible(0, k, 1, True)
+
     def test_which_int_unset(self):
         i = Interface('/foo[0:4]')
         assert i.which_int('/foo[0:2]') == set()
@@ -630,6 +755,50 @@ class test_pattern(TestCase):
         p.interface['/bar[3:5]', 'type'] = 'gpot'
         assert_frame_equal(p.interface.data, self.df_i)
 
+    def test_connect_many(self):
+        p = Pattern('/foo[0:5]', '/bar[0:5]')
+        p.connect_many(['/foo[0]', '/foo[1]', ('foo', 1)],
+                       ['/bar[0]', '/bar[1]', ('bar', 2)], 1)
+        p.connect_many(['/bar[3]', '/bar[3]', '/bar[4]'],
+                       ['/foo[2]', '/foo[3]', '/foo[4]'], {'conn': 1})
+        assert_frame_equal(p.data, self.df_p)
+        p.interface['/foo[0:2]', 'type'] = 'spike'
+        p.interface['/bar[0:2]', 'type'] = 'spike'
+        p.interface['/foo[2:5]', 'type'] = 'gpot'
+        p.interface['/bar[3:5]', 'type'] = 'gpot'
+        assert_frame_equal(p.interface.data, self.df_i)
+
+        # Existing connections are updated:
+        p.connect_many(['/foo[0]'], ['/bar[0]'], 2)
+        assert p.data['conn'][('foo', 0, 'bar', 0)] == 2
+        assert len(p.data) == 6
+
+        # Invalid connections are rejected:
+        self.assertRaises(ValueError, p.connect_many, ['/foo[0]'], ['/foo[1]'])
+        self.assertRaises(ValueError, p.connect_many, ['/foo[2]'], ['/bar[0]'])
+        self.assertRaises(ValueError, p.connect_many, ['/foo[0:2]'], ['/bar[2]'])
+        self.assertRaises(ValueError, p.connect_many, ['/foo[9]'], ['/bar[2]'])
+
+    def test_from_arrays(self):
+        p = Pattern.from_arrays(['/foo[0]', '/foo[1]', '/foo[1]'],
+                                ['/bar[0]', '/bar[1]', '/bar[2]'])
+        q = Pattern('/foo[0:2]', '/bar[0:3]')
+        q['/foo[0]', '/bar[0]'] = 1
+        q['/foo[1]', '/bar[1:3]'] = 1
+        assert_frame_equal(p.data, q.data)
+        assert_frame_equal(p.interface.data, q.interface.data)
+
+    def test_from_arrays_parse_cache(self):
+        # The selectors that list all ports passed to from_arrays() shouldn't
+        # be retained by the parser cache:
+        SelectorMethods.cache_clear()
+        N = 5000
+        p = Pattern.from_arrays(['/foo[%i]' % i for i in xrange(N)],
+                                ['/bar[%i]' % i for i in xrange(N)])
+        assert len(p) == N
+        assert all([len(k) <= SelectorMethods._parse_cache_max_len \
+                    for k in SelectorMethods._parse_cache._data])
+
     def test_create_dup_identifiers(self):
         self.assertRaises(Exception,  Pattern,
                           '/foo[0],/foo[0]', '/bar[0:2]')
@@ -676,6 +845,20 @@ class test_pattern(TestCase):
                               [('aaa',),
                                ('bbb',)])
 
+    def test_src_idx_order(self):
+        p = Pattern('/[aaa,bbb][0:3]', '/[xxx,yyy][0:3]')
+        p['/aaa[2]', '/yyy[0]'] = 1
+        p['/aaa[0]', '/yyy[1]'] = 1
+        p['/aaa[2]', '/yyy[2]'] = 1
+        p['/xxx[0]', '/bbb[1]'] = 1
+        assert p.src_idx(0, 1) == [('aaa', 0), ('aaa', 2)]
+        assert p.dest_idx(0, 1) == [('yyy', 1), ('yyy', 0), ('yyy', 2)]
+
+        # Results must reflect connections added after a previous query:
+        p['/aaa[1]', '/xxx[2]'] = 1
+        assert p.src_idx(0, 1) == [('aaa', 0), ('aaa', 1), ('aaa', 2)]
+        assert p.src_idx(1, 0) == [('xxx', 0)]
+
     def test_src_idx_dest_ports(self):
         p = Pattern('/[aaa,bbb][0:3]', '/[xxx,yyy][0:3]')
         p['/aaa[0]', '/yyy[0]'] = 1
@@ -881,6 +1064,40 @@ class test_pattern(TestCase):
         assert p.is_connected(0, 1) == True
         assert p.is_connected(1, 0) == True
 
+    def test_is_connected_modified(self):
+        p = Pattern('/aaa[0:3]', '/bbb[0:3]')
+        p['/aaa[0]', '/bbb[2]'] = 1
+        assert p.is_connected(0, 1) == True
+
+        # Cached results must be updated when connections change in place:
+        p['/aaa[0]', '/bbb[2]'] = 0
+        assert p.is_connected(0, 1) == False
+        p['/bbb[0]', '/aaa[1]'] = 1
+        assert p.is_connected(1, 0) == True
+
+        # ... or when the interfaces change:
+        p.interface['/bbb[0]', 'interface'] = 2
+        assert p.is_connected(1, 0) == False
+        assert p.is_connected(2, 0) == True
+
+    def test_is_connected_data_modified(self):
+        p = Pattern('/aaa[0:3]', '/bbb[0:3]')
+        p['/aaa[0]', '/bbb[2]'] = 1
+        assert p.is_connected(0, 1) == True
+
+        # Cached results must be updated when the data are modified directly:
+        p.data['conn'] = 0
+        assert p.is_connected(0, 1) == False
+        p.data['conn'].values[0] = 1
+        assert p.is_connected(0, 1) == True
+        p.interface.data['interface'] = \
+            p.interface.data['interface'].replace(1, 2)
+        assert p.is_connected(0, 2) == True
+        i = p.interface.data.index.get_loc(('bbb', 2))
+        p.interface.data['interface'].values[i] = 3
+        assert p.is_connected(0, 2) == False
+        assert p.is_connected(0, 3) == True
+
     def test_is_connected_multi_level(self):
         
         # No connections:
@@ -980,6 +1197,91 @@ class test_pattern(TestCase):
         assert_frame_equal(p.data, q.data)
         assert_frame_equal(p.interface.data, q.interface.data)
 
+    def test_read_csv(self):
+        p = Pattern('/aaa[0:3],/ccc', '/bbb[0:3]')
+        p['/aaa[0]', '/bbb[2]'] = 1
+        p['/bbb[1]', '/aaa[2]'] = 1
+        p['/ccc', '/bbb[0]'] = 1
+        d = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(d, 'p.csv')
+            p.data.to_csv(file_name, header=False)
+            q = Pattern('/aaa[0:3],/ccc', '/bbb[0:3]')
+            q.read_csv(file_name, chunksize=2)
+            assert_frame_equal(p.data, q.data)
+            assert_frame_equal(p.interface.data, q.interface.data)
+
+            # Rows containing ports not in the pattern's interfaces must be
+            # rejected:
+            with open(file_name, 'a') as f:
+                f.write('ddd,,bbb,1,1\n')
+            q = Pattern('/aaa[0:3],/ccc', '/bbb[0:3]')
+            self.assertRaises(ValueError, q.read_csv, file_name, chunksize=2)
+        finally:
+            shutil.rmtree(d)
+
+    def test_read_csv_many_levels(self):
+        # The product of the numbers of tokens in all but the first level of
+        # the interface's index is 2**64, so ports that only differ in their
+        # first token would get the same key if it were computed from all of
+        # the levels at once:
+        make = lambda c, i: '/'+c+''.join(['/t%i_%i' % (k, i) for k in xrange(8)])
+        src = [make('x', i) for i in xrange(256)]
+        dest = [make('y', i) for i in xrange(256)]
+        p = Pattern(','.join(src), ','.join(dest))
+        p.connect_many(src, dest[::-1])
+        d = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(d, 'p.csv')
+            p.data.to_csv(file_name, header=False)
+            q = Pattern(','.join(src), ','.join(dest))
+            q.read_csv(file_name, chunksize=100)
+            assert_frame_equal(p.data, q.data)
+        finally:
+            shutil.rmtree(d)
+
+    def test_save_load(self):
+        p = Pattern('/aaa[0:3],/ccc', '/bbb[0:3]', columns=['conn', 'weight'])
+        p['/aaa[0]', '/bbb[2]'] = [1, 0.5]
+        p['/bbb[1]', '/aaa[2]'] = [1, 2.0]
+        p['/ccc', '/bbb[0]', 'conn'] = 1
+        p.interface['/aaa[0:3]', 'type'] = 'spike'
+        d = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(d, 'p.npz')
+            p.save(file_name)
+            for mmap_mode in [None, 'r']:
+                q = Pattern.load(file_name, mmap_mode)
+                assert_frame_equal(p.data, q.data)
+                assert_frame_equal(p.interface.data, q.interface.data)
+                assert p.num_levels == q.num_levels
+                assert q.src_idx(0, 1) == p.src_idx(0, 1)
+
+            # Empty pattern:
+            p = Pattern('/aaa[0:3]', '/bbb[0:3]')
+            p.save(file_name)
+            q = Pattern.load(file_name)
+            assert_frame_equal(p.data, q.data)
+            assert_frame_equal(p.interface.data, q.interface.data)
+        finally:
+            shutil.rmtree(d)
+
+    def test_content_hash(self):
+        def make():
+            p = Pattern('/aaa[0:3]', '/bbb[0:3]')
+            p['/aaa[0]', '/bbb[2]'] = 1
+            p['/bbb[1]', '/aaa[2]'] = 1
+            return p
+        p, q = make(), make()
+        assert content_hash(p) == content_hash(q)
+        assert content_hash(p.interface, 0) == content_hash(q.interface, 0)
+        assert content_hash(p.interface, 0) != content_hash(q.interface, 1)
+        q['/aaa[1]', '/bbb[0]'] = 1
+        assert content_hash(p) != content_hash(q)
+        q = make()
+        q.interface['/aaa[0]', 'type'] = 'spike'
+        assert content_hash(p) != content_hash(q)
+
     def test_to_graph(self):
         p = Pattern('/foo[0:4]', '/bar[0:4]')
         p['/foo[0]', '/bar[0]'] = 1
@@ -1120,5 +1422,84 @@ class test_pattern(TestCase):
                           dtype=object)
         assert_frame_equal(p[[('aaa', 0)], [('bbb', 0)]], df)
 
+class test_sparse_pattern(TestCase):
+    def setUp(self):
+        self.p = Pattern('/aaa[0:3]', '/bbb[0:3]')
+        self.p['/aaa[0]', '/bbb[2]'] = 1
+        self.p['/aaa[1]', '/bbb[0]'] = 1
+        self.p['/bbb[1]', '/aaa[2]'] = 1
+        self.p.interface['/aaa[0:2]', 'type'] = 'spike'
+        self.p.interface['/bbb[0]', 'type'] = 'spike'
+        self.p.interface['/aaa[2]', 'type'] = 'gpot'
+        self.p.interface['/bbb[1:]', 'type'] = 'gpot'
+
+        self.sp = SparsePattern('/aaa[0:3]', '/bbb[0:3]')
+        self.sp['/bbb[1]', '/aaa[2]'] = 1
+        self.sp['/aaa[1]', '/bbb[0]'] = 1
+        self.sp['/aaa[0]', '/bbb[2]'] = 1
+        self.sp.interface['/aaa[0:2]', 'type'] = 'spike'
+        self.sp.interface['/bbb[0]', 'type'] = 'spike'
+        self.sp.interface['/aaa[2]', 'type'] = 'gpot'
+        self.sp.interface['/bbb[1:]', 'type'] = 'gpot'
+
+    def test_create(self):
+        assert len(self.sp) == 3
+        assert self.sp.columns == ['conn']
+        assert self.sp.interface_ids == set([0, 1])
+
+    def test_to_pattern(self):
+        assert_frame_equal(self.sp.to_pattern().data, self.p.data)
+
+    def test_from_pattern(self):
+        sp = SparsePattern.from_pattern(self.p)
+        assert_frame_equal(sp.to_pattern().data, self.p.data)
+        assert_array_equal(sp.src, self.sp.src)
+        assert_array_equal(sp.dest, self.sp.dest)
+
+    def test_from_arrays(self):
+        sp = SparsePattern.from_arrays(['/aaa[0]', '/aaa[1]', '/bbb[1]'],
+                                       ['/bbb[2]', '/bbb[0]', '/aaa[2]'],
+                                       sel0='/aaa[0:3]', sel1='/bbb[0:3]')
+        assert_frame_equal(sp.to_pattern().data, self.p.data)
+
+    def test_read_csv(self):
+        d = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(d, 'p.csv')
+            self.p.data.to_csv(file_name, header=False)
+            sp = SparsePattern('/aaa[0:3]', '/bbb[0:3]')
+            sp.read_csv(file_name, chunksize=2)
+            assert_frame_equal(sp.to_pattern().data, self.p.data)
+        finally:
+            shutil.rmtree(d)
+
+    def test_connect_many_invalid(self):
+        sp = SparsePattern('/aaa[0:3]', '/bbb[0:3]')
+        self.assertRaises(ValueError, sp.connect_many,
+                          ['/aaa[0]', '/aaa[1]'], ['/bbb[0]', '/bbb[0]'])
+        self.assertRaises(ValueError, sp.connect_many,
+                          ['/aaa[0]'], ['/aaa[1]'])
+
+    def test_src_dest_idx(self):
+        for args in [(0, 1), (1, 0), (0, 1, 'spike', 'spike'),
+                     (1, 0, 'gpot', 'gpot'), (0, 1, None, 'gpot')]:
+            assert self.sp.src_idx(*args) == self.p.src_idx(*args)
+            assert self.sp.dest_idx(*args) == self.p.dest_idx(*args)
+
+    def test_is_connected(self):
+        assert self.sp.is_connected(0, 1) == self.p.is_connected(0, 1)
+        assert self.sp.is_connected(1, 0) == self.p.is_connected(1, 0)
+
+    def test_connected_ports(self):
+        for i in [None, 0, 1]:
+            assert self.sp.connected_ports(i, True) == \
+                self.p.connected_ports(i, True)
+
+    def test_to_graph(self):
+        g = self.sp.to_graph()
+        h = self.p.to_graph()
+        assert sorted(g.nodes(data=True)) == sorted(h.nodes(data=True))
+        assert sorted(g.edges(data=True)) == sorted(h.edges(data=True))
+
 if __name__ == '__main__':
     main()
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 
+import pickle
+import subprocess
+import sys
 from unittest import main, TestCase
 
 import numpy as np
@@ -8,7 +11,8 @@ from numpy.testing import assert_array_equal
 from pandas.util.testing import assert_frame_equal, assert_index_equal, \
     assert_series_equal
 
-from neurokernel.plsel import Selector, SelectorMethods, BasePortMapper, PortMapper
+from neurokernel.plsel import Selector, SelectorMethods, BasePortMapper, PortMapper, \
+    LRUCache, ParsedSelector, PortIdTable, PortTrie, ArrayPortMapper, IndexPlan
 
 df = pd.DataFrame(data={'data': np.random.rand(10),
                   0: ['foo', 'foo', 'foo', 'foo', 'foo',
@@ -50,6 +54,137 @@ df_single = pd.DataFrame(data={'data': np.random.rand(5),
     0: ['foo', 'foo', 'bar', 'bar', 'baz']})
 df_single.set_index(0, append=False, inplace=True)
 
+class test_import(TestCase):
+    def test_import_time(self):
+        # Exclude time required to import third-party dependencies:
+        code = 'import sys, time; import numpy, pandas, msgpack; ' \
+               't = time.time(); import neurokernel.plsel; ' \
+               'print(time.time()-t); print(\'ply\' in sys.modules)'
+        out = subprocess.check_output([sys.executable, '-c', code]).split()
+        assert float(out[0]) < 1.0
+        assert out[1] == 'False'
+
+class test_lru_cache(TestCase):
+    def test_get_set(self):
+        c = LRUCache(2)
+        c['a'] = 1
+        assert c.get('a') == 1
+        assert c.get('b') is None
+        assert c.info() == {'hits': 1, 'misses': 1, 'maxsize': 2, 'currsize': 1}
+
+    def test_eviction(self):
+        c = LRUCache(2)
+        c['a'] = 1
+        c['b'] = 2
+        c.get('a')
+        c['c'] = 3
+        assert 'a' in c
+        assert 'b' not in c
+        assert 'c' in c
+        assert len(c) == 2
+
+    def test_clear(self):
+        c = LRUCache(2)
+        c['a'] = 1
+        c.get('a')
+        c.clear()
+        assert len(c) == 0
+        assert c.info() == {'hits': 0, 'misses': 0, 'maxsize': 2, 'currsize': 0}
+
+class test_port_id_table(TestCase):
+    def test_intern(self):
+        t = PortIdTable()
+        assert t.intern(('foo', 0)) == 0
+        assert t.intern(('foo', 1)) == 1
+        assert t.intern(('foo', 0, '')) == 0
+        assert len(t) == 2
+        assert ('foo', 1, '') in t
+        assert ('foo', 2) not in t
+        assert t.lookup(1) == ('foo', 1)
+
+    def test_intern_many(self):
+        t = PortIdTable()
+        assert_array_equal(t.intern_many([('a',), ('b', 0), ('a', '')]),
+                           [0, 1, 0])
+        assert_array_equal(t.get_many([('b', 0), ('c',)]), [1, -1])
+        assert t.lookup_many([1, 0]) == [('b', 0), ('a',)]
+
+    def test_index_ids(self):
+        t = PortIdTable()
+        idx = pd.MultiIndex.from_tuples([('a', 0), ('a', 1), ('b', '')])
+        assert_array_equal(t.index_ids(idx), [0, 1, 2])
+        assert_array_equal(t.index_ids(pd.Index(['b', 'c'])), [2, 3])
+
+class test_index_plan(TestCase):
+    def test_gather_scatter(self):
+        src = np.random.rand(20)
+        for inds in [[], [3], [2, 3, 4, 9, 10], [5, 4, 3], range(0, 20, 2)]:
+            plan = IndexPlan(inds)
+            assert_array_equal(plan.gather(src), src[inds])
+            out = np.empty(len(inds))
+            assert plan.gather(src, out) is out
+            assert_array_equal(out, src[inds])
+
+            dest = np.zeros(20)
+            expected = np.zeros(20)
+            plan.scatter(dest, src[:len(inds)])
+            expected[inds] = src[:len(inds)]
+            assert_array_equal(dest, expected)
+
+    def test_runs(self):
+        assert len(IndexPlan([2, 3, 4, 9, 10]).slices) == 2
+        assert IndexPlan(range(0, 20, 2)).slices is None
+
+class test_parsed_selector(TestCase):
+    def test_create(self):
+        p = ParsedSelector('/foo/bar[0:2],/baz')
+        assert p.source == '/foo/bar[0:2],/baz'
+        assert p.tokens == (('foo', 'bar', slice(0, 2)), ('baz',))
+        assert p.max_levels == 3
+        assert not p.ambiguous
+        assert ParsedSelector('/foo/*').ambiguous
+        assert p == ParsedSelector(p)
+        self.assertRaises(Exception, ParsedSelector, '/foo[')
+
+    def test_parse(self):
+        p = ParsedSelector('/foo/bar[0:2],/baz')
+        result = p.parse(3)
+        assert result == [['foo', 'bar', slice(0, 2)], ['baz', '', '']]
+        result[0].append('qux')
+        assert p.parse() == [['foo', 'bar', slice(0, 2)], ['baz']]
+
+    def test_methods(self):
+        p = ParsedSelector('/foo/bar[0:2]')
+        sel = SelectorMethods()
+        assert sel.is_selector(p)
+        assert not sel.is_ambiguous(p)
+        assert sel.max_levels(p) == 3
+        assert sel.expand(p) == sel.expand('/foo/bar[0:2]')
+        assert Selector(p).expanded == (('foo', 'bar', 0), ('foo', 'bar', 1))
+        assert_index_equal(sel.make_index(p), sel.make_index('/foo/bar[0:2]'))
+        assert_frame_equal(sel.select(df, ParsedSelector('/foo/*/0')),
+                           sel.select(df, '/foo/*/0'))
+
+    def test_invalid(self):
+        sel = SelectorMethods()
+        for s in ['/foo[', '[1:].+/*']:
+            self.assertRaises(AssertionError, sel.expand, s)
+            self.assertRaises(AssertionError, sel.is_expandable, s)
+            self.assertRaises(AssertionError, sel.make_index, s)
+            self.assertRaises(AssertionError, sel.get_index, df, s)
+            self.assertRaises(AssertionError, sel.select, df, s)
+            self.assertRaises(AssertionError, Selector, s)
+        self.assertRaises(AssertionError, sel.expand, '/foo[:]')
+        self.assertRaises(AssertionError, sel.make_index, '/foo/*')
+
+    def test_parse_once(self):
+        sel = SelectorMethods()
+        sel.cache_clear()
+        sel.make_index('/foo/bar[0:2]')
+        info = sel.cache_info()['parse']
+        assert info['misses'] == 1
+        assert info['hits'] == 0
+
 class test_selector_class(TestCase):
     def test_selector_add_empty(self):
         s = Selector('')+Selector('')
@@ -126,6 +261,29 @@ class test_selector_class(TestCase):
         self.assertSequenceEqual([s for s in sel],
                                  [((),)])
 
+    def test_selector_large(self):
+        sel = Selector('/x[0:1000000]')
+        assert len(sel) == 1000000
+        assert sel.max_levels == 2
+        assert ('x', 999999) in sel
+        assert ('x', 1000000) not in sel
+        assert ('y', 0) not in sel
+
+    def test_selector_expanded_chunks(self):
+        sel = Selector('/x[0:5]')
+        self.assertSequenceEqual(list(sel.expanded_chunks(2)),
+                                 [(('x', 0), ('x', 1)),
+                                  (('x', 2), ('x', 3)),
+                                  (('x', 4),)])
+        self.assertSequenceEqual(list(Selector('').expanded_chunks(2)), [])
+
+    def test_selector_contains(self):
+        sel = Selector('/x[0:2],/y/[a,b]')
+        assert ('x', 1) in sel
+        assert ('y', 'b') in sel
+        assert ('x', 2) not in sel
+        assert ('y',) not in sel
+
     def test_selector_union_empty(self):
         a = Selector('')
         b = Selector('')
@@ -142,7 +300,14 @@ class test_selector_class(TestCase):
         assert len(c) == 5
         assert c.expanded == (('x', 0), ('x', 1), ('x', 2), ('x', 3), ('x', 4))
         assert c.max_levels == 2
-        assert c.str == '/x/0,/x/1,/x/2,/x/3,/x/4'
+        assert c.str == '/x[0:5]'
+
+        a = Selector('/x[0:1000000],/y')
+        b = Selector('/x[500000:1500000]')
+        c = Selector.union(a, b)
+        assert len(c) == 1500001
+        assert ('x', 1499999) in c
+        assert ('y',) in c
 
     def test_selector_union_empty_nonempty(self):
         a = Selector('')
@@ -151,7 +316,7 @@ class test_selector_class(TestCase):
         assert len(c) == 3
         assert c.expanded == (('x', 0), ('x', 1), ('x', 2))
         assert c.max_levels == 2
-        assert c.str == '/x/0,/x/1,/x/2'
+        assert c.str == '/x[0:3]'
 
 class test_path_like_selector(TestCase):
     def setUp(self):
@@ -243,6 +408,36 @@ class test_path_like_selector(TestCase):
                                         names=[0, 1, 2])
         assert_frame_equal(result, self.df.ix[idx])
 
+    def test_select_matches_rowwise(self):
+        for selector in ['/*/*/0', '/foo/*[1:]', '/*/[qux,mof]/[0,2]',
+                         '/[foo,bar]/*/[:1]', '/foo/qux,/bar/*']:
+            parse_list = self.sel.parse(selector)
+            mask = [self.sel._multiindex_row_in(row, parse_list) \
+                    for row in self.df.index]
+            assert_frame_equal(self.sel.select(self.df, selector),
+                               self.df[np.array(mask, dtype=bool)])
+
+    def test_select_trie(self):
+        trie = PortTrie(self.df.index)
+        for selector in ['/*/*/0', '/foo/*[1:]', '/*/[qux,mof]/[0,2]',
+                         '/[foo,bar]/*/[:1]', '/foo/qux,/bar/*', '/baz',
+                         '/foo/mof[0:3]', '/xyz']:
+            assert_frame_equal(self.sel.select(self.df, selector, trie=trie),
+                               self.sel.select(self.df, selector))
+        assert_frame_equal(self.sel.select(self.df, '/qux/[0,1]', start=1,
+                                           trie=trie),
+                           self.sel.select(self.df, '/qux/[0,1]', start=1))
+
+    def test_select_start_stop(self):
+        result = self.sel.select(self.df, '/qux/[0,1]', start=1)
+        idx = pd.MultiIndex.from_tuples([('foo','qux',0),
+                                         ('foo','qux',1),
+                                         ('bar','qux',0),
+                                         ('bar','qux',1),
+                                         ('baz','qux',0)],
+                                        names=[0, 1, 2])
+        assert_frame_equal(result, self.df.ix[idx])
+
     def test_select_string_set(self):
         result = self.sel.select(self.df, '/foo/[qux,mof]')
         idx = pd.MultiIndex.from_tuples([('foo','qux',0),
@@ -296,6 +491,11 @@ class test_path_like_selector(TestCase):
         assert self.sel.are_disjoint('/foo[0:10]/baz',
                                      '/foo[5:15]/[baz,qux]') == False
 
+        assert self.sel.are_disjoint('/foo[0:1000000]',
+                                     '/foo[1000000:2000000]') == True
+        assert self.sel.are_disjoint('/foo[0:1000000]',
+                                     '/foo[999999:2000000]') == False
+
         assert self.sel.are_disjoint('/foo', '') == True
         assert self.sel.are_disjoint('', '') == True
         assert self.sel.are_disjoint('/foo', '/foo', '') == False
@@ -310,6 +510,8 @@ class test_path_like_selector(TestCase):
     def test_count_ports(self):
         result = self.sel.count_ports('/foo/bar[0:2],/moo/[qux,baz]')
         assert result == 4
+        result = self.sel.count_ports('/foo[0:1000000]/[bar,baz]')
+        assert result == 2000000
         result = self.sel.count_ports('')
         assert result == 0
 
@@ -334,6 +536,32 @@ class test_path_like_selector(TestCase):
                                   ('moo', 'qux'),
                                   ('moo', 'baz')])
 
+    def test_expand_str_cached(self):
+        self.sel.cache_clear()
+        r0 = self.sel.expand('/foo/bar[0:2]')
+        r1 = self.sel.expand('/foo/bar[0:2]')
+        assert r0 == r1 == [('foo', 'bar', 0), ('foo', 'bar', 1)]
+        assert self.sel.cache_info()['expand']['hits'] == 1
+
+        # Modifying a returned expansion must not affect the cache:
+        r1.append(('foo',))
+        self.assertSequenceEqual(self.sel.expand('/foo/bar[0:2]'),
+                                 [('foo', 'bar', 0), ('foo', 'bar', 1)])
+
+    def test_parse_cached(self):
+        self.sel.cache_clear()
+        p0 = self.sel.parse('/foo/bar[0:2]')
+        p0[0].append('baz')
+        p1 = self.sel.parse('/foo/bar[0:2]')
+        assert p1 == [['foo', 'bar', slice(0, 2)]]
+        assert self.sel.cache_info()['parse']['hits'] == 1
+
+    def test_parse_long_list(self):
+        n = 5000
+        result = self.sel.parse(','.join('/foo[%i]' % i for i in xrange(n)))
+        assert len(result) == n
+        assert result[-1] == ['foo', [n-1]]
+
     def test_expand_empty(self):
         self.assertSequenceEqual(self.sel.expand([()]), [()])
         self.assertSequenceEqual(self.sel.expand(''), [()])
@@ -474,6 +702,12 @@ class test_path_like_selector(TestCase):
         assert self.sel.is_in('/foo/bar[5]', '/[foo,baz]/bar[0:10]') == True
         assert self.sel.is_in('/qux/bar[5]', '/[foo,baz]/bar[0:10]') == False
 
+    def test_is_in_large(self):
+        assert self.sel.is_in('/foo[0:1000000]/[a,b]',
+                              '/foo[0:500000]/[a,b,c],/foo[500000:2000000]/[a,b]')
+        assert not self.sel.is_in('/foo[0:1000000]/[a,b]',
+                                  '/foo[0:500000]/[a,b],/foo[500001:1000000]/[a,b]')
+
     def test_is_in_list(self):
         assert self.sel.is_in([()], [('foo', 0), ('foo', 1)])
         assert self.sel.is_in([['foo', 'bar', [5]]],
@@ -640,8 +874,22 @@ class test_path_like_selector(TestCase):
         assert self.sel.collapse([['a', 0]]) == '/a/0'
         assert self.sel.collapse([('a', 0)]) == '/a/0'
         assert self.sel.collapse([['a', 'b', 0]]) == '/a/b/0'
-        assert self.sel.collapse([['a', 0], ['b', 0]]) == '/a/0,/b/0'
+        assert self.sel.collapse([['a', 0], ['b', 0]]) == '/[a,b]/0'
         assert self.sel.collapse([['a', 'b', (0, 1)], ['c', 'd']]) == '/a/b[0,1],/c/d'
+
+    def test_collapse_compact(self):
+        assert self.sel.collapse([('a', i) for i in xrange(5)]) == '/a[0:5]'
+        assert self.sel.collapse([('a', 0), ('a', 2), ('a', 4)]) == '/a[0,2,4]'
+        assert self.sel.collapse([('a', i, 'x') for i in xrange(3)]+
+                                 [('b', i, 'x') for i in xrange(3)]) == \
+            '/[a,b][0:3]/x'
+        assert self.sel.collapse([('a', 0), ('b',), ('a', 1)]) == \
+            '/a/0,/b,/a/1'
+        assert self.sel.collapse([('a', 0, ''), ('a', 1, '')]) == '/a[0:2]'
+
+        # The order of the identifiers must be preserved:
+        ids = [('b', 1), ('b', 0), ('a', 2), ('a', 3), ('a', 3), ('c', 'x')]
+        self.assertSequenceEqual(self.sel.expand(self.sel.collapse(ids)), ids)
         
 class test_base_port_mapper(TestCase):
     def test_create(self):
@@ -662,6 +910,16 @@ class test_base_port_mapper(TestCase):
         pm0.portmap[('foo', 0)] = 10
         assert_series_equal(pm2.portmap, pm1.portmap)
 
+    def test_use_trie(self):
+        pm = BasePortMapper('/foo[0:5],/bar[0:3]', np.arange(8))
+        pm.use_trie = True
+        assert_array_equal(pm.ports_to_inds('/foo[1:3],/bar[2]'), [1, 2, 7])
+        assert pm.copy().use_trie
+
+        # The prefix tree must be rebuilt when the index changes:
+        pm.portmap = pm.portmap.iloc[::-1]
+        assert_array_equal(pm.get_map('/foo[3:]'), [4, 3])
+
     def test_copy(self):
         # Ensure that modifying pm0 doesn't modify any other mapper created from it:
         pm0 = BasePortMapper('/foo[0:5]', np.arange(5))
@@ -749,6 +1007,67 @@ class test_base_port_mapper(TestCase):
         pm.set_map('/bar[0:5]', range(5))
         self.assertSequenceEqual(pm.portmap.ix[5:10].tolist(), range(5))
 
+class test_array_port_mapper(TestCase):
+    def test_create(self):
+        pm = ArrayPortMapper('/foo[0:5]', np.arange(5))
+        assert_series_equal(pm.portmap,
+                            BasePortMapper('/foo[0:5]', np.arange(5)).portmap)
+        assert len(pm) == 5
+
+    def test_from_pm(self):
+        pm0 = BasePortMapper('/foo[0:5],/bar[0:5]', np.arange(10)[::-1])
+        pm1 = ArrayPortMapper.from_pm(pm0)
+        assert pm1.equals(pm0)
+        pm1.set_map('/foo[0]', 20)
+        assert pm0.portmap[('foo', 0)] == 9
+
+    def test_copy(self):
+        pm0 = ArrayPortMapper('/foo[0:5]', np.arange(5))
+        pm1 = pm0.copy()
+        pm0.set_map('/foo[0]', 10)
+        assert_array_equal(pm1.get_map('/foo[0:5]'), np.arange(5))
+
+    def test_inds_to_ports(self):
+        pm = ArrayPortMapper('/foo[0:5],/bar[0:5]', range(10, 20))
+        self.assertSequenceEqual(pm.inds_to_ports([15, 14]),
+                                 [('foo', 4), ('bar', 0)])
+        pm = ArrayPortMapper('/foo,/bar')
+        self.assertSequenceEqual(pm.inds_to_ports([1]), ['bar'])
+
+    def test_ports_to_inds(self):
+        pm = ArrayPortMapper('/foo[0:5],/bar[0:5]', range(10, 20))
+        assert_array_equal(pm.ports_to_inds('/bar[0],/foo[4]'), [15, 14])
+        assert_array_equal(pm.ports_to_inds('/*[4]'), [14, 19])
+        assert_array_equal(pm.ports_to_inds('/foo[5:10]'), [])
+        self.assertRaises(ValueError, pm.ports_to_inds, '/foo/bar/0')
+
+    def test_list_selectors(self):
+        pm0 = BasePortMapper('/foo[0:5],/bar[0:5]', range(10, 20))
+        pm1 = ArrayPortMapper('/foo[0:5],/bar[0:5]', range(10, 20))
+        for sel in [[('foo', 0), ('bar', 1)], [['foo', [0, 1]]],
+                    [['bar', slice(3, None)]], [('*', 2)]]:
+            assert_array_equal(pm1.ports_to_inds(sel), pm0.ports_to_inds(sel))
+            assert_array_equal(pm1.get_map(sel), pm0.get_map(sel))
+        assert_array_equal(pm1.ports_to_inds([('foo', 0), ('bar', 1)]),
+                           [10, 16])
+        assert_array_equal(pm1.get_map(Selector('/bar[1],/foo[0]')), [16, 10])
+        pm1.set_map([['foo', [0, 1]]], [0, 1])
+        pm1.set_map([('bar', 4)], 2)
+        assert_array_equal(pm1.get_map('/foo[0:2],/bar[4]'), [0, 1, 2])
+
+    def test_set_map(self):
+        pm = ArrayPortMapper('/foo[0:5],/bar[0:5]')
+        pm.set_map('/bar[0:5]', range(5))
+        self.assertSequenceEqual(pm.portmap.ix[5:10].tolist(), range(5))
+        self.assertSequenceEqual(pm.inds_to_ports([0]),
+                                 [('foo', 0), ('bar', 0)])
+
+    def test_pickle(self):
+        pm0 = ArrayPortMapper('/foo[0:5],/bar', np.arange(6))
+        pm1 = pickle.loads(pickle.dumps(pm0))
+        assert pm1.equals(pm0)
+        assert_array_equal(pm1.ports_to_inds('/bar'), [5])
+
 class test_port_mapper(TestCase):
     def setUp(self):
         self.data = np.random.rand(20)
@@ -909,5 +1228,14 @@ class test_port_mapper(TestCase):
         pm.set_by_inds([0, 1], new_data)
         assert_array_equal(new_data, pm.get_by_inds([0, 1]))
 
+    def test_get_set_by_plan(self):
+        data = np.random.rand(5)
+        pm = PortMapper('/foo[0:5]', data)
+        plan = IndexPlan([0, 1, 3])
+        assert_array_equal(data[[0, 1, 3]], pm.get_by_plan(plan))
+        new_data = np.arange(3).astype(np.double)
+        pm.set_by_plan(plan, new_data)
+        assert_array_equal(new_data, pm.get_by_inds([0, 1, 3]))
+
 if __name__ == '__main__':
     main()